@@ -37,8 +37,12 @@ def extract_survey_respond_panel(baseurl: str, uri: str, params: dict) -> list:
     return survey_respond_records
 
 
-# Extract all records of 'survey_respond' for the survey we want to fix
-survey_respond_records = extract_survey_respond_disreg(BASEURL_DISREG, URI_DISREG, PARAMS)
-survey_respond_records = [rec for rec in survey_respond_records if rec.get('surveyId') == SURVEY_ID_DISREG]
-print('Data extracted...')
+def extract_survey_respond_records(survey_id: int = SURVEY_ID_DISREG) -> list:
+    """
+    Extract all records of 'survey_respond' for the survey we want to fix.
+    """
+    survey_respond_records = extract_survey_respond_disreg(BASEURL_DISREG, URI_DISREG, PARAMS)
+    survey_respond_records = [rec for rec in survey_respond_records if rec.get('surveyId') == survey_id]
+    print('Data extracted...')
+    return survey_respond_records
 
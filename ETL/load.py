@@ -1,6 +1,10 @@
-import json
-import requests
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from rabitpy_dev_phase_info.utils import jsoncodec
+
+if TYPE_CHECKING:
+    import requests
+    from rabitpy_dev_phase_info.io.resources import RabitDataset
 
 
 def save_response(
@@ -13,17 +17,19 @@ def save_response(
     questionee_id: int,
     questionee_guid: Optional[str] = None,
     id: Optional[int] = None
-) -> requests.Response:
+) -> 'requests.Response':
     """
     Sends a POST request to save a survey response.
     Returns:
         requests.Response: The response object from the POST request.
     """
+    import requests
+
     baseurl = f'{host}/api/{uri}/save-respond'
     body = {
         'id': id,
         'projectId': project_id,
-        'respondJson': json.dumps(respond_json, ensure_ascii=False),
+        'respondJson': jsoncodec.dumps(respond_json),
         'surveyId': survey_id,
         'questionerId': questioner_id,
         'questioneeId': questionee_id,
@@ -32,4 +38,25 @@ def save_response(
     return requests.post(url=baseurl, json=body, verify=False)
 
 
+def save_dataset(
+    dataset: 'RabitDataset',
+    url: str,
+    table_prefix: str = 'rabit',
+    chunksize: int = 10000
+) -> Dict[str, int]:
+    """
+    Bulk loads a parsed dataset into a SQL database.
+
+    Args:
+        dataset (RabitDataset): A loaded dataset.
+        url (str): SQLAlchemy database url of the target database.
+        table_prefix (str, optional): Prefix of the output tables. Defaults to 'rabit'.
+        chunksize (int, optional): Number of rows inserted in each transaction. Defaults to 10000.
+
+    Returns:
+        Dict[str, int]: Number of rows written to each table.
+    """
+    from rabitpy_dev_phase_info.io.writers import RabitDatabaseWriter
 
+    writer = RabitDatabaseWriter(url=url, chunksize=chunksize)
+    return dataset.export_sql(writer, table_prefix=table_prefix)
@@ -86,4 +86,20 @@ title_to_new_codes_mapping = {
 'Syncope and collapse': '40',
 'Malignant neoplasm of heart, mediastinum and pleura': '41',
 'Myxoma  (Benign neoplasm of heart)': '42',
-}
\ No newline at end of file
+}
+
+
+def read_coding(path: str, prefix: str = '', by: str = 'code', width: int = 2, sep: str = '|') -> dict:
+    """
+    Read a coding file into a {old value: new code} mapping.
+    Each line of the file is 'code|title', and the new code of a line is its line number padded to width,
+    as in codes_mapping. by is 'code' to map prefix + code, or 'title' to map titles.
+    """
+    if by not in ('code', 'title'):
+        raise ValueError(f"by must be 'code' or 'title', not {by!r}")
+
+    with open(path, encoding='utf-8') as f:
+        lines = [line.rstrip('\r\n').split(sep, 1) for line in f if line.strip()]
+
+    keys = [prefix + code.strip() if by == 'code' else title for code, title in lines]
+    return {key: str(i).zfill(width) for i, key in enumerate(keys, start=1)}
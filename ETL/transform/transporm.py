@@ -1,7 +1,9 @@
-import json
+import gc
+from contextlib import contextmanager
+from itertools import islice
 
+from rabitpy_dev_phase_info.utils import jsoncodec
 from ETL.transform.mapping import codes_mapping, title_to_new_codes_mapping
-from ETL.extract import survey_respond_records
 
 def coding_mapper(answers: list) -> list:
     """
@@ -24,38 +26,89 @@ def title_to_new_codes_mapper(answer: str) -> list:
         return [answer]
 
 
-def list_record_mapper(survey_respond_records: list) -> list:
+def decode_record(record: dict, field: str = 'respondJson') -> dict:
     """
-    Map records by updating the 'FinalDiagnosis' field (if exists) inside respondJson:
-    - If the value is a list, map with coding_mapper().
+    Decode the JSON field of a record into a new dict. Invalid JSON and values that are not objects become {}.
     """
-    survey_respond_records = [rec for rec in survey_respond_records if 'FinalDiagnosis' in json.loads(rec['respondJson'])]
-    mapped_records = []
+    value = record.get(field, {})
+    if isinstance(value, (str, bytes)):
+        try:
+            value = jsoncodec.loads(value)
+        except jsoncodec.JSONDecodeError:
+            return {}
+        return value if isinstance(value, dict) else {}
+    # Already decoded answers are copied, so the caller's records are never modified
+    return dict(value) if isinstance(value, dict) else {}
 
-    for rec in survey_respond_records:
-        rec_copy = rec.copy()  # avoid mutating original record
-        respond_json = rec_copy.get("respondJson", {})
 
-        if isinstance(respond_json, str):
-            try:
-                respond_json = json.loads(respond_json)
-            except json.JSONDecodeError:
-                respond_json = {}
+def _map_values(values: list, mapping: dict) -> list:
+    # Maps a flat batch of answers, keeping answers without a new value. Unhashable answers are kept as they are
+    try:
+        return list(map(mapping.get, values, values))
+    except TypeError:
+        return [mapping.get(v, v) if getattr(type(v), '__hash__', None) else v for v in values]
 
-        value = respond_json["FinalDiagnosis"]
-        try:
-            new_value = coding_mapper(value)
-        except Exception as e:
-            new_value = value
 
-        respond_json["FinalDiagnosis"] = new_value
-        rec_copy["respondJson"] = respond_json
+@contextmanager
+def _paused_gc():
+    # Decoded JSON holds no reference cycles, but allocating it in bulk triggers full collections that scan every
+    # record decoded so far. Collection is resumed once the batch is built
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
 
-        mapped_records.append(rec_copy)
+def map_records(records: list, rules: dict, field: str = 'respondJson', required: list = None) -> list:
+    """
+    Apply a set of mapping rules to a batch of records.
+    rules: {answer field: {old value: new value}}, e.g. {'FinalDiagnosis': read_coding('docs/old_coding.txt')}
+    required: Answer fields a record must have to be kept. Defaults to the fields of rules; records with none of
+        them are dropped.
+    Each record is decoded once and returned as a new record with the mapped answers decoded in field. Answers of a
+    field are collected across the whole batch and mapped with one lookup pass per field. List answers are mapped
+    item by item and other answers as a whole.
+    """
+    required = list(rules.keys()) if required is None else required
+    mapped_records = []
+    with _paused_gc():
+        for rec in records:
+            answers = decode_record(rec, field)
+            if any(key in answers for key in required):
+                mapped_records.append({**rec, field: answers})
+
+    for key, mapping in rules.items():
+        # Flatten the answers of this field over the batch, then split the mapped values back per answers
+        targets = [rec[field] for rec in mapped_records if key in rec[field]]
+        flat = []
+        for answers in targets:
+            value = answers[key]
+            if isinstance(value, list):
+                flat.extend(value)
+            else:
+                flat.append(value)
+
+        mapped = iter(_map_values(flat, mapping))
+        for answers in targets:
+            value = answers[key]
+            answers[key] = list(islice(mapped, len(value))) if isinstance(value, list) else next(mapped)
 
     return mapped_records
 
 
+def list_record_mapper(survey_respond_records: list, rules: dict = None) -> list:
+    """
+    Map records by updating the 'FinalDiagnosis' field (if exists) inside respondJson:
+    - If the value is a list, map each item with codes_mapping.
+    rules: Mapping rules passed to map_records. Defaults to {'FinalDiagnosis': codes_mapping}
+    """
+    rules = {'FinalDiagnosis': codes_mapping} if rules is None else rules
+    return map_records(survey_respond_records, rules)
+
+
 
 # if __name__ == '__main__':
     # print('before: ')
@@ -65,9 +118,3 @@ def list_record_mapper(survey_respond_records: list) -> list:
     # print('after: ')
     # x_list = [rec['respondJson'] for rec in mapped_recoreds]
     # print([x.get('FinalDiagnosis') for x in x_list])
-
-mapped_recoreds = list_record_mapper(survey_respond_records)
-print('Data transformed...')
-# mapped_recoreds = mapped_recoreds[20:22]
-
-
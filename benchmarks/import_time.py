@@ -0,0 +1,79 @@
+"""
+Import time benchmark for the rabitpy packages and the ETL entry points.
+
+Each module is imported in a fresh interpreter so the timings are not affected by the module cache. The
+heavy third party dependencies loaded by each import are reported along with the best of n runs.
+
+Run from the repository root:
+    python benchmarks/import_time.py [-n 5] [module ...]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+MODULES = ['rabitpy',
+           'rabitpy.io.adapters',
+           'rabitpy.io.rdata',
+           'rabitpy_dev_phase_info',
+           'rabitpy_dev_phase_info.io.adapters',
+           'rabitpy_dev_phase_info.io.resources',
+           'rabitpy_dev_phase_info.datautils.handler',
+           'ETL.extract',
+           'ETL.transform.transporm',
+           'ETL.load']
+
+HEAVY_DEPENDENCIES = ['pandas', 'numpy', 'sqlalchemy', 'requests', 'khayyam']
+
+PROBE = '''
+import json
+import sys
+import time
+ts = time.perf_counter()
+import {module}
+te = time.perf_counter()
+print(json.dumps({{'seconds': te - ts, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+'''
+
+
+def time_import(module, n=5):
+
+    best = None
+
+    for _ in range(n):
+        res = subprocess.run([sys.executable, '-c', PROBE.format(module=module, heavy=HEAVY_DEPENDENCIES)],
+                             cwd=ROOT, capture_output=True, text=True)
+
+        if res.returncode != 0:
+            return {'module': module, 'seconds': None, 'loaded': [], 'error': res.stderr.strip().splitlines()[-1]}
+
+        out = json.loads(res.stdout.strip().splitlines()[-1])
+        if best is None or out['seconds'] < best['seconds']:
+            best = out
+
+    best['module'] = module
+    return best
+
+
+def main():
+
+    parser = argparse.ArgumentParser(description='Measure import time of rabitpy modules.')
+    parser.add_argument('modules', nargs='*', default=MODULES)
+    parser.add_argument('-n', type=int, default=5, help='number of runs per module, the best run is reported')
+    args = parser.parse_args()
+
+    print(f"{'module':<45}{'seconds':>10}  heavy dependencies loaded")
+    for module in args.modules:
+        res = time_import(module, n=args.n)
+        if res['seconds'] is None:
+            print(f"{module:<45}{'failed':>10}  {res['error']}")
+        else:
+            print(f"{module:<45}{res['seconds']:>10.4f}  {', '.join(res['loaded']) or '-'}")
+
+
+if __name__ == '__main__':
+    main()
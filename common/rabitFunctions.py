@@ -1,6 +1,9 @@
-import json
-import requests
-from typing import Any, Dict, Optional
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+from rabitpy_dev_phase_info.utils import jsoncodec
+
+if TYPE_CHECKING:
+    import requests
 
 def save_response(
     host: str,
@@ -12,7 +15,7 @@ def save_response(
     questionee_id: int,
     questionee_guid: Optional[str] = None,
     id: Optional[int] = None
-) -> requests.Response:
+) -> 'requests.Response':
     """
     Sends a POST request to save a survey response.
 
@@ -30,11 +33,13 @@ def save_response(
     Returns:
         requests.Response: The response object from the POST request.
     """
+    import requests
+
     baseurl = f'{host}/api/{uri}/save-respond'
     body = {
         'id': id,
         'projectId': project_id,
-        'respondJson': json.dumps(respond_json, ensure_ascii=False),
+        'respondJson': jsoncodec.dumps(respond_json),
         'surveyId': survey_id,
         'questionerId': questioner_id,
         'questioneeId': questionee_id,
@@ -1,9 +1,16 @@
+from ETL.extract import extract_survey_respond_records
 from ETL.load import save_response
-from ETL.transform.transporm import mapped_recoreds
+from ETL.transform.transporm import list_record_mapper
 from config import *
 
 if __name__ == '__main__':
 
+    survey_respond_records = extract_survey_respond_records()
+
+    mapped_recoreds = list_record_mapper(survey_respond_records)
+    print('Data transformed...')
+    # mapped_recoreds = mapped_recoreds[20:22]
+
     print('Start loading...')
     for rec in mapped_recoreds:
         try:
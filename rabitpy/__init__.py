@@ -1,2 +1,18 @@
-from .io.rdata import RabitResource, RabitDataSet
-from rabitpy_dev_phase_info.utils.expressions import RabitExpression
+import importlib
+
+# Resources depend on pandas and the network stack, so public classes are only imported when first accessed
+_lazy_attributes = {'RabitResource': 'rabitpy.io.rdata',
+                    'RabitDataSet': 'rabitpy.io.rdata',
+                    'RabitExpression': 'rabitpy_dev_phase_info.utils.expressions'}
+
+
+def __getattr__(name):
+    try:
+        module = _lazy_attributes[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return getattr(importlib.import_module(module), name)
+
+
+def __dir__():
+    return sorted([*globals().keys(), *_lazy_attributes.keys()])
@@ -1,10 +1,7 @@
 from abc import abstractmethod
 from rabitpy.errors import APINotAvailableError
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
-from requests import Request, Session
-import requests
 import json
+from . import jsoncodec
 import os
 import warnings
 
@@ -28,6 +25,10 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
 
     @property
     def req(self):
+
+        # requests is only imported once an API adapter is actually used
+        from requests import Request
+
         return Request('POST', self.url, params=self.parameters, headers=self.headers).prepare()
 
     def add_filter(self, field, condition, value):
@@ -48,6 +49,8 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
 
     def fetch(self):
 
+        import requests
+
         retry_strategy = requests.packages.urllib3.util.retry.Retry(connect=1)
         adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
 
@@ -71,7 +74,7 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
                         f'Error getting data from API. Process exited with status code: {res.status_code}')
                 else:
                     try:
-                        fetched_data = json.loads(res.text)
+                        fetched_data = jsoncodec.loads(res.text)
                         fetched_content += fetched_data['content']
                         print(f'Fetched {pagenum} of {fetched_data["totalPages"]}')
                         if pagenum == fetched_data['totalPages']:
@@ -95,7 +98,7 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
                     f'Error getting data from API. Process exited with status code: {res.status_code}')
             else:
                 try:
-                    return json.loads(res.text)
+                    return jsoncodec.loads(res.text)
                 except json.decoder.JSONDecodeError:
                     if not res.text:
                         raise ValueError(f'Empty response recieved while fetching from {res.url}...')
@@ -117,5 +120,6 @@ class RabitReaderJSONFileAdapter(RabitReaderBaseAdapter):
         if not os.path.exists(self.fp):
             raise FileNotFoundError(f'The specified path {self.fp} does not exist...')
 
+        # json.load takes no encoding, the file is decoded when it is read
         with open(self.fp, encoding=self.encoding) as f:
-            return json.load(f, encoding=self.encoding)
+            return jsoncodec.loads(f.read())
@@ -0,0 +1,175 @@
+# This module is kept identical in rabitpy_dev_phase_info/utils/jsoncodec.py, the source of truth, and in
+# rabitpy/io/jsoncodec.py, so neither package depends on the other. tests/test_jsoncodec.py checks both match.
+import json
+import math
+import os
+
+
+# Backends tried in order when none is selected. The RABITPY_JSON environment variable selects one by name
+BACKENDS = ('orjson', 'ujson', 'json')
+
+JSONDecodeError = json.JSONDecodeError
+
+_backend = None
+
+
+def _has_float(obj, test):
+
+    # Whether a JSON compatible object holds a float for which test is true
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, float):
+            if test(item):
+                return True
+        elif isinstance(item, dict):
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple)):
+            stack.extend(item)
+    return False
+
+
+def _beyond_64_bits(x):
+    return not -2.0 ** 63 < x < 2.0 ** 64
+
+
+def _orjson_codec():
+
+    import orjson
+
+    def loads(s, strict=True):
+        obj = orjson.loads(s)
+        # orjson reads integers beyond 64 bits as floats. Documents holding floats out of the 64 bit integer range are
+        # left to the standard library, which keeps such integers exact
+        if _has_float(obj, _beyond_64_bits):
+            raise ValueError('Integers beyond 64 bits are left to the standard library')
+        return obj
+
+    def dumps(obj, sort_keys=False, indent=None, default=None):
+        if indent not in (None, 2):
+            raise TypeError('orjson only indents by 2 spaces')
+        # Dates and dataclasses go through default, as with the standard library
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        option |= (orjson.OPT_SORT_KEYS if sort_keys else 0) | (orjson.OPT_INDENT_2 if indent else 0)
+        out = orjson.dumps(obj, default=default, option=option)
+        # orjson writes NaN and infinite floats as null. Such objects are left to the standard library, and they can
+        # only be there if the output holds a null
+        if b'null' in out and _has_float(obj, lambda x: not math.isfinite(x)):
+            raise ValueError('Out of range float values are left to the standard library')
+        return out.decode('utf-8')
+
+    return loads, dumps
+
+
+def _ujson_codec():
+
+    import ujson
+
+    def loads(s, strict=True):
+        return ujson.loads(s)
+
+    def dumps(obj, sort_keys=False, indent=None, default=None):
+        # Out of range floats raise and are left to the standard library
+        return ujson.dumps(obj, ensure_ascii=False, escape_forward_slashes=False, sort_keys=sort_keys,
+                           indent=indent or 0, default=default, allow_nan=False)
+
+    return loads, dumps
+
+
+def _json_codec():
+
+    def loads(s, strict=True):
+        # Buffers like memory maps are decoded as UTF-8, the encoding of JSON documents
+        if isinstance(s, (bytearray, memoryview)):
+            s = str(s, 'utf-8')
+        return json.loads(s, strict=strict)
+
+    def dumps(obj, sort_keys=False, indent=None, default=None):
+        return json.dumps(obj, ensure_ascii=False, sort_keys=sort_keys, indent=indent, default=default,
+                          separators=(',', ':') if indent is None else None)
+
+    return loads, dumps
+
+
+_CODECS = {'orjson': _orjson_codec, 'ujson': _ujson_codec, 'json': _json_codec}
+_stdlib = _json_codec()
+
+
+def set_backend(name=None):
+
+    '''
+    Selects the JSON backend used by loads and dumps
+    :param name: 'orjson', 'ujson' or 'json'. The first installed backend of BACKENDS is used if None
+    :return: The name of the selected backend
+    '''
+
+    global _backend
+
+    names = [name] if name is not None else BACKENDS
+    for this in names:
+        if this not in _CODECS:
+            raise ValueError(f'Unknown JSON backend {this!r}, valid options are: {", ".join(BACKENDS)}')
+        try:
+            _backend = (this, *_CODECS[this]())
+            return this
+        except ImportError:
+            if name is not None:
+                raise
+
+    return None
+
+
+def get_backend():
+    if _backend is None:
+        set_backend(os.environ.get('RABITPY_JSON') or None)
+    return _backend[0]
+
+
+def loads(s, strict=True):
+
+    '''
+    Decodes a JSON document with the selected backend
+    :param s: str, or UTF-8 bytes, bytearray or memoryview
+    :param strict: If False, control characters are allowed inside strings, as in json.loads
+    :return: The decoded object
+
+    Documents the fast backends reject but the standard library accepts, like NaN, integers beyond 64 bits or raw
+    control characters, are decoded by the standard library. Invalid documents raise json.JSONDecodeError whatever
+    the backend.
+    '''
+
+    if _backend is None:
+        get_backend()
+    try:
+        return _backend[1](s, strict)
+    except (TypeError, ValueError, OverflowError):
+        if _backend[0] == 'json':
+            raise
+    return _stdlib[0](s, strict)
+
+
+def dumps(obj, sort_keys=False, indent=None, default=None):
+
+    '''
+    Encodes obj to a compact JSON string with the selected backend. Non ASCII characters are not escaped
+    :param sort_keys: Sort keys of objects
+    :param indent: None for compact output or 2
+    :param default: A function returning a serializable version of objects that can not be serialized otherwise
+
+    Objects the fast backends can not encode, like non string keys, NaN or infinite floats, are encoded by the
+    standard library, so the output does not depend on the backend.
+    '''
+
+    if _backend is None:
+        get_backend()
+    try:
+        return _backend[2](obj, sort_keys, indent, default)
+    except (TypeError, ValueError, OverflowError):
+        if _backend[0] == 'json':
+            raise
+    return _stdlib[1](obj, sort_keys, indent, default)
+
+
+def deepcopy(obj):
+    # Copies a JSON compatible object through the selected backend, which is faster than copy.deepcopy
+    return loads(dumps(obj))
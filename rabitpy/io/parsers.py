@@ -1,13 +1,9 @@
-import json
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
 import re
 import warnings
 from datetime import datetime
 from collections import OrderedDict
 from .validity import _check_coding_validity
-import pandas as pd
+from . import jsoncodec
 
 
 def _parse_metadata(d, fid_path, json_path, include_html=False, nest_options=False, rename_duplicates=True,
@@ -36,7 +32,7 @@ def _parse_metadata(d, fid_path, json_path, include_html=False, nest_options=Fal
 
         try:
             if isinstance(qnrjson, str):
-                qnrjson = json.loads(qnrjson, strict=False)
+                qnrjson = jsoncodec.loads(qnrjson, strict=False)
         except KeyError as e:
             raise KeyError(f'Form ID: {fid}: Invalid JSON...')
 
@@ -102,8 +98,8 @@ def _set_properties(_qnr=None, _element=None, _choices=None, _digit=False, _fid=
     if _element.get('type') == 'multipletext':
 
         for item in _element.get('items'):
-            # copy item into a recursive element
-            rec_element = item
+            # copy item into a recursive element. The survey JSON itself is not modified.
+            rec_element = dict(item)
 
             # flatten parent and child element codes
             # rec_element.update({'name': '{}_{}'.format(_element.get('name', ''), item.get('name')),
@@ -230,7 +226,7 @@ def _set_properties(_qnr=None, _element=None, _choices=None, _digit=False, _fid=
     if _element.get('type') == 'panel':
         for el in _element.get('elements', []):
 
-            el['name'] = '{}'.format(el.get('name'))
+            el = dict(el, name='{}'.format(el.get('name')))
             el['fldParentCode'] = el.get('name')
             el['fldParentTitle'] = _translation_handler(s=el, target='title', alt=el.get('name'))
 
@@ -288,7 +284,7 @@ def _set_properties(_qnr=None, _element=None, _choices=None, _digit=False, _fid=
     if _element.get('type') == 'paneldynamic':
         warnings.warn('Dynamic panel parsing is currently experimental...')
         for el in _element.get('templateElements', []):
-            el['name'] = '{}_r1_{}'.format(_element.get('name'), el.get('name'))
+            el = dict(el, name='{}_r1_{}'.format(_element.get('name'), el.get('name')))
             this = _set_properties(_qnr=_qnr,
                                    _element=el,
                                    _digit=_digit,
@@ -413,6 +409,11 @@ def _extract_choices(_el):
         value_name = _el.get('valueName', 'code')
         title_name = _el.get('titleName', 'title')
 
+        # requests is only needed for choices served by a URL
+        import requests
+        from requests.adapters import HTTPAdapter
+        from requests.packages.urllib3.util.retry import Retry
+
         retry_strategy = Retry(connect=1)
         adapter = HTTPAdapter(max_retries=retry_strategy)
         session = requests.Session()
@@ -425,7 +426,7 @@ def _extract_choices(_el):
             warnings.warn(f'Failed to extract choices from {url}. Check if address exists.')
             return []
 
-        r = json.loads(response.text, strict=False)
+        r = jsoncodec.loads(response.text, strict=False)
         c = []
 
         try:
@@ -439,10 +440,15 @@ def _extract_choices(_el):
         return c
 
 
-def _rename_duplicates(md):
+def _rename_duplicates(md, existing=None):
+
+    import pandas as pd
 
     # TODO: Remove conversions to dataframe when all is pandas based.
 
+    # existing: {fldCode: {frmCode, ...}} of metadata md is added to. Codes used by other forms there are renamed in md
+    # too, while fields of forms that already have the code keep it. Existing metadata is not renamed
+
     # propagate renamed codes in metadata
     # get all list elements marked as duplicates
     mdf = pd.DataFrame().from_records(md)
@@ -455,6 +461,12 @@ def _rename_duplicates(md):
     # get boolean array for duplicated values
     ix = mdf['fldCode'].isin(dup)
 
+    if existing:
+        pairs = list(zip(mdf['frmCode'], mdf['fldCode']))
+        known = [frm in existing.get(fld, ()) for frm, fld in pairs]
+        clash = [bool(existing.get(fld, set()) - {frm}) for frm, fld in pairs]
+        ix = (ix | pd.Series(clash, index=mdf.index)) & ~pd.Series(known, index=mdf.index)
+
     # Assign new names for duplicated values
     mdf.loc[ix, 'fldCodeR'] = 'frm' + \
                               mdf.loc[ix, 'frmCode'].astype(str) \
@@ -508,11 +520,16 @@ def _add_dynamics_to_metadata(md, dynamics_counter):
     return md
 
 
-def _set_order(md, fields):
+def _set_order(md, fields, after=None):
 
+    # after: The last record of metadata md is appended to. Orders continue from it
     last = {k: -1 for k in fields}
     counter = {k: 0 for k in fields}
 
+    if after:
+        last = {k: after.get(k, -1) for k in fields}
+        counter = {k: after.get(v, 0) for k, v in fields.items()}
+
     for rec in md:
         for k, v in fields.items():
             if last[k] == -1 or last[k] != rec[k]:
@@ -526,6 +543,8 @@ def _set_order(md, fields):
 
 def _parse_data(d, pid_path, fill_date_path, fid_path=None, json_path=None, usefields=None, timeres='second', md=None):
 
+    import pandas as pd
+
     tmp = {'pid': pid_path, 'frmCode': fid_path, 'json': json_path, 'fillDate': fill_date_path}
     index_fields = {k: v for k, v in tmp.items() if tmp[k]}
 
@@ -628,7 +647,7 @@ def _get_raw_flat_data(obvs, index_fields, usefields, timeres='second'):
             if rd:
 
                 try:
-                    d, this_counter = _flatten_json('', json.loads(rd, strict=False), counter={})
+                    d, this_counter = _flatten_json('', jsoncodec.loads(rd, strict=False), counter={})
                 except ValueError:
                     warnings.warn(f'Record {k} contains an invalid JSON. Skipping...')
                     d = {}
@@ -14,36 +14,74 @@ class RabitDataSet:
         self.data = []
         self.metadata_nested = []
         self.metadata = []
+        self._field_index = {}
 
     def __add__(self, other):
+
+        # Only the metadata and data of other are validated, renamed and synced. Field codes of other that are used
+        # by other forms of this dataset are renamed, and existing metadata and observations are left as they are.
+        # The lists of this dataset are extended in place, and lists of other are copied so other is not changed later
         rd = {}
         if self.metadata and other.metadata:
-            self.metadata = self.metadata + other.metadata
-            self.metadata = _check_coding_validity(metadata=self.metadata, nested=False)
-            self.metadata, _ = _rename_duplicates(md=self.metadata)
-            self.metadata = _set_order(self.metadata,
-                                       fields={'frmCode': 'frmOrder',
-                                               'fldCode': 'fldOrder',
-                                               'fldParentCode': 'fldParentOrder'})
+            self.__append_metadata('metadata', other.metadata, nested=False)
         elif other.metadata:
-            self.metadata = other.metadata
+            self.metadata = list(other.metadata)
 
         if self.metadata_nested and other.metadata_nested:
-            self.metadata_nested = self.metadata_nested + other.metadata_nested
-            self.metadata_nested = _check_coding_validity(metadata=self.metadata_nested, nested=True)
-            self.metadata_nested, rd = _rename_duplicates(md=self.metadata_nested)
-            self.metadata_nested = _set_order(self.metadata_nested,
-                                              fields={'frmCode': 'frmOrder',
-                                                      'fldCode': 'fldOrder',
-                                                      'fldParentCode': 'fldParentOrder'})
+            rd = self.__append_metadata('metadata_nested', other.metadata_nested, nested=True)
         elif other.metadata_nested:
-            self.metadata_nested = other.metadata_nested
+            self.metadata_nested = list(other.metadata_nested)
 
         if self.data and other.data:
-            self.data = self.data + other.data
-            self.data = _sync_data_metadata(obvs=self.data, remap_dict=rd, md=self.metadata_nested)
+            self.data.extend(_sync_data_metadata(obvs=other.data, remap_dict=rd, md=self.metadata_nested))
         elif other.data:
-            self.data = other.data
+            self.data = list(other.data)
+
+        return self
+
+    def __append_metadata(self, name, md, nested):
+
+        # Validates md, renames its codes against the field code index of the current metadata and appends it in
+        # place, so the index stays valid for the same list. Returns the renaming dictionary of md
+        current = getattr(self, name)
+        index = self.__get_field_index(name)
+
+        md = _check_coding_validity(metadata=md, nested=nested)
+
+        # Codes used by other forms of the current metadata are duplicates
+        for rec in md:
+            warning = rec.get('warning') or []
+            if index.get(rec['fldCode'], set()) - {rec['frmCode']} and '3' not in warning:
+                rec['warning'] = warning + ['3']
+
+        md, rd = _rename_duplicates(md=md, existing=index)
+        md = _set_order(md,
+                        fields={'frmCode': 'frmOrder',
+                                'fldCode': 'fldOrder',
+                                'fldParentCode': 'fldParentOrder'},
+                        after=current[-1])
+
+        for rec in md:
+            index.setdefault(rec['fldCode'], set()).add(rec['frmCode'])
+
+        current.extend(md)
+
+        return rd
+
+    def __get_field_index(self, name):
+
+        # {fldCode: {frmCode, ...}} of self.metadata or self.metadata_nested. The index is rebuilt if the metadata
+        # list was replaced since it was built
+        md = getattr(self, name)
+        indexed, index = self._field_index.get(name, (None, None))
+
+        if indexed is not md:
+            index = {}
+            for rec in md:
+                index.setdefault(rec['fldCode'], set()).add(rec['frmCode'])
+            self._field_index[name] = (md, index)
+
+        return index
 
     def load(self):
 
@@ -73,34 +111,30 @@ class RabitDataSet:
 
     def reshape(self, shape):
 
+        # A single pass over data builds one index of records by (pid, frmCode, fillDate). keys holds every
+        # occurrence in order and repeats the number of each key among the responses to its form by the same pid
         keys = []
         dd = {}
         counter = {}
-        tracker = {}
-        data = self.data
+        repeats = {}
 
         if not self.data:
             warnings.warn('No data passed')
 
         try:
-            for r in data:
+            for r in self.data:
 
-                keys.append((str(r.get('pid')), int(r.get('frmCode')), r.get('fillDate')))
+                key = (str(r.get('pid')), int(r.get('frmCode')), r.get('fillDate'))
+                keys.append(key)
 
                 # TODO: this will result in a bug where a field inside the form has code 'data'
-                if r.get('data') and isinstance(r.get('data'), dict):
-                    dd.update({keys[-1]: r['data']})
-                else:
-                    dd.update({keys[-1]: r})
+                rec = r.get('data')
+                dd[key] = rec if rec and isinstance(rec, dict) else r
 
                 # update tracker
-                if (keys[-1][0], keys[-1][1]) not in counter.keys():
-                    counter[(keys[-1][0], keys[-1][1])] = 1
-                else:
-                    counter[(keys[-1][0], keys[-1][1])] += 1
-
-                tracker[(keys[-1][0], keys[-1][1], keys[-1][2])] = (keys[-1][0], keys[-1][1],
-                                                                    counter.get((keys[-1][0], keys[-1][1])))
+                entry = key[:2]
+                counter[entry] = counter.get(entry, 0) + 1
+                repeats[key] = counter[entry]
 
         except KeyError:
             raise KeyError('One or more of minimum information fields (pid, frmCode, or fillDate) not available...')
@@ -109,54 +143,55 @@ class RabitDataSet:
             entries = {}
 
             for key in keys:
-                entries.update({(key[0], key[1]): max(entries.get((key[0], key[1]), ''), key[2])})
-
-            entries_list = list(entries.keys())
-            entries_list.sort()
+                entries[key[:2]] = max(entries.get(key[:2], ''), key[2])
 
             o = {}
 
-            for entry in entries_list:
-                this_key = (*entry, entries[entry])
+            for entry in sorted(entries.keys()):
+                pid = entry[0]
+                fill_date = entries[entry]
 
-                try:
-                    o[this_key[0]].update(dd[this_key])
-                    o[this_key[0]]['fillDate'] = max(o[this_key[0]].get('fillDate', ''), this_key[2])
-                except KeyError:
-                    o[this_key[0]] = {}
-                    o[this_key[0]].update(dd[this_key])
-                    o[this_key[0]]['fillDate'] = this_key[2]
+                if pid in o:
+                    o[pid].update(dd[(*entry, fill_date)])
+                    o[pid]['fillDate'] = max(o[pid].get('fillDate', ''), fill_date)
+                else:
+                    o[pid] = dict(dd[(*entry, fill_date)])
+                    o[pid]['fillDate'] = fill_date
 
-                o[this_key[0]]['pid'] = this_key[0]
+                o[pid]['pid'] = pid
 
-            return [oo for oo in o.values()]
+            return list(o.values())
         elif shape == 'duplicate merged':
 
             o = {}
 
-            for key in keys:
+            # {(frmCode, repeat): {fldCode: prefixed fldCode}}, so prefixed names are built once per form and repeat
+            names = {}
 
-                if key[1] != 0 and key[1] != '0':
-                    rec = {f'f{key[1]}_{tracker[key][2]}_{k}': v for k, v in dd[key].items()}
-                    rec.update({f'f{key[1]}_{tracker[key][2]}_fillDate': key[2]})
+            for key in keys:
+                pid, frm, fill_date = key
+                values = dd[key]
+
+                if frm != 0:
+                    prefix = f'f{frm}_{repeats[key]}_'
+                    rename = names.setdefault((frm, repeats[key]), {})
+                    rec = dict(zip([rename.get(k) or rename.setdefault(k, f'{prefix}{k}') for k in values],
+                                   values.values()))
+                    rec[rename.get('fillDate') or rename.setdefault('fillDate', f'{prefix}fillDate')] = fill_date
                 else:
-                    rec = dd[key]
-                    rec.update({'fillDate': key[2]})
-
-                try:
-                    o[key[0]].update(rec)
-                except KeyError:
-                    o[key[0]] = rec
+                    # Records are copied so responses in data are not modified
+                    rec = dict(values)
+                    rec['fillDate'] = fill_date
 
-                o[key[0]]['pid'] = key[0]
+                o.setdefault(pid, {}).update(rec)
+                o[pid]['pid'] = pid
 
-            return [oo for oo in o.values()]
+            return list(o.values())
         elif shape == 'split':
             o = {}
-            for r in dd.keys():
-                dd[r].update({'pid': r[0], 'fillDate': r[2]})
-                fid = r[1]
-                o.setdefault(fid, []).append(dd[r])
+            for (pid, fid, fill_date), rec in dd.items():
+                rec.update({'pid': pid, 'fillDate': fill_date})
+                o.setdefault(fid, []).append(rec)
             return o
         else:
             raise ValueError('Invalid shape requested...')
@@ -1,4 +1,3 @@
-import pandas as pd
 import json
 import re
 
@@ -31,6 +30,10 @@ def _not_english(s):
 
 
 def _check_coding_validity(metadata, nested):
+
+	# pandas is imported on first use so the API readers stay lightweight
+	import pandas as pd
+
 	df = pd.DataFrame(metadata)
 
 	if nested:
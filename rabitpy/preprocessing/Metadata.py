@@ -0,0 +1,153 @@
+import numpy as np
+import pandas as pd
+import warnings
+# from os import path
+# import sys
+# sys.path.append(path.abspath('../sumit-report'))
+from rabitpy.preprocessing import report
+
+
+def check_dataframe_validity(df, columns=[]):
+    if not isinstance(df, pd.DataFrame):
+        return "The input variable is not a DataFrame!"
+    if df.empty:
+        return "The input DataFrame is empty!"
+    if not set(columns).issubset(df.columns):
+        return "One or more specified column names are not in the DataFrame column list!"
+    return "success!"
+
+
+def infer_column_types(df, sample_size=10000, random_state=0):
+
+    '''
+    Infers the type of every column of a dataframe in one vectorized pass
+    :param df: A DataFrame
+    :param sample_size: Number of non null values of object columns tried as dates. All values are used if None
+    :param random_state: Seed of the sample
+    :return: {column: 'int64' | 'float64' | 'bool' | 'datetime64' | 'category' | 'Object'}
+
+    Numeric columns are int64 if all their values are whole numbers. Object columns with at most two distinct values
+    are bool, columns whose sampled values all parse as dates are datetime64 and the others are category. Columns
+    holding unhashable values like lists are Object. The dataframe is not modified.
+    '''
+
+    types = {}
+    for col in df.columns:
+        s = df[col]
+        if pd.api.types.is_bool_dtype(s):
+            types[col] = 'bool'
+        elif pd.api.types.is_numeric_dtype(s):
+            values = s.to_numpy(dtype='float64', na_value=np.nan)
+            values = values[~np.isnan(values)]
+            types[col] = 'int64' if np.all(np.mod(values, 1) == 0) else 'float64'
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            types[col] = 'datetime64'
+        else:
+            types[col] = _infer_object_type(s.dropna(), sample_size, random_state)
+
+    return types
+
+
+def _infer_object_type(s, sample_size, random_state):
+
+    try:
+        if s.nunique() <= 2:
+            return 'bool'
+    except TypeError:
+        return 'Object'
+
+    if sample_size is not None and len(s) > sample_size:
+        s = s.sample(sample_size, random_state=random_state)
+
+    # Numbers are not taken as dates, as pd.to_datetime would read them as timestamps
+    if s.map(type).isin([int, float]).any():
+        return 'category'
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        try:
+            dates = pd.to_datetime(s, errors='coerce')
+        except (TypeError, ValueError, OverflowError):
+            return 'category'
+
+    return 'datetime64' if dates.notna().all() else 'category'
+
+
+class metadata:
+    """Common base class for all metadata"""
+    objCount = 0
+
+    def __init__(self, df, sample_size=10000):
+        self.ReportType = ""
+        self.df = df
+        self.sample_size = sample_size
+        self.types = None
+        metadata.objCount += 1
+        validity = check_dataframe_validity(df)
+        if validity != "success!":
+            raise Exception(validity)
+
+    def type(self, ImputationType):
+        pass
+
+    def get_types(self):
+        """Returns {column: type} of all columns. Types are inferred once and cached"""
+        if self.types is None:
+            self.types = infer_column_types(self.df, sample_size=self.sample_size)
+        return self.types
+
+    def __find(self, *types):
+        return [col for col, t in self.get_types().items() if t in types]
+
+    def find_int_columns(self):
+        """Finds all the Integer columns"""
+        return self.__find('int64')
+
+    def find_float_columns(self):
+        """Finds all the Floating point columns"""
+        return self.__find('float64')
+
+    def find_datetime_columns(self):
+        """Finds all the datetime columns"""
+        return self.__find('datetime64')
+
+    def find_object_columns(self):
+        """Finds all the object columns which are neither dates, booleans nor categories"""
+        return self.__find('Object')
+
+    def find_boolean_columns(self):
+        """Finds all the boolean columns"""
+        return self.__find('bool')
+
+    def find_categorical_columns(self):
+        """Finds all the categorical columns"""
+        return self.__find('category')
+
+    def get_column_names(self):
+        return list(self.df.columns.values)
+
+    def get_all_column_types(self):
+        """get all column types as dictionary"""
+        types = self.get_types()
+        return pd.DataFrame({'column': list(types.keys()), 'dtype': [[t] for t in types.values()]})
+
+    def produce_metadata(self):
+        """Creates Metadata dataframe with initial values"""
+        reporter = report.DescriptiveReporter(self.df, sample_size=self.sample_size)
+        # The reporter reuses the types inferred here
+        reporter.metadata = self
+        meta = reporter.report_all_columns()
+        cat_columns = self.find_categorical_columns()
+        bool_columns = self.find_boolean_columns()
+        # time_columns = self.find_datetime_columns()
+        sum_columns = cat_columns + bool_columns
+        n = 32
+        freq_orders = {}
+        meta = meta.set_index("column")
+        for col in sum_columns:
+            items = self.df[col].value_counts()[:n].index.tolist()
+            order = list(range(1, len(items) + 1))
+            freq_orders[col] = dict(zip(items, order))
+        # Categorical columns have one row per option, each holding the order of the most frequent values
+        meta['frequent_items_order'] = [freq_orders.get(col) for col in meta.index]
+        return meta
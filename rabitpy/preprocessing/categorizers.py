@@ -0,0 +1,161 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+
+def qcut(data, q, suffix='_cat', labels=None, retbins=False, precision=3, duplicates='raise'):
+
+    '''
+    :param data: A DataFrame
+    :param q: int, list, dictionary,
+        Either the number of quantiles, a list of quantiles, or a dictionary with {column: n quantile}.
+        An int or a list is applied to all numeric columns of data
+
+    :param suffix: str
+    :param labels: list or dictionary
+        A list of labels corresponding to quantiles or a dictionary where each quantiles column name is the key
+
+    :param retbins:
+        Whether of not to return bins
+
+    :param precision: int
+        The precision at which to store and display the bins labels.
+
+    :param duplicates: {default ‘raise’, ‘drop’}, optional
+        If bin edges are not unique, raise ValueError or drop non-uniques.
+    :return: data with a binned column added for each column, and a dictionary of {column: bins} if retbins
+
+    Bins are the same as pd.qcut. Quantile edges of all columns sharing the same q are computed by one vectorized
+    quantile call for each block of columns, and values are binned with np.searchsorted.
+    '''
+
+    if isinstance(q, dict):
+        cols = list(q.keys())
+    else:
+        cols = list(data.select_dtypes(include='number').columns)
+        q = dict.fromkeys(cols, q)
+
+    missing = [col for col in cols if col not in data.columns]
+    if missing:
+        raise KeyError(f'{missing} not in data columns')
+
+    # Columns are grouped by their quantiles, so the edges of each group come from one vectorized call
+    groups = {}
+    for col in cols:
+        quantiles = np.linspace(0, 1, q[col] + 1) if np.isscalar(q[col]) else np.asarray(q[col], dtype='float64')
+        groups.setdefault(tuple(quantiles), []).append(col)
+
+    bins = {}
+    tmp = {}
+    for quantiles, group in groups.items():
+        for start in range(0, len(group), _BLOCK_SIZE):
+            block = group[start:start + _BLOCK_SIZE]
+            # One row per column, so every column is contiguous in memory
+            values = np.ascontiguousarray(_to_float(data[block]).T)
+            edges = _quantile_edges(values, np.array(quantiles))
+            for i, col in enumerate(block):
+                this_labels = labels.get(col, None) if isinstance(labels, dict) else labels
+                tmp[col], bins[col] = _bin(values[i], edges[:, i], this_labels, precision, duplicates)
+
+    tmp = {col: tmp[col] for col in cols}
+    tmp = pd.DataFrame(tmp, index=data.index).add_suffix(suffix)
+    df = pd.concat([data, tmp], axis=1)
+
+    if retbins:
+        return df, {col: bins[col] for col in cols}
+    return df
+
+
+# Number of columns converted to one float array at a time, which bounds the memory used for wide frames
+_BLOCK_SIZE = 64
+
+
+def _to_float(df):
+    # Float columns are used without a copy. Nullable extension columns need NA converted to NaN
+    if all(isinstance(dtype, np.dtype) for dtype in df.dtypes):
+        return df.to_numpy(dtype='float64')
+    return df.to_numpy(dtype='float64', na_value=np.nan)
+
+
+def _quantile_edges(values, quantiles):
+
+    # values: 2d array with one row per variable. Returns edges with one row per quantile and one column per
+    # variable, interpolated linearly between ranks as in Series.quantile. NaN values are ignored
+    if not np.isnan(values).any():
+        return np.quantile(values, quantiles, axis=1)
+
+    with warnings.catch_warnings():
+        # Columns with no values have NaN edges
+        warnings.simplefilter('ignore', RuntimeWarning)
+        return np.nanquantile(values, quantiles, axis=1)
+
+
+def _bin(values, bins, labels, precision, duplicates):
+
+    # Bins the values of a column like pd.qcut does once the edges are known: right closed intervals including the
+    # lowest edge
+    if duplicates not in ('raise', 'drop'):
+        raise ValueError("invalid value for 'duplicates' parameter, valid options are: raise, drop")
+
+    unique = pd.unique(bins)
+    if len(unique) < len(bins):
+        if duplicates == 'raise':
+            raise ValueError(f'Bin edges must be unique: {repr(bins)}.\n'
+                             f'You can drop duplicate edges by setting the \'duplicates\' kwarg')
+        bins = unique
+
+    ids = np.searchsorted(bins, values, side='left')
+    ids[values == bins[0]] = 1
+    codes = ids - 1
+    codes[np.isnan(values) | (ids == 0) | (ids == len(bins))] = -1
+
+    if labels is False:
+        return (codes if (codes >= 0).all() else np.where(codes >= 0, codes, np.nan)), bins
+
+    if labels is None:
+        # Interval categories are formatted by pandas from the edges alone
+        categories = pd.cut(bins, bins, include_lowest=True, precision=precision).categories
+    else:
+        if len(labels) != len(bins) - 1:
+            raise ValueError('Bin labels must be one fewer than the number of bin edges')
+        categories = labels
+
+    return pd.Categorical.from_codes(codes, categories=categories, ordered=True), bins
+
+
+def remap(data, cats, suffix=None):
+
+    '''
+    Recodes values of columns from a lookup table
+    :param data: A DataFrame
+    :param cats: dictionary or DataFrame
+        Either {column: {value: new value}}, or a table with column, value and code columns with one row per value
+    :param suffix: str
+        Recoded columns are added with suffix. Columns are recoded in place if None
+    :return: A DataFrame
+
+    Values without a new value in cats keep their value. Each distinct value of a column is looked up once.
+    '''
+
+    if isinstance(cats, pd.DataFrame):
+        cats = {col: dict(zip(table['value'], table['code'])) for col, table in cats.groupby('column', sort=False)}
+
+    df = data.copy()
+    for col, mapping in cats.items():
+        if col not in df.columns:
+            continue
+        target = col if suffix is None else f'{col}{suffix}'
+        df[target] = _recode(df[col], mapping)
+
+    return df
+
+
+def _recode(s, mapping):
+
+    codes, uniques = pd.factorize(s)
+    uniques = list(uniques)
+    if not any(value in mapping for value in uniques):
+        return s
+
+    recoded = np.array([mapping.get(value, value) for value in uniques] + [np.nan], dtype=object)
+    return pd.Series(recoded[codes], index=s.index, name=s.name).infer_objects()
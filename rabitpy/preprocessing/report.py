@@ -0,0 +1,338 @@
+# SUMIT report procedures
+
+import numpy as np
+import pandas as pd
+from rabitpy.preprocessing import Metadata
+from rabitpy.preprocessing.stats import ReportStatistics
+
+
+# from pandas.api.types import is_datetime64_any_dtype as is_datetime
+
+# TODO: convert outputs to exit codes
+# TODO: The returns here should be converted to exception and handled in the main code
+def check_dataframe_validity(df, columns=[]):
+    if not isinstance(df, pd.DataFrame):
+        return "The input variable is not a DataFrame!"
+    if df.empty:
+        return "The input DataFrame is empty!"
+    if not set(columns).issubset(df.columns):
+        return "One or more specified column names are not in the DataFrame column list!"
+    return "success!"
+
+
+class DescriptiveReporter:
+    """Common base class for all Reports"""
+    objCount = 0
+
+    def __init__(self, df, dfmeta=None, missing_code=np.nan, skipped_code=-9999, **kwargs):
+
+        '''
+        :param df:
+        :param dfmeta:
+        :param chunksize: Number of rows column statistics are computed on at a time. The whole frame is used if None
+        :param sketch_size: Number of values kept at each level of quantile sketches. Quartiles are exact below it
+        :param max_categories: Number of values counted per categorical column. All values are counted if None
+        :param sample_size: Number of values per column used to infer column types when dfmeta is not given
+        '''
+
+        self.ReportType = ""
+        self.df = df
+        self.md = dfmeta
+        self.missing_code = missing_code
+
+        self.nanfill = kwargs.get('nanfill', missing_code)
+        self.chunksize = kwargs.get('chunksize')
+        self.sketch_size = kwargs.get('sketch_size', 10000)
+        self.max_categories = kwargs.get('max_categories')
+        self.sample_size = kwargs.get('sample_size', 10000)
+
+        # Inferred column types, shared by all reports
+        self.metadata = None
+
+        if not isinstance(skipped_code, float) and not isinstance(skipped_code, int):
+            try:
+                self.skipped_code = float(skipped_code)
+            except ValueError:
+                raise (f'Skipped observation code: {skipped_code} could not be represented as a numeric type.')
+        else:
+            self.skipped_code = skipped_code
+
+        # Column statistics are computed once and reused by all reports
+        self.stats = self._new_statistics()
+
+        DescriptiveReporter.objCount += 1
+        validity = check_dataframe_validity(df)
+
+        if check_dataframe_validity(dfmeta) == 'success!':
+            self.infer_types = False
+        else:
+            self.infer_types = True
+
+        if validity != "success!":
+            raise Exception(validity)
+
+    def type(self, ImputationType):
+        pass
+
+    def get_df(self):
+        return self.df
+
+    def report_numeric_columns(self):
+        """Returns a description of numeric columns of the dataframe"""
+
+        kinds = self._get_numeric_kinds()
+        res = pd.DataFrame()
+        if kinds:
+            # Values that can not be converted to numbers are counted as missing
+            res = self._get_statistics(kinds).numeric_frame(list(kinds.keys()))
+
+        return res
+
+    def _get_numeric_kinds(self):
+
+        # Returns {column: 'numeric'} for numeric columns of df
+        if self.infer_types:
+            metadata = self._get_metadata()
+            int_columns = metadata.find_int_columns()
+            float_columns = metadata.find_float_columns()
+            numCols = int_columns + float_columns
+        else:
+            numCols = self.md.loc[self.md['dType'] == 'numeric', 'fldCode'].to_list()
+
+        return {col: 'numeric' for col in numCols if col in self.df.columns}
+
+    def report_datetime_columns(self):
+        """Returns a description of datetime columns of the dataframe"""
+
+        if self.infer_types:
+            metadata = self._get_metadata()
+            dtCols = list(set(metadata.find_datetime_columns()).intersection(self.df.columns))
+            if dtCols == []:
+                return
+        else:
+            dtCols = self.md.loc[self.md['dType'] == 'datetime', 'fldCode'].to_list()
+
+        self.df[dtCols] = self.df[dtCols].apply(pd.to_datetime)
+        # print(self.df[datetime_columns].describe(datetime_is_numeric=True))
+        res = self.df[dtCols].describe(datetime_is_numeric=True)
+
+        # nulls_percent = []
+        # for col in dtCols:
+        #     nulls_percent.append((((self.df[col].isnull().sum()) * 100) / len(self.df.index)))
+        # res.loc['missings%'] = nulls_percent
+        # nulls = []
+        #
+        # for col in dtCols:
+        #     nulls.append((self.df[col].isnull().sum()))
+        # res.loc['missings_count'] = nulls
+        # res = res.transpose()
+
+        return res
+
+    def report_categorical_columns(self):
+        """:param Returns a description of categorical columns of the dataframe"""
+
+        kinds = self._get_categorical_kinds()
+        res = self._get_statistics(kinds).categorical_frame(list(kinds.keys()))
+
+        # TODO: This should be included where the field is not strictly categorical (str fields for example)
+
+        # ### get n frequent items of categorical columns
+        # n = 32
+        # freq_items = []
+        # for col in sum_columns:
+        #     items = self.df[col].value_counts()[:n].index.tolist()
+        #     count = self.df[col].value_counts()[:n].tolist()
+        #     freq_dict = dict(zip(items, count))
+        #     freq_dict = {k: v for k, v in sorted(freq_dict.items(), key=lambda item: item[1],reverse=True)}
+        #     freq_items.append(freq_dict)
+        #
+        # res.loc["frequent_items"] = freq_items
+        #
+        # res = res.transpose()
+        # # print(res)
+
+        return res
+
+    def _get_categorical_kinds(self):
+
+        # Returns {column: 'category' | 'bool' | 'str'} for categorical columns of df
+        # Infer types or read cv
+        if self.infer_types:
+            metadata = self._get_metadata()
+            cat_columns = metadata.find_categorical_columns()
+            bool_columns = metadata.find_boolean_columns()
+            # time_columns = self.find_datetime_columns()
+            kinds = {**dict.fromkeys(cat_columns, 'category'), **dict.fromkeys(bool_columns, 'bool')}
+        else:
+            sum_columns = self.md.loc[(self.md['dType'] == 'category') |
+                                      (self.md['dType'] == 'bool') |
+                                      ((self.md['dType'] == 'str') & (self.md['elementType'] != 'html')), 'fldCode'] \
+                .drop_duplicates() \
+                .to_list()
+
+            # Each column is reported by its dType. Columns with more than one dType in metadata are left out
+            dtypes = self.md.groupby('fldCode', sort=False)['dType'].unique()
+            kinds = {col: dtypes[col][0] for col in sum_columns if len(dtypes[col]) == 1}
+
+        return {col: kind for col, kind in kinds.items() if col in self.df.columns}
+
+    def report_all_columns(self, nested=False):
+        """Returns a description of all columns of the dataframe"""
+
+        # TODO: DateTime reporting taken out temporarily, will add this feature again soon
+
+        rep = pd.concat([self.report_numeric_columns(),
+                         self.report_categorical_columns()],
+                        ignore_index=False, axis=0)
+
+        if self.infer_types:
+            metadata = self._get_metadata()
+
+            # TODO: this bit can be replaced with the report formatter
+            rep = rep.reset_index().merge(metadata.get_all_column_types(), how='inner', right_on="column",
+                                          left_on='index').drop(
+                columns={"25%", "50%", "75%", "index"}, errors='ignore')
+        else:
+            rep.index.name = 'fldCode'
+            rep.reset_index(inplace=True)
+            rep = self._format_report(rep, nested=nested)
+
+        return rep
+
+    def _format_report(self, rep, nested):
+
+        def report_nester(_rep):
+            # a function to produce nested data structure necessary for presenting in DIGIT
+            _s = pd.Series()
+
+            # TODO: could probably not include the common fields in the aggregation function
+            # set common fields
+            # print(_rep['index'])
+            _s['index'] = _rep['index'].iloc[0]
+            _s['frmCode'] = _rep['frmCode'].unique()[0]
+            _s['fldCode'] = _rep.name
+            _s['dType'] = _rep['dType'].unique()[0]
+            _s['fldTitle'] = _rep['fldTitle'].unique()[0]
+            _s['count'] = _rep['count'].sum()
+            _s['missings_count'] = _rep['missings_count'].mean()
+            _s['missings%'] = _rep['missings%'].mean()
+            _s['skipped_count'] = _rep['skipped_count'].mean()
+
+            # set nested fields depending on whether this reported field has more than one result line or not
+            if _s['dType'] == 'category':
+                cols = ['optVal', 'optText', 'count', 'freq']
+                _s['opt'] = _rep[cols].to_dict(orient='records')
+            elif _s['dType'] == 'numeric':
+                cols = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+                _s['opt'] = _rep[cols].to_dict(orient='records')
+            else:
+                _s['opt'] = []
+
+            return _s.to_frame().transpose()
+
+        self.md.index.name = 'index'
+        md = self.md.reset_index()[['index', 'fldCode', 'fldTitle', 'optVal', 'optText', 'dType', 'frmCode']]
+
+        # rep = rep.merge(self.md[['fldCode', 'fldTitle', 'optVal', 'optText', 'dType', 'frmCode']],
+        #                 how='inner',
+        #                 left_on=['fldCode', 'optVal'],
+        #                 right_on=['fldCode', 'optVal'])
+
+        rep = rep.merge(md,
+                        how='inner',
+                        left_on=['fldCode', 'optVal'],
+                        right_on=['fldCode', 'optVal'])
+
+        rep = rep.fillna(self.nanfill)
+
+        if nested:
+            rep = rep.groupby(by='fldCode').apply(report_nester)
+            colOrder = ['index', 'frmCode', 'fldCode', 'fldTitle', 'dType', 'count',
+                        'missings_count', 'missings%', 'skipped_count', 'opt']
+        else:
+            colOrder = ['index', 'frmCode', 'fldCode', 'fldTitle', 'dType', 'optText', 'optVal', 'count',
+                        'missings_count', 'missings%', 'skipped_count',
+                        'freq', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+
+        # order = self.md.reset_index()[['index', 'frmCode', 'fldCode', 'optVal']]
+        # rep = order.merge(rep, on=['frmCode', 'fldCode', 'optVal'])
+
+        return rep[colOrder]
+
+    def _get_missing_stats(self, _df, dType=None):
+
+        # Counts the number and frequency of missing values taking into account skipped values.
+        # dType: Columns are converted to numbers first if 'numeric'
+        stats = self._new_statistics(dict.fromkeys(_df.columns, dType or 'str'))
+        return stats.update(_df, chunksize=self.chunksize).missing_frame()
+
+    def _get_statistics(self, kinds):
+
+        # kinds: {column: kind}. Statistics of columns that are not computed yet are computed in one pass over df
+        new = self._new_statistics()
+        for col, kind in kinds.items():
+            if col not in self.stats or self.stats[col].kind != kind:
+                new.add(col, kind)
+
+        if new.columns:
+            self.stats.columns.update(new.update(self.df, chunksize=self.chunksize).columns)
+
+        return self.stats
+
+    def _get_metadata(self):
+        if self.metadata is None:
+            self.metadata = Metadata.metadata(self.df, sample_size=self.sample_size)
+        return self.metadata
+
+    def _new_statistics(self, kinds=None):
+        return ReportStatistics(kinds, skipped_code=self.skipped_code, sketch_size=self.sketch_size,
+                                max_categories=self.max_categories)
+
+    def update(self, df):
+
+        """Adds the statistics of new rows, like the next partition of an export or the rows of a delta load.
+        Numeric and categorical reports cover all added rows, other reports only cover the rows of self.df"""
+
+        other = DescriptiveReporter(df, self.md, missing_code=self.missing_code, skipped_code=self.skipped_code,
+                                    nanfill=self.nanfill, chunksize=self.chunksize, sketch_size=self.sketch_size,
+                                    max_categories=self.max_categories, sample_size=self.sample_size)
+        return self.merge(other)
+
+    def merge(self, other):
+
+        """Adds the statistics of another reporter on the same columns, like a chunk or a partition of the data"""
+
+        kinds = {**self._get_numeric_kinds(), **self._get_categorical_kinds()}
+        kinds.update({col: stats.kind for col, stats in self.stats.columns.items()})
+        kinds.update({col: stats.kind for col, stats in other.stats.columns.items()})
+        self._get_statistics(kinds)
+        other._get_statistics(kinds)
+        self.stats.merge(other.stats)
+
+        return self
+
+    def init_set_missing_values(self, missing_values=[]):
+
+        # TODO: Implement this functionality in __init__ so missing and skipped codes can be set by user
+        # TODO: Replacement of missing and skipped values should happen when data is parsed
+
+        """Set any kind of data which we are considering as null"""
+        self.df = self.df.replace({None: np.nan, "NaN": np.nan, "none": np.nan, "na": np.nan})
+        for val in missing_values:
+            self.df = self.df.replace({val: np.nan})
+
+        # Statistics and types of the previous values are stale
+        self.stats = self._new_statistics()
+        self.metadata = None
+
+    def get_missing_values_info(self):
+        if not self.df.isnull().values.any():
+            return "This dataFrame does't have any missing values!"
+        else:
+            total = self.df.isnull().sum().sum()
+            columns_containing_missing = self.df.columns[self.df.isnull().any()].tolist()
+            return f"This DataFrame has {total} missing values!" + \
+                   f"\n The following columns contain missing values: {columns_containing_missing} "
+
+
@@ -0,0 +1,349 @@
+import numpy as np
+import pandas as pd
+
+
+NUMERIC_COLUMNS = ['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max']
+MISSING_COLUMNS = ['missings_count', 'missings%', 'skipped_count']
+
+
+class QuantileSketch:
+
+    def __init__(self, k=10000):
+
+        """
+
+        Mergeable KLL style quantile sketch
+        k: Number of values kept at each level. Quantiles are exact until more than k values are added
+
+        Level h holds values that each stand for 2 ** h observations. A level that grows beyond k values is sorted
+        and every other value is promoted to the next level, so memory grows with log2(n / k). Offsets alternate
+        between compactions to keep the sketch deterministic and unbiased. Rank errors are in the order of
+        log2(n / k) / k.
+
+        """
+
+        self.k = k
+        self.levels = []
+        self.offsets = []
+
+    def __len__(self):
+        return sum(len(items) << h for h, items in enumerate(self.levels))
+
+    def update(self, values):
+        self.__add_level(0, values)
+        return self.__compress()
+
+    def merge(self, other):
+        for h, items in enumerate(other.levels):
+            self.__add_level(h, items)
+        return self.__compress()
+
+    def __add_level(self, h, items):
+        while len(self.levels) <= h:
+            self.levels.append(np.array([], dtype='float64'))
+            self.offsets.append(0)
+        self.levels[h] = np.concatenate([self.levels[h], items])
+
+    def __compress(self):
+
+        h = 0
+        while h < len(self.levels):
+            items = self.levels[h]
+            if len(items) > self.k:
+                items = np.sort(items)
+                rest, items = items[:len(items) % 2], items[len(items) % 2:]
+                self.levels[h] = rest
+                self.__add_level(h + 1, items[self.offsets[h]::2])
+                self.offsets[h] ^= 1
+            h += 1
+
+        return self
+
+    def quantile(self, q):
+
+        # q: A quantile or a list of quantiles. Interpolates linearly between ranks like numpy.quantile
+        if not self.levels:
+            return np.full(np.shape(q), np.nan)
+
+        values = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(items), 2 ** h, dtype='float64') for h, items in enumerate(self.levels)])
+        order = np.argsort(values, kind='stable')
+        values, weights = values[order], weights[order]
+
+        # Each value sits at the middle of the ranks it stands for. With unit weights these are ranks 0 ... n-1
+        ranks = np.cumsum(weights) - (weights + 1) / 2
+        return np.interp(np.asarray(q) * (weights.sum() - 1), ranks, values)
+
+
+class ColumnStatistics:
+
+    def __init__(self, kind='category', skipped_code=-9999, sketch_size=10000, max_categories=None):
+
+        """
+
+        Mergeable statistics of a single report column
+        kind: 'numeric', 'category', 'bool' or 'str', as in the dType column of metadata
+        skipped_code: Code of skipped observations. Values equal to the code or to its string form are skipped
+        sketch_size: Number of values kept at each level of the quantile sketch of numeric columns
+        max_categories: Number of values counted in category and bool columns. All values are counted if None
+
+        Statistics are updated chunk by chunk, and partial statistics of the same column computed on different chunks,
+        forms or workers can be merged. Each chunk is scanned once: category and bool columns with a single
+        value_counts, which gives option counts, missing and skipped values together, and numeric columns with one
+        conversion to float.
+
+        Numeric moments are combined with Welford's method and quartiles come from a QuantileSketch. With
+        max_categories, counts are Misra-Gries heavy hitter summaries: values more frequent than
+        1 / (max_categories + 1) of the column are always kept and their counts are lower bounds.
+
+        """
+
+        self.kind = kind
+        self.skipped_code = skipped_code
+        self.sketch_size = sketch_size
+        self.max_categories = max_categories
+        self.n = 0
+        self.missing = 0
+        self.skipped = 0
+
+        # {value: count} of category and bool columns, skipped and missing values excluded
+        self.counts = {}
+
+        # Numeric moments: number of values, mean and sum of squared differences from the mean
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = np.nan
+        self.max = np.nan
+        self.sketch = QuantileSketch(sketch_size)
+
+    def __add__(self, other):
+        return self.copy().merge(other)
+
+    def copy(self):
+        return ColumnStatistics(self.kind, self.skipped_code, self.sketch_size, self.max_categories).merge(self)
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def update(self, s):
+
+        # s: A chunk of the column as a Series
+        self.n += len(s)
+
+        if self.kind == 'numeric':
+            self.__update_numeric(s)
+        elif self.kind == 'str':
+            # Free text is only counted, its values are not kept
+            missing = int(s.isna().sum())
+            self.missing += missing
+            self.skipped += int(s.isin([self.skipped_code, str(self.skipped_code)]).sum())
+        else:
+            self.__update_counts(s)
+
+        return self
+
+    def __update_counts(self, s):
+
+        counts = s.value_counts(dropna=False, sort=False)
+        isnull = counts.index.isna()
+        isskipped = counts.index.isin([self.skipped_code, str(self.skipped_code)]) & ~isnull
+
+        missing = int(counts.values[isnull].sum())
+        self.missing += missing
+        self.skipped += int(counts.values[isskipped].sum())
+
+        for value, count in zip(counts.index[~isnull & ~isskipped], counts.values[~isnull & ~isskipped]):
+            self.counts[value] = self.counts.get(value, 0) + int(count)
+
+        # Unanswered boolean options are counted as False
+        if self.kind == 'bool' and missing:
+            self.counts[False] = self.counts.get(False, 0) + missing
+
+        self.__prune()
+
+    def __prune(self):
+
+        # Misra-Gries: subtract the count of the first value beyond max_categories and drop values left with none
+        if self.max_categories is None or len(self.counts) <= self.max_categories:
+            return None
+
+        threshold = sorted(self.counts.values(), reverse=True)[self.max_categories]
+        self.counts = {value: count - threshold for value, count in self.counts.items() if count > threshold}
+
+    def __update_numeric(self, s):
+
+        values = pd.to_numeric(s, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        isnull = np.isnan(values)
+        values = values[~isnull]
+
+        self.missing += int(isnull.sum())
+        self.skipped += int((values == self.skipped_code).sum())
+
+        if len(values):
+            mean = float(values.mean())
+            self.__merge_moments(len(values), mean, float(np.square(values - mean).sum()))
+            self.min = float(np.fmin(self.min, values.min()))
+            self.max = float(np.fmax(self.max, values.max()))
+            self.sketch.update(values)
+
+    def __merge_moments(self, count, mean, m2):
+
+        # Chan et al. pairwise update of Welford's running mean and sum of squared differences
+        if not count:
+            return None
+
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    def merge(self, other):
+
+        if other.kind != self.kind:
+            raise ValueError(f'Statistics of {other.kind} columns can not be merged into {self.kind} statistics')
+
+        self.n += other.n
+        self.missing += other.missing
+        self.skipped += other.skipped
+
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self.__prune()
+
+        self.__merge_moments(other.count, other.mean, other.m2)
+        self.min = float(np.fmin(self.min, other.min))
+        self.max = float(np.fmax(self.max, other.max))
+        self.sketch.merge(other.sketch)
+
+        return self
+
+    def missing_stats(self):
+
+        # (missings_count, missings%, skipped_count). Missing values are a percentage of observations not skipped
+        if not self.missing:
+            return 0, 0, self.skipped
+        return self.missing, self.missing * 100 / (self.n - self.skipped), self.skipped
+
+    def describe(self):
+
+        # Numeric summary with the same entries as DataFrame.describe
+        if not self.count:
+            return {'count': 0.0, **{k: np.nan for k in NUMERIC_COLUMNS[1:]}}
+
+        std = np.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else np.nan
+        quartiles = self.sketch.quantile([0.25, 0.5, 0.75])
+
+        return {'count': float(self.count), 'mean': self.mean, 'std': std, 'min': self.min,
+                '25%': quartiles[0], '50%': quartiles[1], '75%': quartiles[2], 'max': self.max}
+
+    def frequencies(self):
+
+        # Returns [(optVal, count, freq), ...] by descending count. Frequencies are percentages of counted values,
+        # which are all values that are not skipped, and not missing unless the column is boolean
+        total = self.n - self.skipped - (self.missing if self.kind != 'bool' else 0)
+        items = sorted(self.counts.items(), key=lambda x: x[1], reverse=True)
+        return [(value, count, count / total * 100) for value, count in items]
+
+
+class ReportStatistics:
+
+    def __init__(self, kinds=None, skipped_code=-9999, sketch_size=10000, max_categories=None):
+
+        """
+
+        Statistics of report columns, updated in one pass over each chunk of a dataframe
+        kinds: A dictionary of the form {column: kind}. See ColumnStatistics for kinds
+        skipped_code: Code of skipped observations
+        sketch_size, max_categories: Passed to ColumnStatistics
+
+        Statistics of the same columns computed on different chunks, forms or workers can be merged with merge or +.
+        Statistics hold no rows of data, so they can be pickled, sent between processes and stored to be merged with
+        statistics of later deltas.
+
+        """
+
+        self.skipped_code = skipped_code
+        self.sketch_size = sketch_size
+        self.max_categories = max_categories
+        self.columns = {}
+
+        for col, kind in (kinds or {}).items():
+            self.add(col, kind)
+
+    def __add__(self, other):
+        return ReportStatistics(skipped_code=self.skipped_code, sketch_size=self.sketch_size,
+                                max_categories=self.max_categories).merge(self).merge(other)
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __contains__(self, col):
+        return col in self.columns
+
+    def __getitem__(self, col):
+        return self.columns[col]
+
+    def add(self, col, kind):
+        self.columns[col] = ColumnStatistics(kind, self.skipped_code, self.sketch_size, self.max_categories)
+        return self.columns[col]
+
+    def update(self, df, chunksize=None):
+
+        # df: A dataframe or a chunk of one. Columns that are not in df are left unchanged
+        cols = [col for col in self.columns.keys() if col in df.columns]
+        chunksize = chunksize or max(len(df), 1)
+
+        for start in range(0, len(df), chunksize):
+            chunk = df.iloc[start:start + chunksize]
+            for col in cols:
+                self.columns[col].update(chunk[col])
+
+        return self
+
+    def merge(self, other):
+
+        for col, stats in other.columns.items():
+            if col in self.columns:
+                self.columns[col].merge(stats)
+            else:
+                self.columns[col] = stats.copy()
+
+        return self
+
+    def missing_frame(self, columns=None):
+        columns = list(self.columns.keys()) if columns is None else columns
+        return pd.DataFrame([self.columns[col].missing_stats() for col in columns],
+                            index=pd.Index(columns), columns=MISSING_COLUMNS, dtype='float64')
+
+    def numeric_frame(self, columns=None):
+
+        # Returns the describe columns of numeric columns, followed by missing stats
+        columns = list(self.columns.keys()) if columns is None else columns
+        res = pd.DataFrame([self.columns[col].describe() for col in columns], index=pd.Index(columns),
+                           columns=NUMERIC_COLUMNS, dtype='float64')
+        return res.join(self.missing_frame(columns))
+
+    def categorical_frame(self, columns=None):
+
+        # Returns one row per option of category and bool columns and one row per str column, indexed by fldCode
+        columns = list(self.columns.keys()) if columns is None else columns
+        fields, values, counts, freqs = [], [], [], []
+
+        for col in columns:
+            stats = self.columns[col]
+            if stats.kind == 'str':
+                rows = [(None, stats.n - stats.missing - stats.skipped, np.nan)]
+            else:
+                rows = stats.frequencies()
+            for value, count, freq in rows:
+                fields.append(col)
+                values.append(value)
+                counts.append(count)
+                freqs.append(freq)
+
+        res = pd.DataFrame({'optVal': np.array(values, dtype=object), 'count': counts,
+                            'freq': np.array(freqs, dtype='float64')},
+                           index=pd.Index(fields, name='fldCode'))
+        return res.merge(self.missing_frame(columns), left_index=True, right_index=True)
@@ -1,2 +1,20 @@
-from .utils.expressions import RabitExpression
-from .io.resources import RabitData, RabitMetadata, RabitDataset, RabitProject
\ No newline at end of file
+import importlib
+
+# Resources depend on pandas and the network stack, so public classes are only imported when first accessed
+_lazy_attributes = {'RabitExpression': '.utils.expressions',
+                    'RabitData': '.io.resources',
+                    'RabitMetadata': '.io.resources',
+                    'RabitDataset': '.io.resources',
+                    'RabitProject': '.io.resources'}
+
+
+def __getattr__(name):
+    try:
+        module = _lazy_attributes[name]
+    except KeyError:
+        raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+    return getattr(importlib.import_module(module, __name__), name)
+
+
+def __dir__():
+    return sorted([*globals().keys(), *_lazy_attributes.keys()])
@@ -1,7 +1,6 @@
 import pandas as pd
 import re
 from math import inf
-from khayyam import JalaliDate
 import numpy as np
 
 """
@@ -67,6 +66,7 @@ def inferdate_format(x):
 
 def to_jalalidate(x, _format=None, errors='coerce'):
     # a wrapper for JalaliDate.strptime function in order to add how to handle errors
+    from khayyam import JalaliDate
     try:
         if _format is not None:
             return JalaliDate.strptime(x, _format)
@@ -93,6 +93,7 @@ def _jalalidate_validator(_s, _meta):
 
 def _jalalidate_limiter(_s, _meta):
     # change data outside defined range_min and range_max to pd.NaT
+    from khayyam import JalaliDate
     _format = _meta.iloc[0].get('format')
     try:
         # TODO check format with pouya
@@ -280,39 +281,41 @@ def handler(data, meta):
     metadata = meta.copy()
     metadata = metadata_handler(metadata)
     df = df.fillna(np.nan).astype(object).replace([np.nan], [None])
+    # Metadata rows of each field are looked up from a dictionary instead of scanning metadata for every column
+    meta_rows = dict(tuple(metadata.groupby(by='fldCode', sort=False)))
     for type_name in ['datetime', 'jalalidate', 'numeric', 'str', 'category', 'bool']:
         # TODO check files format
         cols = metadata.loc[metadata['dType'] == type_name, 'fldCode'].to_list()
         if cols:
             if type_name == 'datetime':
                 try:
-                    df[cols] = df[cols].apply(lambda x: datetime_handler(x, metadata.loc[metadata['fldCode'] == x.name]))
+                    df[cols] = df[cols].apply(lambda x: datetime_handler(x, meta_rows.get(x.name, metadata.iloc[:0])))
                 except Exception:
                     print(e)
                     print('handler datetime')
             if type_name == 'jalalidate':
                 try:
-                    df[cols] = df[cols].apply(lambda x: jalalidate_handler(x, metadata.loc[metadata['fldCode'] == x.name]))
+                    df[cols] = df[cols].apply(lambda x: jalalidate_handler(x, meta_rows.get(x.name, metadata.iloc[:0])))
                 except Exception as e:
                     print(e)
                     print('handler jalalidate')
             elif type_name == 'numeric':
                 try:
-                    df[cols] = df[cols].apply(lambda x: numeric_handler(x, metadata.loc[metadata['fldCode'] == x.name]))
+                    df[cols] = df[cols].apply(lambda x: numeric_handler(x, meta_rows.get(x.name, metadata.iloc[:0])))
                 except Exception as e:
                     print(e)
                     print('handler numeric')
             elif type_name == 'str':
                 try:
-                    df[cols] = df[cols].apply(lambda x: string_handler(x, metadata.loc[metadata['fldCode'] == x.name]))
+                    df[cols] = df[cols].apply(lambda x: string_handler(x, meta_rows.get(x.name, metadata.iloc[:0])))
                 except Exception as e:
                     print(e)
                     print('handler str')
             # elif type_name == 'category':
-            # 	df[cols] = df[cols].apply(lambda x: category_handler(x, metadata.loc[metadata['fldCode'] == x.name]))
+            # 	df[cols] = df[cols].apply(lambda x: category_handler(x, meta_rows.get(x.name, metadata.iloc[:0])))
             elif type_name == 'bool':
                 try:
-                    df[cols] = df[cols].apply(lambda x: bool_handler(x, metadata.loc[metadata['fldCode'] == x.name]))
+                    df[cols] = df[cols].apply(lambda x: bool_handler(x, meta_rows.get(x.name, metadata.iloc[:0])))
                 except Exception as e:
                     print(e)
                     print('handler bool')
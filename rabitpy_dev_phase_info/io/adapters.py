@@ -1,15 +1,22 @@
 import logging
 from abc import ABC, abstractmethod
 from rabitpy_dev_phase_info.errors import APINotAvailableError
-import requests
+import codecs
 import json
+import mmap
 import os
+from contextlib import contextmanager
 import re
-from sqlalchemy import create_engine
-from rabitpy_dev_phase_info.utils import timing
+from rabitpy_dev_phase_info.utils import timing, jsoncodec
 import math
 
-requests.packages.urllib3.disable_warnings()
+
+def _import_requests():
+
+    # requests is only imported once an API adapter is actually used
+    import requests
+    requests.packages.urllib3.disable_warnings()
+    return requests
 
 
 class RabitReaderBaseAdapter(ABC):
@@ -50,6 +57,8 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
     @property
     def req(self):
 
+        requests = _import_requests()
+
         if self.method == 'POST':
             # TODO: This requires adding a body to the request and other post options which may be needed
             self._req = requests.Request(self.method, self.url, params=self.parameters, headers=self.headers).prepare()
@@ -86,6 +95,8 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
     @timing
     def fetch(self):
 
+        requests = _import_requests()
+
         retry_strategy = requests.packages.urllib3.util.retry.Retry(connect=1)
         adapter = requests.adapters.HTTPAdapter(max_retries=retry_strategy)
 
@@ -108,7 +119,7 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
                         f'Error getting data from API. Process exited with status code: {res.status_code}')
                 else:
                     try:
-                        fetched_data = json.loads(res.text)
+                        fetched_data = jsoncodec.loads(res.text)
                         fetched_content += fetched_data['content']
                         print(f'Fetched {pagenum} of {fetched_data["totalPages"]}')
                         if pagenum == fetched_data['totalPages']:
@@ -132,7 +143,7 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
                     f'Error getting data from API. Process exited with status code: {res.status_code}')
             else:
                 try:
-                    return json.loads(res.text)
+                    return jsoncodec.loads(res.text)
                 except json.decoder.JSONDecodeError:
                     if not res.text:
                         raise ValueError(f'Empty response recieved while fetching from {res.url}...')
@@ -142,20 +153,78 @@ class RabitReaderAPIAdapter(RabitReaderBaseAdapter):
 
 class RabitReaderJSONFileAdapter(RabitReaderBaseAdapter):
 
-    def __init__(self, fp=None, encoding='utf-8'):
+    def __init__(self, fp=None, encoding='utf-8', lines=None, chunksize=None):
+
+        """
+        fp: Path of a JSON file, or of an NDJSON file with one JSON document per line
+        encoding: Text encoding of the file
+        lines: Whether the file is NDJSON. Files ending with .ndjson or .jsonl are read as NDJSON if None
+        chunksize: If given, NDJSON records are decoded and yielded in batches of this size by fetch_chunks
+
+        Files are memory mapped and decoded from the mapped pages, so no intermediate copy of the file is read into
+        memory. NDJSON files are decoded one line at a time, and with a chunksize only one batch of records is held at
+        a time.
+        """
+
         self.fp = fp
         self.encoding = encoding
+        self.lines = lines if lines is not None else str(fp).lower().endswith(('.ndjson', '.jsonl'))
+        self.chunksize = chunksize
 
     def fetch(self):
 
-        if not os.path.isfile(self.fp):
-            raise FileNotFoundError(f'The specified path {self.fp} is not a file...')
+        if self.lines:
+            return [record for chunk in self.fetch_chunks() for record in chunk]
+
+        with self.__map() as mm:
+            if mm is None:
+                raise ValueError(f'The file {self.fp} is empty...')
+            with memoryview(mm) as buffer:
+                return self.__loads(buffer)
+
+    def fetch_chunks(self, chunksize=None):
+
+        # Yields lists of at most chunksize records of an NDJSON file. A JSON file is yielded as a single document
+        if not self.lines:
+            yield self.fetch()
+            return
+
+        chunksize = chunksize if chunksize else self.chunksize
+        with self.__map() as mm:
+            if mm is None:
+                return
+            chunk = []
+            for line in iter(mm.readline, b''):
+                if not line.strip():
+                    continue
+                chunk.append(self.__loads(line))
+                if chunksize and len(chunk) >= chunksize:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    @contextmanager
+    def __map(self):
 
         if not os.path.exists(self.fp):
             raise FileNotFoundError(f'The specified path {self.fp} does not exist...')
 
-        with open(self.fp) as f:
-            return json.load(f)
+        if not os.path.isfile(self.fp):
+            raise FileNotFoundError(f'The specified path {self.fp} is not a file...')
+
+        with open(self.fp, 'rb') as f:
+            # Empty files can not be mapped
+            if not os.fstat(f.fileno()).st_size:
+                yield None
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+    def __loads(self, buffer):
+        if codecs.lookup(self.encoding).name == 'utf-8':
+            return jsoncodec.loads(buffer, strict=False)
+        return jsoncodec.loads(str(buffer, self.encoding), strict=False)
 
     @property
     def filters(self):
@@ -170,15 +239,29 @@ class RabitReaderJSONFileAdapter(RabitReaderBaseAdapter):
 
 class RabitReaderJSONObjAdapter(RabitReaderBaseAdapter):
 
-    def __init__(self, obj=None):
+    def __init__(self, obj=None, copy=True):
+
+        """
+        obj: A JSON string, or a dictionary or list of JSON compatible objects
+        copy: If False, fetch returns obj itself instead of a deep copy
+
+        Without a copy, fetched objects are shared with the caller and readonly is True. Resources then treat them as
+        read-only and copy a record before changing it, so replaying an in-memory or cached dump costs no copies.
+        """
+
         self.obj = obj
+        self.copy = copy
+
+    @property
+    def readonly(self):
+        return not self.copy and not isinstance(self.obj, str)
 
     def fetch(self):
 
         if isinstance(self.obj, str):
-            return json.loads(self.obj)
+            return jsoncodec.loads(self.obj)
         elif isinstance(self.obj, dict) or isinstance(self.obj, list):
-            return json.loads(json.dumps(self.obj))
+            return jsoncodec.deepcopy(self.obj) if self.copy else self.obj
 
     @property
     def filters(self):
@@ -193,12 +276,75 @@ class RabitReaderJSONObjAdapter(RabitReaderBaseAdapter):
 
 class RabitDatabaseAdapter(RabitReaderBaseAdapter):
 
-    def __init__(self, url, query, connect_args={}):
-        self.engine = create_engine(url, connect_args=connect_args)
-        self.query = query
+    def __init__(self, url, query, connect_args={}, parameters=None, chunksize=None, pool_size=None,
+                 max_overflow=None, pool_recycle=None, pool_timeout=None, pool_pre_ping=False):
+
+        """
+        url: SQLAlchemy database url
+        query: SQL string or SQLAlchemy selectable. Use named :placeholders in SQL strings and pass values in parameters
+        parameters: A dictionary of values bound to the query placeholders
+        chunksize: If given, rows are read through a server-side cursor and fetched in batches of this size
+        pool_size, max_overflow, pool_recycle, pool_timeout, pool_pre_ping: Connection pool configuration passed to
+            sqlalchemy.create_engine. Options left as None use the dialect defaults
+        """
+
+        # sqlalchemy is only needed for database sources
+        from sqlalchemy import create_engine, text
+
+        pool_options = {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_recycle': pool_recycle,
+                        'pool_timeout': pool_timeout}
+        pool_options = {k: v for k, v in pool_options.items() if v is not None}
+
+        self.engine = create_engine(url, connect_args=connect_args, pool_pre_ping=pool_pre_ping, **pool_options)
+        self.query = text(query) if isinstance(query, str) else query
+        self.parameters = parameters if parameters is not None else {}
+        self.chunksize = chunksize
 
     def fetch(self):
-        return [dict(x) for x in self.engine.execute(self.query).mappings().all()]
+
+        if self.chunksize:
+            return [row for chunk in self.fetch_chunks() for row in chunk]
+
+        with self.__execute() as result:
+            return [dict(x) for x in result.mappings()]
+
+    def fetch_chunks(self, chunksize=None):
+
+        """
+        Streams rows through a server-side cursor and yields them in lists of at most chunksize records. Errors are
+        raised as in fetch, also when they happen while rows are streamed.
+
+        Streaming only bounds the memory used by raw records fetched from the database. Resources parsing the chunks,
+        like RabitData.parse, still collect the parsed responses of all chunks into a single dataframe.
+        """
+
+        chunksize = chunksize if chunksize else self.chunksize
+        if not chunksize:
+            raise ValueError('chunksize must be set to fetch database rows in chunks')
+
+        with self.__execute(stream_results=True, yield_per=chunksize) as result:
+            for partition in result.mappings().partitions(chunksize):
+                yield [dict(x) for x in partition]
+
+    @contextmanager
+    def __execute(self, **options):
+
+        # Runs the query with execution options. As with API sources, an unreachable or lost database raises
+        # APINotAvailableError and a failing query raises ValueError. Urls are shown without their password
+        from sqlalchemy.exc import DBAPIError, SQLAlchemyError
+
+        try:
+            conn = self.engine.connect()
+        except SQLAlchemyError as e:
+            raise APINotAvailableError(f'Error connecting to database {self.engine.url!r}: {e}') from e
+
+        with conn:
+            try:
+                yield conn.execution_options(**options).execute(self.query, self.parameters)
+            except SQLAlchemyError as e:
+                if isinstance(e, DBAPIError) and e.connection_invalidated:
+                    raise APINotAvailableError(f'Lost connection to database {self.engine.url!r}: {e}') from e
+                raise ValueError(f'Error running query on database {self.engine.url!r}: {e}') from e
 
     @property
     def filters(self):
@@ -209,4 +355,3 @@ class RabitDatabaseAdapter(RabitReaderBaseAdapter):
 
     def reset_filters(self):
         pass
-
@@ -0,0 +1,208 @@
+import warnings
+
+
+METADATA_COLUMNS = ('frmCode', 'frmName', 'frmDesc', 'fldCode', 'fldTitle', 'fldParentCode', 'fldParentTitle',
+                    'elementType', 'visibleCondition', 'expression', 'validators', 'optVal', 'optText', 'opt', 'dType')
+
+_DTYPES = {'expression': 'numeric', 'comment': 'str', 'html': 'str', 'file': 'str', 'radiogroup': 'category',
+           'dropdown': 'category', 'rating': 'category', 'boolean': 'category', 'checkbox': 'bool', 'tagbox': 'bool'}
+
+_TEXT_DTYPES = {'number': 'numeric', 'date': 'datetime', 'date-jalali': 'jalalidate'}
+
+
+def _translation_handler(s, target, alt):
+    if target in s:
+        if isinstance(s[target], dict):
+            return s[target].get('fa', s[target].get('default'))
+        else:
+            return s[target]
+    else:
+        return alt
+
+
+class _ElementView:
+
+    # Read-only view of a survey element with some of its properties overridden. Nested elements are flattened
+    # through views so the survey JSON itself is never modified.
+    __slots__ = ('element', 'overrides')
+
+    def __init__(self, element, overrides):
+        self.element = element
+        self.overrides = overrides
+
+    def __contains__(self, key):
+        return key in self.overrides or key in self.element
+
+    def __getitem__(self, key):
+        return self.overrides[key] if key in self.overrides else self.element[key]
+
+    def get(self, key, default=None):
+        return self.overrides[key] if key in self.overrides else self.element.get(key, default)
+
+
+class RabitElementWalker:
+
+    def __init__(self, extract_choices, include_html=False):
+
+        """
+
+        Flattens survey JSON elements into metadata rows
+        extract_choices: A function returning the choices of an element, or None if it has no choices
+        include_html: Include html elements in output rows
+
+        Rows are tuples of values for METADATA_COLUMNS, with one row per field or per field option. Elements are
+        walked through read-only views, so survey JSON objects are not modified and can be walked concurrently.
+
+        """
+
+        self.extract_choices = extract_choices
+        self.include_html = include_html
+
+    def walk(self, element, fid, frm_name, frm_desc, rows=None):
+
+        # Appends the rows of a top level element of a form to rows and returns them
+        rows = [] if rows is None else rows
+        self.__walk(element, self.extract_choices(element), (fid, frm_name, frm_desc), '', rows, self.include_html)
+        return rows
+
+    def __walk(self, el, choices, frm, prefix, rows, include_html=False):
+
+        # prefix: element types of the parent elements, like 'panel - matrix - '
+        if el['type'] == 'html' and not include_html:
+            return None
+
+        etype = el.get('type')
+        name = el.get('name')
+
+        # Multiple text
+        if etype == 'multipletext':
+            parent_title = _translation_handler(s=el, target='title', alt='')
+            for item in el.get('items'):
+                child = _ElementView(item, {'name': '{}_{}'.format(el.get('name', ''), item.get('name')),
+                                            'type': 'text',
+                                            'visibleIf': el.get('visibleIf'),
+                                            'fldParentCode': el.get('name', ''),
+                                            'fldParentTitle': parent_title})
+                self.__walk(child, None, frm, f'{prefix}multipletext - ', rows)
+            return None
+
+        # Matrix
+        if etype == 'matrix':
+            parent_title = _translation_handler(s=el, target='title', alt=name)
+            for fld in el.get('rows'):
+                if isinstance(fld, dict):
+                    child = {'name': '{}_{}'.format(name, fld.get('value')),
+                             'title': '{} - {}'.format(parent_title,
+                                                       _translation_handler(s=fld, target='text', alt=fld.get('name')))}
+                elif isinstance(fld, str):
+                    child = {'name': '{}_{}'.format(name, fld), 'title': fld}
+                else:
+                    raise TypeError(f'Matrix row type is {type(fld)} and not dict or string...')
+
+                child.update({'choices': el.get('columns'),
+                              'type': 'radiogroup',
+                              'visibleIf': el.get('visibleIf'),
+                              'fldParentCode': name,
+                              'fldParentTitle': parent_title})
+                self.__walk(child, choices, frm, f'{prefix}matrix - ', rows)
+            return None
+
+        # Dropdown Matrix
+        if etype == 'matrixdropdown':
+            ttl = _translation_handler(s=el, target='title', alt=name)
+            for row in el.get('rows'):
+                if isinstance(row, dict):
+                    parent_title = f"{ttl} - {row.get('text', row.get('value'))}"
+                    parent_code = f"{name}_{row.get('value')}"
+                elif isinstance(row, str):
+                    parent_title = f"{ttl} - {row}"
+                    parent_code = f"{name}_{row}"
+                else:
+                    raise TypeError(f'Matrix row type is {type(row)} and not dict or string...')
+
+                # TODO: Check visibleIf condition for column and rows and implement if necessary
+                for col in el.get('columns'):
+                    child = {'type': col.get('cellType', 'dropdown'),
+                             'title': f"{parent_title} - {_translation_handler(s=col, target='title', alt=col.get('name'))}",
+                             'name': f"{parent_code}_{col.get('name')}",
+                             'fldParentCode': parent_code,
+                             'fldParentTitle': parent_title}
+                    self.__walk(child, self.extract_choices(col), frm, f'{prefix}matrixdropdown - ', rows)
+            return None
+
+        # Panel
+        if etype == 'panel':
+            for item in el.get('elements', []):
+                code = '{}'.format(item.get('name'))
+                child = _ElementView(item, {'name': code,
+                                            'fldParentCode': code,
+                                            'fldParentTitle': _translation_handler(s=item, target='title', alt=code)})
+                self.__walk(child, self.extract_choices(child), frm, f'{prefix}panel - ', rows)
+            return None
+
+        # Dynamic Matrix
+        if etype == 'matrixdynamic':
+            warnings.warn('Dynamic matrix parsing is currently experimental...')
+            parent_title = f"{_translation_handler(s=el, target='title', alt=name)}"
+            parent_code = f"{name}_r1"
+
+            # TODO: Check visibleIf condition for column and rows and implement if necessary
+            for col in el.get('columns'):
+                child = {'type': col.get('cellType', 'dropdown'),
+                         'title': f"{parent_title} - {_translation_handler(s=col, target='title', alt=col.get('name'))}",
+                         'name': f"{parent_code}_{col.get('name')}"}
+                self.__walk(child, self.extract_choices(col), frm, f'{prefix}matrixdynamic - ', rows)
+            return None
+
+        # Dynamic panel
+        if etype == 'paneldynamic':
+            warnings.warn('Dynamic panel parsing is currently experimental...')
+            for item in el.get('templateElements', []):
+                child = _ElementView(item, {'name': f"{name}_r1_{item.get('name')}"})
+                if child['type'] not in ['matrix', 'matrixdropdown', 'matrixdynamic']:
+                    self.__walk(child, self.extract_choices(child), frm, f'{prefix}paneldynamic - ', rows)
+                else:
+                    self.__walk(child, None, frm, f'{prefix}paneldynamic - ', rows)
+            return None
+
+        self.__leaf(el, choices, frm, prefix, rows)
+
+    def __leaf(self, el, choices, frm, prefix, rows):
+
+        # Emits the rows of a single field and one row per option of fields with choices
+        name = el.get('name')
+        title = _translation_handler(el, 'title', name)
+        etype = el.get('type')
+
+        if etype == 'text':
+            dtype = _TEXT_DTYPES.get(el.get('inputType', ''), 'str')
+        else:
+            dtype = _DTYPES.get(etype)
+
+        element_type = f'{prefix}{etype}' if prefix else etype
+        head = (*frm, name, title, el.get('fldParentCode', name), el.get('fldParentTitle', title))
+        tail = (el.get('visibleIf', ''), el.get('expression', ''), el.get('validators'))
+
+        if choices is not None and etype not in ['matrixdropdown', 'matrixdynamic']:
+            for choice in choices:
+                # set value and label of choice
+                if isinstance(choice, dict):
+                    value = str(choice.get('value')).strip()
+                    text = _translation_handler(choice, 'text', choice.get('value'))
+                else:
+                    value = str(choice).strip()
+                    text = str(choice).strip()
+
+                # Each option of a checkbox is a separate boolean field
+                if etype == 'checkbox':
+                    rows.append((*frm, '{}_{}'.format(name, value), '{} - {}'.format(title, text), *head[5:],
+                                 element_type, *tail, value, text, None, dtype))
+                else:
+                    rows.append((*head, element_type, *tail, value, text, None, dtype))
+        else:
+            rows.append((*head, element_type, *tail, None, None, None, dtype))
+
+        # Add 'other' option if it is active
+        if el.get('hasOther'):
+            rows.append((*frm, '{}_{}'.format(el['name'], 'comment'), '{} - {}'.format(title, 'other'), *head[5:],
+                         f'{prefix}text', *tail, None, None, None, 'str'))
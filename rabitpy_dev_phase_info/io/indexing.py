@@ -0,0 +1,113 @@
+import numpy as np
+import pandas as pd
+
+
+class RabitMetadataIndex:
+
+    def __init__(self, md, mdn=None):
+
+        """
+
+        Hash map lookups over parsed RABIT metadata, built once instead of scanning metadata for every field
+        md: Flat metadata with one row per field option
+        mdn: Nested metadata with one row per field. md is used where mdn is not given
+
+        forms: {str(frmCode): frmCode} so forms can be looked up by their string representation
+        form_fields: {frmCode: [(fldCode, fldTitle), ...]} in nested metadata order
+        form_rows: {frmCode: positions of the form rows in md}
+        field_rows: {fldCode: positions of the field rows in md}
+        field_options: {fldCode: {frmCode: {optVal: optText}}}
+        children: {fldParentCode: {frmCode: [fldCode, ...]}} for fields nested in panels, matrices and checkboxes
+
+        """
+
+        self.md = md
+        self.mdn = mdn
+        self.forms = {}
+        self.form_fields = {}
+        self.form_rows = {}
+        self.field_rows = {}
+        self.field_options = {}
+        self.children = {}
+
+        if isinstance(md, pd.DataFrame):
+            self.__build()
+
+    def __build(self):
+
+        md = self.md
+        mdn = self.mdn if isinstance(self.mdn, pd.DataFrame) else md
+
+        self.form_rows = md.groupby(by='frmCode', sort=False).indices
+        self.field_rows = md.groupby(by='fldCode', sort=False).indices
+
+        parents = mdn['fldParentCode'] if 'fldParentCode' in mdn.columns else mdn['fldCode']
+
+        for frm, fld, title, parent in zip(mdn['frmCode'], mdn['fldCode'], mdn['fldTitle'], parents):
+            self.forms.setdefault(str(frm), frm)
+            self.form_fields.setdefault(frm, []).append((fld, title))
+            if isinstance(parent, str) and parent != fld:
+                self.children.setdefault(parent, {}).setdefault(frm, []).append(fld)
+
+        if 'optVal' in md.columns:
+            ix = md['optVal'].notna()
+            for frm, fld, val, text in zip(md.loc[ix, 'frmCode'], md.loc[ix, 'fldCode'],
+                                           md.loc[ix, 'optVal'], md.loc[ix, 'optText']):
+                self.field_options.setdefault(fld, {}).setdefault(frm, {})[val] = text
+
+    def is_current(self, md, mdn):
+        # The index is bound to the metadata frames it was built from and is stale once they are replaced
+        return self.md is md and self.mdn is mdn
+
+    def get_forms(self, fid=None):
+
+        # fid: A form code or a list of form codes, compared by their string representation as in RabitMetadata
+        if fid is None:
+            return list(self.form_fields.keys())
+
+        fid = set(map(str, fid)) if isinstance(fid, list) else {str(fid)}
+        return [frm for frm in self.form_fields.keys() if str(frm) in fid]
+
+    def get_fields(self, frm):
+        # Unique field codes of a form in metadata order
+        return list(dict.fromkeys(fld for fld, _ in self.form_fields.get(frm, [])))
+
+    def get_rows(self, fld=None, frm=None):
+
+        # Returns md rows of a field and/or a form
+        if fld is None and frm is None:
+            return self.md
+
+        positions = None
+        for key, lookup in [(fld, self.field_rows), (frm, self.form_rows)]:
+            if key is None:
+                continue
+            rows = lookup.get(key, np.array([], dtype=np.intp))
+            positions = rows if positions is None else positions[np.isin(positions, rows)]
+
+        return self.md.take(positions)
+
+    def get_options(self, fld=None, frm=None):
+
+        # Returns {optVal: optText} for a field, or {fldCode: {optVal: optText}} for all fields of a form
+        if fld is not None:
+            opts = self.field_options.get(fld, {})
+            if frm is not None:
+                return opts.get(frm, {})
+            return {k: v for _opts in opts.values() for k, v in _opts.items()}
+
+        fields = self.get_fields(frm) if frm is not None else self.field_options.keys()
+        options = ((_fld, self.get_options(_fld, frm)) for _fld in fields if _fld in self.field_options)
+        return {_fld: opts for _fld, opts in options if opts}
+
+    def get_children(self, parent, frm=None):
+        children = self.children.get(parent, {})
+        if frm is not None:
+            return children.get(frm, [])
+        return list(dict.fromkeys(fld for flds in children.values() for fld in flds))
+
+    def get_dtypes(self, frm):
+        # {fldCode: dType} of a form. The first metadata row of each field is used
+        rows = self.get_rows(frm=frm)
+        rows = rows.drop_duplicates(subset=['fldCode'])
+        return dict(zip(rows['fldCode'], rows['dType']))
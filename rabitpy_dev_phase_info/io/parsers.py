@@ -1,34 +1,122 @@
 import re
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
 
+
+# Pandas dtypes used for each metadata dType when typing output frames. Anything not listed is stored as string
+_DTYPES = {'numeric': 'float64', 'category': 'category', 'bool': 'boolean', 'str': 'string', 'datetime': 'datetime'}
+
+_BOOL_VALUES = {True: True, 'True': True, 'true': True, '1': True, 1: True,
+                False: False, 'False': False, 'false': False, '0': False, 0: False}
+
 def _add_dynamics_to_metadata(md, dynamics_counter):
 
-    # get all dynamic fields in the metadata
-    ix = (md['elementType'].str.startswith('matrixdynamic')) | (md['elementType'].str.startswith('paneldynamic'))
-    dynamic_fields = md.loc[ix].to_dict(orient='records')
+    # dynamics_counter: A dictionary of the form {frmCode: {dynamic_field: maximum number of repeats}}
+    counters = pd.DataFrame({'frmCode': list(dynamics_counter.keys()), 'dc': list(dynamics_counter.values())})
+    return pd.concat([md, _expand_dynamic_fields(md, counters, on=['frmCode'])])
 
-    # for each record in dynamic fields add them to the nested metadata
-    for fld in dynamic_fields:
-        fc = dynamics_counter.get(fld['frmCode'])
 
-        try:
-            k = list(filter(lambda x: fld['fldCode'].startswith(f'{x}_r'), fc))
-        except:
+def _split_repeat_code(code, key):
+
+    # Splits codes like "{key}_r1_field" into ("{key}_r", "_field") so that repeat i is head + i + tail.
+    # Codes not following this pattern are kept as they are for all repeats.
+    m = re.match(f'^{re.escape(key)}_r\\d+_', code) if isinstance(code, str) else None
+    return (f'{key}_r', f'_{code[m.end():]}') if m else (None, None)
+
+
+def _expand_dynamic_fields(md, counters, on=('frmCode',), title_postfix=None, number_col=None):
+
+    '''
+        Generates the metadata rows of repeated dynamic panel and matrix fields.
+
+        md: flat metadata. Rows of dynamic fields are those with elementType starting with matrixdynamic or paneldynamic
+        counters: DataFrame with the "on" columns and a "dc" column holding {dynamic_field: maximum number of repeats}
+        on: columns dynamic fields are matched with counters on
+        title_postfix: if given, " - {title_postfix}{i}" is added to fldTitle and fldParentTitle of the repeats
+        number_col: if given, the repeat number of each row is stored in this column
+
+        Returns rows for repeats 2 to N of each dynamic field, ordered by md row and repeat number.
+    '''
+
+    on = list(on)
+    ix = (md['elementType'].str.startswith('matrixdynamic', na=False)) | \
+         (md['elementType'].str.startswith('paneldynamic', na=False))
+
+    # Counters are joined to dynamic fields through a hash map. The first counter of a form is used.
+    lookup = {}
+    for keys, dc in zip(zip(*[counters[col] for col in on]), counters['dc']):
+        if isinstance(dc, dict) and dc:
+            lookup.setdefault(keys, dc)
+
+    positions, counts, codes, parents = [], [], [], []
+    dynamic = md.loc[ix]
+
+    for pos, keys, code, parent in zip(np.flatnonzero(ix), zip(*[dynamic[col] for col in on]),
+                                       dynamic['fldCode'], dynamic['fldParentCode']):
+        dc = lookup.get(keys)
+        key = next((k for k in dc if code.startswith(f'{k}_r')), None) if dc and isinstance(code, str) else None
+        if key is None:
             continue
 
         try:
-            n = fc[k[0]]
-            for i in range(2, n + 1):
-                this_fld = fld.copy()
-                this_fld['fldCode'] = re.sub(f'^{k[0]}_r\d+_', f'{k[0]}_r{i}_', fld['fldCode'])
-                this_fld['fldParentCode'] = re.sub(f'^{k[0]}_r\d+_', f'{k[0]}_r{i}_', fld['fldParentCode'])
-                md = pd.concat([md, pd.Series(this_fld).to_frame().T])
-        except IndexError:
-            pass
-        except ValueError:
-            pass
+            n = int(dc[key])
+        except (TypeError, ValueError):
+            continue
+
+        if n > 1:
+            positions.append(pos)
+            counts.append(n - 1)
+            codes.append(_split_repeat_code(code, key))
+            parents.append(_split_repeat_code(parent, key))
+
+    if not positions:
+        return md.iloc[:0]
+
+    # All repeats are generated at once: row p of md is repeated counts[p] times with repeat numbers 2 to N
+    counts = np.array(counts)
+    out = md.take(np.repeat(positions, counts)).reset_index(drop=True)
+    repeat = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) + 2
+    rstr = pd.Series(repeat).astype(str)
+
+    for col, parts in [('fldCode', codes), ('fldParentCode', parents)]:
+        head = pd.Series(np.repeat([h for h, _ in parts], counts))
+        tail = pd.Series(np.repeat([t for _, t in parts], counts))
+        out[col] = (head.fillna('') + rstr + tail.fillna('')).where(head.notna(), out[col])
+
+    if title_postfix is not None:
+        for col in ['fldTitle', 'fldParentTitle']:
+            out[col] = out[col].astype(str) + f' - {title_postfix}' + rstr
+
+    if number_col is not None:
+        out[number_col] = repeat
+
+    return out
 
-    return md
+
+def _str_join(*parts):
+
+    # Vectorized equivalent of an f-string over columns. Series are converted with str as f-strings do and other
+    # parts are used as literals, e.g. _str_join('p', md['phase_id'], '.f', md['frmCode']) for f"p{phase_id}.f{frmCode}"
+    out = None
+    for part in parts:
+        part = part.astype(str) if isinstance(part, pd.Series) else str(part)
+        out = part if out is None else out + part
+    return out
+
+
+def _map_values(s, mapping):
+
+    # Maps values of s through a {value: label} dictionary, keeping values which are not in mapping.
+    # Values are factorized so each distinct value is looked up once.
+    codes, uniques = pd.factorize(s)
+    labels = [mapping.get(x, x) for x in uniques]
+
+    if all(label is x for label, x in zip(labels, uniques)):
+        return s
+
+    labels = np.array(labels + [None], dtype=object)
+    return pd.Series(np.where(codes < 0, s.to_numpy(dtype=object), labels[codes]), index=s.index, name=s.name)
 
 
 def _set_order(md, fields):
@@ -56,7 +144,17 @@ def _replace_set(s, rndct):
         return s
 
 
-def _sync_data_metadata(obvs, remap_dict=None, md=None):
+def _sync_data_metadata(obvs, remap_dict=None, md=None, workers=None):
+
+    '''
+        Builds one wide frame of responses for each form, with the form's metadata fields first
+        obvs: DataFrame with index_fields + json
+        remap_dict: {frmCode: {fldCode: new fldCode}} renames applied to the responses of each form
+        md: Metadata as a DataFrame or a list of records
+        workers: Number of processes forms are synced in. Forms are synced in this process if None or 1
+
+        Returns {frmCode: DataFrame}
+    '''
 
     if isinstance(md, list):
         # get fields in forms in the shape of {frmCode1: [fldCode1, fldCode2, ...]}
@@ -66,31 +164,40 @@ def _sync_data_metadata(obvs, remap_dict=None, md=None):
     else:
         raise TypeError(f'Metadata should either be in Pandas DataFrame or List form, got {type(md)}')
 
+    remap_dict = remap_dict or {}
 
-    # obvs is DataFrame with index_fields + json
-    # obvsgbo = obvs.groupby(by=['frmCode', 'phaseId'])
-    obvsgbo = obvs.groupby(by=['frmCode'])
-    obvslst = {}
+    # Field codes of all forms in field order, looked up once instead of filtering metadata for each form
+    if 'fldOrder' in mdf.columns:
+        mdf = mdf.sort_values('fldOrder', kind='stable')
+    form_fields = mdf.groupby(by='frmCode', sort=False)['fldCode'].unique()
 
-    # Process responses for each form in each phase separately
-    for name, obvg in obvsgbo:
-        # extract field codes from metadata
-        # this_form_fields = mdf.loc[(mdf['frmCode'] == name[0]) & (mdf['phaseId'] == name[1])] \
-        #     .sort_values('fldOrder')['fldCode'].unique()
+    # Process responses for each form separately
+    tasks = [(name, obvg, form_fields.get(name, []), remap_dict.get(name, {}))
+             for name, obvg in obvs.groupby(by='frmCode')]
 
-        this_form_fields = mdf.loc[(mdf['frmCode'] == name)] \
-            .sort_values('fldOrder')['fldCode'].unique()
+    if workers is None or workers <= 1 or len(tasks) <= 1:
+        return {name: _sync_form(obvg, fields, remap) for name, obvg, fields, remap in tasks}
 
-        # Define an empty dataframe with all necessary fields
-        this_df = pd.DataFrame(columns=this_form_fields)
+    # Forms are independent, so they are synced concurrently. Forms are sent to processes in batches to limit the
+    # number of round trips, and results keep the order of forms
+    chunksize = max(len(tasks) // (workers * 4), 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        frames = executor.map(_sync_form, *list(zip(*tasks))[1:], chunksize=chunksize)
+        return dict(zip([task[0] for task in tasks], frames))
 
-        # Create a dataframe from current records and apply remapping dictionary for this form
-        tmp = this_df.append(obvg['json'].apply(pd.Series).rename(columns=remap_dict.get(name, {})))
 
-        # Update observations list
-        obvslst.update({name: pd.concat([obvg.drop(columns=['json']), tmp], axis=1)})
+def _sync_form(obvg, fields, remap):
 
-    return obvslst
+    # Create a dataframe from current records in one constructor call and apply remapping dictionary for this form.
+    # Empty or unparsable responses have no answers
+    records = [x if isinstance(x, dict) else {} for x in obvg['json'].tolist()]
+    tmp = pd.DataFrame.from_records(records, index=obvg.index).rename(columns=remap)
+
+    # Metadata fields come first, followed by any response fields not found in metadata
+    known = set(fields)
+    tmp = tmp.reindex(columns=[*fields, *[col for col in tmp.columns if col not in known]])
+
+    return pd.concat([obvg.drop(columns=['json']), tmp], axis=1)
 
 
 def _sync_data_phase(o, ph):
@@ -104,3 +211,51 @@ def _sync_data_phase(o, ph):
 
     return o
 
+
+def _coerce_dtypes(df, dtypes, categories=None):
+
+    # dtypes: a dictionary of the form {column: dType} where dType is a RABIT metadata data type
+    # categories: a dictionary of the form {column: [category1, category2, ...]} for category columns
+    df = df.copy()
+
+    for col, dtype in dtypes.items():
+
+        target = _DTYPES.get(dtype, 'string')
+
+        if col not in df.columns or str(df[col].dtype) == target:
+            continue
+
+        if target == 'float64':
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype('float64')
+        elif target == 'boolean':
+            df[col] = df[col].map(_BOOL_VALUES).astype('boolean')
+        elif target == 'datetime':
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif target == 'category':
+            values = df[col].where(df[col].isna(), df[col].astype(str))
+            cats = categories.get(col) if categories else None
+            if cats:
+                # Values which are not in the option list (e.g. 'other' answers) are kept as extra categories
+                known = set(cats)
+                cats = [*cats, *[x for x in values.dropna().unique() if x not in known]]
+                df[col] = pd.Categorical(values, categories=cats)
+            else:
+                df[col] = values.astype('category')
+        else:
+            df[col] = df[col].where(df[col].isna(), df[col].astype(str)).astype('string')
+
+    return df
+
+
+def _compact_dtypes(df, md, labels=False):
+
+    # Option fields are stored compactly. Category fields become pandas Categoricals with categories taken from the
+    # metadata option list (optText if labels else optVal) and checkbox fields become nullable booleans.
+    fields = md.loc[md['fldCode'].isin(df.columns) & md['dType'].isin(['category', 'bool'])]
+    dtypes = dict(zip(fields['fldCode'], fields['dType']))
+
+    opts = fields.loc[(fields['dType'] == 'category') & fields['optVal'].notna()]
+    categories = opts.groupby(by='fldCode', sort=False)['optText' if labels else 'optVal'] \
+        .agg(lambda x: list(dict.fromkeys(x.astype(str)))).to_dict()
+
+    return _coerce_dtypes(df, dtypes, categories=categories)
@@ -1,34 +1,63 @@
 import json
+import os
 import warnings
 import re
 from collections import defaultdict
+import numpy as np
 import pandas as pd
 
-from rabitpy_dev_phase_info.utils import timing, find
+from rabitpy_dev_phase_info.utils import timing, find, jsoncodec
 from .adapters import RabitReaderBaseAdapter, RabitReaderAPIAdapter, RabitReaderJSONFileAdapter, RabitDatabaseAdapter, \
     RabitReaderJSONObjAdapter
 from .parser_utils import _get_idx, _flatten_json
-from .parsers import _rename_dict, _replace_set, _set_order
+from .structure import RabitStructure
+from .elements import RabitElementWalker, METADATA_COLUMNS
+from .indexing import RabitMetadataIndex
+from .parsers import _rename_dict, _replace_set, _set_order, _coerce_dtypes, _compact_dtypes, \
+    _expand_dynamic_fields, _str_join, _map_values
 from .validity import _check_coding_validity
-import requests
-from collections import OrderedDict
+from .writers import write_table, arrow_schema, _metadata_frame, RabitDatabaseWriter
 from urllib.parse import urlparse, parse_qs, urlunsplit
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
 import functools
 import itertools
+import hashlib
+import pickle
 
 
 def json_handler(content):
     if isinstance(content, str):
         try:
-            return json.loads(content)
+            return jsoncodec.loads(content)
         except:
             return None
     elif isinstance(content, dict) or isinstance(content, list):
         return content
 
 
+def _sql_value(value):
+
+    # Long format values are text. Lists and objects are stored as JSON rather than Python reprs, and missing values
+    # as NULL
+    if isinstance(value, (list, dict)):
+        return jsoncodec.dumps(value, default=str)
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    return str(value)
+
+
+# Version of the rows cached for each form. Bump it whenever the way forms are parsed into metadata rows changes, so
+# caches written by older versions are parsed again
+_FORM_CACHE_VERSION = 1
+
+
+def _form_digest(qnr, *args):
+
+    # Content hash of a form record and the parser options which affect the rows it is parsed into. The standard
+    # library encodes it, so digests do not depend on the installed JSON backend
+    content = json.dumps([_FORM_CACHE_VERSION, qnr, *args], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha1(content.encode('utf-8')).hexdigest()
+
+
 @timing
 def _rename_duplicates(md):
     # propagate renamed codes in metadata
@@ -132,14 +161,18 @@ class RabitBaseResource:
         elif self.source == 'json-file':
             fp = kwargs.get('fp')
             encoding = kwargs.get('encoding', 'utf-8')
-            return RabitReaderJSONFileAdapter(fp=fp, encoding=encoding)
+            return RabitReaderJSONFileAdapter(fp=fp, encoding=encoding, lines=kwargs.get('lines'),
+                                              chunksize=kwargs.get('chunksize'))
         elif self.source == 'db':
             url = kwargs.get('url')
             query = kwargs.get('query')
-            return RabitDatabaseAdapter(url=url, query=query)
+            pool_options = ['pool_size', 'max_overflow', 'pool_recycle', 'pool_timeout', 'pool_pre_ping']
+            return RabitDatabaseAdapter(url=url, query=query, connect_args=kwargs.get('connect_args', {}),
+                                        parameters=kwargs.get('parameters'), chunksize=kwargs.get('chunksize'),
+                                        **{k: kwargs[k] for k in pool_options if k in kwargs})
         elif self.source == 'json':
             obj = kwargs.get('obj')
-            return RabitReaderJSONObjAdapter(obj=obj)
+            return RabitReaderJSONObjAdapter(obj=obj, copy=kwargs.get('copy', True))
         else:
             raise ValueError(f'Unrecognized source type: {self.source}...')
 
@@ -161,6 +194,30 @@ class RabitBaseResource:
             warnings.warn(f'Reader fetch method returned malformed or empty response with error:\n{e.__str__()}')
             return None
 
+        content = self.__extract_content(fetched)
+
+        # Cache data in the raw attribute
+        if cache:
+            self.raw = content
+
+        return content
+
+    def fetch_chunks(self):
+
+        # Readers which support chunked reads yield batches of records so the full content is never held in memory.
+        # Other readers return their whole content as a single batch.
+        if not hasattr(self.reader, 'fetch_chunks'):
+            content = self.fetch()
+            if content is not None:
+                yield content
+            return
+
+        for fetched in self.reader.fetch_chunks():
+            if fetched:
+                yield self.__extract_content(fetched)
+
+    def __extract_content(self, fetched):
+
         # We need to extract the path where targeted resource content is.
         # The content should ultimately be an array of objects.
         if isinstance(fetched, dict):
@@ -178,22 +235,35 @@ class RabitBaseResource:
         # Each RabitResource object may have one JSON path.
         # Some contents are dictionaries where the json path is
         # Some other contents will be in form of records where each has a JSON path
+        # Records of read-only readers are shared with their source, so they are copied before their JSON is replaced
         if self.json_path:
+            readonly = getattr(self.reader, 'readonly', False)
             if isinstance(content, dict):
+                content = dict(content) if readonly else content
                 content[self.json_path] = json_handler(content.get(self.json_path))
             elif isinstance(content, list):
-                for item in content:
-                    item[self.json_path] = json_handler(item.get(self.json_path))
-
-        # Cache data in the raw attribute
-        if cache:
-            self.raw = content
+                if readonly:
+                    content = [{**item, self.json_path: json_handler(item.get(self.json_path))} for item in content]
+                else:
+                    for item in content:
+                        item[self.json_path] = json_handler(item.get(self.json_path))
 
         return content
 
-    def dump(self, fp, indent=4):
+    def dump(self, fp, indent=4, lines=False):
+
+        # lines: Write one record per line as NDJSON, which a 'json-file' resource with lines and a chunksize replays
+        # batch by batch
+        content = self.fetch() if not self.raw else self.raw
+
+        if lines:
+            with open(fp, 'w', encoding='utf-8') as f:
+                for record in (content if isinstance(content, list) else [content]):
+                    f.write(jsoncodec.dumps(record) + '\n')
+            return None
+
         with open(fp, 'w') as f:
-            json.dump(self.fetch() if not self.raw else self.raw, f, indent=indent)
+            json.dump(content, f, indent=indent)
 
 
 class RabitData(RabitBaseResource):
@@ -223,15 +293,47 @@ class RabitData(RabitBaseResource):
         self.raw = None
         self.df = None
         self.dff = None
+        self.structure = RabitStructure()
 
     def __add__(self, other):
         self.df = pd.concat([self.df, other.df]).reset_index(drop=True)
+        self.structure += other.structure
+        self.dff = self.structure.to_frame()
         return self.df
 
     @timing
     def parse(self, cache=False):
 
-        d = self.fetch(cache) if not self.raw else self.raw
+        # Readers with a chunksize (e.g. RabitDatabaseAdapter) stream records in batches. Each batch is parsed on its
+        # own so the raw records of the whole resource are never held in memory at once.
+        if not self.raw and not cache and getattr(self.reader, 'chunksize', None):
+            batches = self.fetch_chunks()
+        else:
+            batches = [self.fetch(cache) if not self.raw else self.raw]
+
+        self.idx = None
+        self.structure = RabitStructure()
+        dfs = []
+
+        for d in batches:
+            df = self.__parse_batch(d)
+            if df is None:
+                return None
+
+            # The structure summary is updated as batches arrive and dynamic counters are not kept afterwards
+            self.structure.update(df)
+            dfs.append(df.drop(columns=['dc']))
+
+        if not dfs:
+            warnings.warn('Specified data path not found or is empty, check path and try again...')
+            return None
+
+        self.df = dfs[0] if len(dfs) == 1 else pd.concat(dfs, ignore_index=True)
+        del dfs
+
+        self.dff = self.structure.to_frame()
+
+    def __parse_batch(self, d):
 
         # This function returns a dataframe with index columns, user selected fields, and dynamic data counts
         if isinstance(d, dict):
@@ -242,10 +344,11 @@ class RabitData(RabitBaseResource):
             warnings.warn('Specified data path not found or is empty, check path and try again...')
             return None
 
-        # create list of fields to be extracted and indicate index tags
-        self.idx = _get_idx(index_fields=self.index_fields,
-                            use_fields=self.use_fields,
-                            available_fields=list(d[0].keys()))
+        # create list of fields to be extracted and indicate index tags. This is done once on the first batch
+        if self.idx is None:
+            self.idx = _get_idx(index_fields=self.index_fields,
+                                use_fields=self.use_fields,
+                                available_fields=list(d[0].keys()))
 
         # set all fields to extract form observations
         cols = (list(self.idx.keys()) + [self.json_path]) if self.json_path else list(self.idx.keys())
@@ -277,7 +380,7 @@ class RabitData(RabitBaseResource):
 
                 flattened = pd.DataFrame() \
                     .from_records(df[self.json_path]
-                                  .apply(lambda x: _flatten_json('', json.loads(x, strict=False), counter={})),
+                                  .apply(lambda x: _flatten_json('', jsoncodec.loads(x, strict=False), counter={})),
                                   columns=['json_tmp', 'dc'])
             except TypeError:
                 flattened = pd.DataFrame() \
@@ -292,19 +395,15 @@ class RabitData(RabitBaseResource):
         else:
             df['dc'] = [dict() for x in range(len(df))]
 
-        df['fldCode'] = df['json'].apply(lambda x: list(x.keys()))
-        self.df = df
-        del df
-        self.dff = self.extract_structure()
-        self.df = self.df.drop(columns=['fldCode', 'dc'])
+        return df
 
     @timing
-    def extract_structure(self):
+    def extract_structure(self, df=None):
 
         '''
-        THIS FUNCTION WILL CHANGE IN FUTURE, DO NOT TOUCH WITHOUT CONSULTING
         A project consists of phases and forms. This function extract the fields and maximum number of repeated measures
-        fields in the response dataframe "df". It was previously being done like:
+        fields in the response dataframe "df" (self.df if not given). df must contain the dynamic counters column "dc".
+        It was previously being done like:
 
             dff = self.df.groupby(by=['phase_id', 'frmCode']).agg({'fldCode': 'sum',
                                                       'dc': lambda x: pd.DataFrame().from_records(list(x))
@@ -315,32 +414,12 @@ class RabitData(RabitBaseResource):
 
             return dff
 
-        but this was slow. So the currrent approach using itertools and functools was adopted
-
-        return unique keys from a list of dictionaries
-        set(itertools.chain.from_iterable(xx)
-
-        return maximum value of key 'k' between all dictionaries in list xx
-        functools.reduce(lambda x, y: max(x, y.get(k, 0))
-                  if isinstance(x, int) else y.get(k, 0), xx)
-
+        but this was slow, and so was the later approach using functools.reduce over dictionaries in a groupby.
+        The structure is now a RabitStructure, a mergeable summary which parse updates batch by batch and which can be
+        combined across workers or incremental runs without re-scanning the responses.
         '''
 
-        def get_max_key_value_from_dicts(xx):
-
-            if len(xx) == 1:
-                return xx.iloc[0]
-            else:
-                return {k: functools.reduce(lambda x, y: max(x, y.get(k, 0))
-                      if isinstance(x, int) else y.get(k, 0), xx)
-                       for k in set(itertools.chain.from_iterable(xx))
-                       }
-
-        out = self.df.groupby(by=['phase_id', 'frmCode']) \
-            .agg({'fldCode': lambda xx: set(itertools.chain.from_iterable(xx)),
-                  'dc': get_max_key_value_from_dicts}).reset_index()
-
-        return out
+        return RabitStructure().update(self.df if df is None else df).to_frame()
 
     def rename_duplicates(self):
 
@@ -355,6 +434,8 @@ class RabitData(RabitBaseResource):
             self.dff.loc[self.dff['frmCode'] == name, 'dc'] = self.dff.loc[self.dff['frmCode'] == name, 'dc'] \
                 .apply(lambda x: _rename_dict(x, rndct.get(name, {})))
 
+        self.structure = RabitStructure.from_frame(self.dff)
+
     @timing
     def reshape(self, shape='merged', index='pid', apply_phase=True, order=None, filter_array=None, reset_index=False, keep='last'):
 
@@ -366,15 +447,37 @@ class RabitData(RabitBaseResource):
         :return:
         """
 
-        # First create the index by which the data will be reshaped
-        if not index:
-            index = ['pid']
-        elif isinstance(index, str):
-            index = ['pid'] if index != 'pid' else ['pid', *index]
-        elif isinstance(index, list):
-            index = list(set(['pid', *index]))
+        df = self.select_responses(index=index, apply_phase=apply_phase, order=order, filter_array=filter_array,
+                                   keep=keep)
+        if df is None:
+            return None
+
+        index = self.__get_index(index)
+
+        if shape == 'split-forms':
+            gbo = df.groupby(by=['frmCode'])
+            out = {}
         else:
-            raise TypeError('Index can only be a string or a list.')
+            gbo = [df]
+
+        for name, obj in gbo:
+            # Add prefix to fields as appropriate
+            obj = self.add_prefix_to_fields(df=obj)
+
+            # Concatenate response dictionaries
+            obj = obj.groupby(by=index).apply(lambda x: self.__concat_response_dicts(x))
+            out[name] = obj
+
+        return gbo
+
+    def select_responses(self, index='pid', apply_phase=True, order=None, filter_array=None, keep='last'):
+
+        """
+        Returns the responses reshape works on: rows in filter_array, ordered by order, with one row kept for each
+        value of index. Arguments are as in reshape
+        """
+
+        index = self.__get_index(index)
 
         if self.df.empty:
             warnings.warn('No data passed. Is data parsed? Skipping...')
@@ -398,21 +501,19 @@ class RabitData(RabitBaseResource):
         if keep in ['last', 'first']:
             df = df.drop_duplicates(subset=index, keep=keep)
 
-        if shape == 'split-forms':
-            gbo = df.groupby(by=['frmCode'])
-            out = {}
-        else:
-            gbo = [df]
-
-        for name, obj in gbo:
-            # Add prefix to fields as appropriate
-            obj = self.add_prefix_to_fields(df=obj)
+        return df
 
-            # Concatenate response dictionaries
-            obj = obj.groupby(by=index).apply(lambda x: self.__concat_response_dicts(x))
-            out[name] = obj
+    @staticmethod
+    def __get_index(index):
 
-        return gbo
+        # The index by which the data will be reshaped always contains pid
+        if not index:
+            return ['pid']
+        elif isinstance(index, str):
+            return ['pid'] if index == 'pid' else ['pid', index]
+        elif isinstance(index, list):
+            return list(set(['pid', *index]))
+        raise TypeError('Index can only be a string or a list.')
 
     @timing
     def add_prefix_to_fields(self, df=None, has_duplicates=False, rename_duplicates=False):
@@ -470,7 +571,8 @@ class RabitData(RabitBaseResource):
 class RabitMetadata(RabitBaseResource):
 
     def __init__(self, source, reader=None, fid_path='id', json_path='json', include_html=False,
-                 frm_name_path='surveyName', frm_desc_path='surveyDescription', base_info_baseurl=None, **kwargs):
+                 frm_name_path='surveyName', frm_desc_path='surveyDescription', base_info_baseurl=None,
+                 form_cache_path=None, **kwargs):
 
         """
 
@@ -482,6 +584,9 @@ class RabitMetadata(RabitBaseResource):
         rename_duplicates: Rename all non-unique fields
         frm_name_path: Path to form name
         frm_desc_path: Path to form description
+        form_cache_path: Path to a file where parsed metadata rows of each form are cached between runs. Forms are
+            identified by a hash of their content and only new or edited forms are parsed again. Parsed forms are
+            always cached in memory between calls to parse.
         **kwargs: Arguments to be passed to RabitReader adapter as specified by 'source'
 
         """
@@ -506,6 +611,12 @@ class RabitMetadata(RabitBaseResource):
         self.comp_md_order = kwargs.get('comp_md_order', 'first')
         self._forms = None
         self._has_duplicate_codes = None
+        self._index = None
+        self._nested = None
+        self._nested_md = None
+        self._nested_key = None
+        self.form_cache_path = form_cache_path
+        self._form_cache = None
 
     def __add__(self, other):
         self.md = pd.concat([self.md, other.md]).reset_index(drop=True)
@@ -532,30 +643,41 @@ class RabitMetadata(RabitBaseResource):
     def duplicate_codes(self):
         return self.mdn.duplicated(subset='fldCode')
 
+    @property
+    def index(self):
+
+        # Lookups are served from an index built once per parsed metadata. It is rebuilt when md or mdn are replaced.
+        # Call reindex after modifying md or mdn in place.
+        if self._index is None or not self._index.is_current(self.md, self.mdn):
+            self.reindex()
+        return self._index
+
+    def reindex(self):
+        self._index = RabitMetadataIndex(self.md, self.mdn)
+        return self._index
+
     def fields(self, fid=None, orient='title'):
 
+        if not isinstance(self.mdn, pd.DataFrame):
+            return []
+
         if fid is None:
             fid = list(self._forms.keys())
 
-        if isinstance(fid, list):
-            fid = list(map(lambda x: str(x), fid))
-        else:
-            fid = [str(fid)]
-
-        if isinstance(self.mdn, pd.DataFrame):
-            if orient == 'title':
-                return self.mdn.loc[self.mdn['frmCode'].astype(str).isin(fid), 'fldTitle'].to_list()
-            elif orient == 'code':
-                return self.mdn.loc[self.mdn['frmCode'].astype(str).isin(fid), 'fldCode'].to_list()
-            elif orient == 'grouped':
-                return self.mdn.loc[self.mdn['frmCode'].astype(str).isin(fid), ['frmCode', 'fldCode', 'fldTitle']]\
-                    .groupby(by='frmCode')\
-                    .apply(lambda x: x.set_index('fldCode')['fldTitle'].to_dict()).to_dict()
-            elif orient == 'dict':
-                return self.mdn.loc[self.mdn['frmCode'].astype(str).isin(fid), ['frmCode', 'fldCode', 'fldTitle']] \
-                    .set_index('fldCode')['fldTitle'].to_dict()
-        else:
-            return []
+        index = self.index
+        fields = [(frm, fld, title) for frm in index.get_forms(fid) for fld, title in index.form_fields[frm]]
+
+        if orient == 'title':
+            return [title for _, _, title in fields]
+        elif orient == 'code':
+            return [fld for _, fld, _ in fields]
+        elif orient == 'grouped':
+            out = {}
+            for frm, fld, title in fields:
+                out.setdefault(frm, {})[fld] = title
+            return out
+        elif orient == 'dict':
+            return {fld: title for _, fld, title in fields}
 
     def get_path_property(self, prop):
         x = getattr(self, prop)
@@ -580,7 +702,7 @@ class RabitMetadata(RabitBaseResource):
         if metadata is None:
             return None, None
 
-        md = pd.DataFrame().from_records(metadata)
+        md = pd.DataFrame().from_records(metadata, columns=METADATA_COLUMNS)
         md = md.applymap(lambda x: x.strip() if isinstance(x, str) else x)
 
         # Parse complimentary metadata
@@ -617,9 +739,14 @@ class RabitMetadata(RabitBaseResource):
         if rename_duplicates:
             self.rename_duplicates()
 
+        self.reindex()
+
     def __parse(self, d):
 
         metadata = []
+        form_cache = self.__load_form_cache()
+        parsed_forms = {}
+        walker = RabitElementWalker(extract_choices=self.__extract_choices, include_html=self.include_html)
 
         if not isinstance(d, list):
             d = [d]
@@ -637,9 +764,21 @@ class RabitMetadata(RabitBaseResource):
                 warnings.warn(f'Form ID: {fid}: NULL JSON detected. Skipping')
                 continue
 
+            # Forms are served from cache if their content has not changed since they were last parsed. Choices of
+            # forms using choicesByUrl come from base info services which may change, so these forms are not cached.
+            digest = _form_digest(qnr, self.fid_path, self.json_path, self.frm_name_path, self.frm_desc_path,
+                                  self.include_html, self.base_info_baseurl, METADATA_COLUMNS)
+            cacheable = 'choicesBy' not in (qnrjson if isinstance(qnrjson, str) else jsoncodec.dumps(qnrjson, default=str))
+
+            cached = form_cache.get(fid)
+            if cacheable and cached is not None and cached[0] == digest:
+                metadata += cached[1]
+                parsed_forms[fid] = cached
+                continue
+
             try:
                 if isinstance(qnrjson, str):
-                    qnrjson = json.loads(qnrjson, strict=False)
+                    qnrjson = jsoncodec.loads(qnrjson, strict=False)
             except KeyError as e:
                 raise KeyError(f'Form ID: {fid}: Invalid JSON...')
 
@@ -648,350 +787,64 @@ class RabitMetadata(RabitBaseResource):
             if not pages:
                 raise KeyError(f'Form ID: {fid}: pages element missing from JSON.')
 
+            rows = []
+
             # for each page in pages go through each element and parse metadata
             for page in pages:
                 # If page does not contain elements key, create empty list which means we continue on this loop
                 for element in page.get('elements', []):
                     try:
-                        metadata += self.__set_properties(_qnr=qnr,
-                                                          _element=element,
-                                                          _choices=self.__extract_choices(_el=element),
-                                                          _fid=fid,
-                                                          _frm_name=frm_name,
-                                                          _frm_desc=frm_desc,
-                                                          baseurl=self.base_info_baseurl,
-                                                          _include_html=self.include_html)
-
-                    # Add errors to output dict where there are exceptions
-                    except Exception as e:
-
+                        walker.walk(element, fid=fid, frm_name=frm_name, frm_desc=frm_desc, rows=rows)
+                    except Exception:
                         print(f'error in processing {fid} {element.get("name")}')
-
-                        metadata.append({'fldCode': element.get('name'),
-                                         'fldTitle': element.get('title'),
-                                         'frmCode': fid,
-                                         'frmName': frm_name,
-                                         'frmDesc': frm_desc,
-                                         'frmOrder': qnr.get('sortOrder'),
-                                         'error': e})
                         raise
-        return metadata
-
-    def __set_properties(self, _qnr=None, _element=None, _choices=None, _fid=None, _frm_name=None, _frm_desc=None,
-                         baseurl=None, _include_html=False):
-
-        if _element['type'] == 'html' and not _include_html:
-            return []
-
-        # This function parses single elements in a questionnaire
-        properties = []
-
-        this = OrderedDict()
-        updater = lambda x: properties.append(x) if isinstance(this, OrderedDict) else properties + this
-
-        # Multiple text
-        if _element.get('type') == 'multipletext':
-
-            for item in _element.get('items'):
-                # copy item into a recursive element
-                rec_element = item
 
-                # flatten parent and child element codes
-                rec_element.update({'name': '{}_{}'.format(_element.get('name', ''), item.get('name')),
-                                    'type': 'text',
-                                    'visibleIf': _element.get('visibleIf'),
-                                    'fldParentCode': _element.get('name', ''),
-                                    'fldParentTitle': self.__translation_handler(s=_element, target='title', alt='')})
+            if cacheable:
+                parsed_forms[fid] = (digest, rows)
 
-                # send the element back to the function and update properties
-                this = self.__set_properties(_qnr=_qnr, _element=rec_element, baseurl=baseurl,
-                                             _fid=_fid, _frm_name=_frm_name, _frm_desc=_frm_desc)
+            metadata += rows
 
-                if isinstance(this, dict):
-                    this['elementType'] = f'multipletext - {this["elementType"]}'
-                elif isinstance(this, list):
-                    for item in this:
-                        item['elementType'] = f'multipletext - {item["elementType"]}'
+        # Forms which are no longer in the source are dropped from cache
+        changed = parsed_forms.keys() != form_cache.keys() or \
+            any(parsed_forms[k][0] != form_cache[k][0] for k in parsed_forms)
+        self._form_cache = parsed_forms
+        if changed:
+            self.__dump_form_cache()
 
-                properties = updater(this.copy())
-
-            return properties
-
-        # Matrix
-        if _element.get('type') == 'matrix':
-
-            fldAx = _element.get('rows')
-            optAx = _element.get('columns')
-
-            for fld in fldAx:
-
-                fldtmp = {}
-
-                if isinstance(fld, dict):
-                    fldtmp['name'] = '{}_{}'.format(_element.get('name'), fld.get('value'))
-                    fldtmp['title'] = '{} - {}'.format(
-                        self.__translation_handler(s=_element, target='title', alt=_element.get('name')),
-                        self.__translation_handler(s=fld, target='text', alt=fld.get('name')))
-
-                elif isinstance(fld, str):
-                    fldtmp['name'] = '{}_{}'.format(_element.get('name'), fld)
-                    fldtmp['title'] = fld
-
-                else:
-                    raise TypeError(f'Matrix row type is {type(fld)} and not dict or string...')
-
-                fldtmp.update({'choices': optAx,
-                               'type': 'radiogroup',
-                               'visibleIf': _element.get('visibleIf'),
-                               'fldParentCode': _element.get('name'),
-                               'fldParentTitle': self.__translation_handler(s=_element, target='title',
-                                                                      alt=_element.get('name'))
-                               })
-
-                # send the element back to the function and update properties
-                this = self.__set_properties(_qnr=_qnr,
-                                             _element=fldtmp,
-                                             _choices=_choices,
-                                             _fid=_fid,
-                                             _frm_name=_frm_name,
-                                             _frm_desc=_frm_desc,
-                                             baseurl=baseurl)
-
-                if isinstance(this, dict):
-                    this['elementType'] = f'matrix - {this["elementType"]}'
-                elif isinstance(this, list):
-                    for item in this:
-                        item['elementType'] = f'matrix - {item["elementType"]}'
-
-                properties = updater(this.copy())
-            return properties
-
-        # Dropdown Matrix
-        if _element.get('type') == 'matrixdropdown':
-
-            fldAx = _element.get('rows')
-            optAx = _element.get('columns')
-
-            for row in fldAx:
-
-                ttl = self.__translation_handler(s=_element, target='title', alt=_element.get('name'))
-                if isinstance(row, dict):
-                    parentFldTitle = f"{ttl} - {row.get('text', row.get('value'))}"
-                    parentFldCode = f"{_element.get('name')}_{row.get('value')}"
-                elif isinstance(row, str):
-                    parentFldTitle = f"{ttl} - {row}"
-                    parentFldCode = f"{_element.get('name')}_{row}"
-                else:
-                    raise TypeError(f'Matrix row type is {type(row)} and not dict or string...')
-
-                fld = {}
-
-                for col in optAx:
-                    fld['type'] = col.get('cellType', 'dropdown')
-                    # TODO: Check visibleIf condition for column and rows and implement if necessary
-                    # fld['visibleIf'] = _element.get('visibleIf', None)
-
-                    ttl = self.__translation_handler(s=col, target='title', alt=col.get('name'))
-                    fld['title'] = f"{parentFldTitle} - {ttl}"
-                    fld['name'] = f"{parentFldCode}_{col.get('name')}"
-                    fld['fldParentCode'] = parentFldCode
-                    fld['fldParentTitle'] = parentFldTitle
-
-                    # send the element back to the function and update properties
-                    this = self.__set_properties(_qnr=_qnr,
-                                                 _element=fld,
-                                                 _choices=self.__extract_choices(_el=col),
-                                                 _fid=_fid,
-                                                 _frm_name=_frm_name,
-                                                 _frm_desc=_frm_desc,
-                                                 baseurl=baseurl)
-
-                    if isinstance(this, dict):
-                        this['elementType'] = f'matrixdropdown - {this["elementType"]}'
-                    elif isinstance(this, list):
-                        for item in this:
-                            item['elementType'] = f'matrixdropdown - {item["elementType"]}'
-
-                    properties = updater(this.copy())
-
-            return properties
-
-        # Panel
-        if _element.get('type') == 'panel':
-            for el in _element.get('elements', []):
-
-                el['name'] = '{}'.format(el.get('name'))
-                el['fldParentCode'] = el.get('name')
-                el['fldParentTitle'] = self.__translation_handler(s=el, target='title', alt=el.get('name'))
-
-                this = self.__set_properties(_qnr=_qnr,
-                                             _element=el,
-                                             _fid=_fid,
-                                             _choices=self.__extract_choices(_el=el),
-                                             _frm_name=_frm_name,
-                                             _frm_desc=_frm_desc,
-                                             baseurl=baseurl)
-
-                if isinstance(this, dict):
-                    this['elementType'] = f'panel - {this["elementType"]}'
-                elif isinstance(this, list):
-                    for item in this:
-                        item['elementType'] = f'panel - {item["elementType"]}'
-
-                properties = updater(this.copy())
-            return properties
-
-        # Dynamic Matrix
-        if _element.get('type') == 'matrixdynamic':
-            warnings.warn('Dynamic matrix parsing is currently experimental...')
-            optAx = _element.get('columns')
-
-            parentFldTitle = f"{self.__translation_handler(s=_element, target='title', alt=_element.get('name'))}"
-            parentFldCode = f"{_element.get('name')}_r1"
-            fld = {}
-
-            for col in optAx:
-                fld['type'] = col.get('cellType', 'dropdown')
-
-                # TODO: Check visibleIf condition for column and rows and implement if necessary
-                # fld['visibleIf'] = _element.get('visibleIf', None)
-
-                fld['title'] = f"{parentFldTitle} - {self.__translation_handler(s=col, target='title', alt=col.get('name'))}"
-                fld['name'] = f"{parentFldCode}_{col.get('name')}"
-
-                # send the element back to the function and update properties
-                this = self.__set_properties(_qnr=_qnr,
-                                             _element=fld,
-                                             _choices=self.__extract_choices(_el=col),
-                                             _fid=_fid,
-                                             _frm_name=_frm_name,
-                                             _frm_desc=_frm_desc,
-                                             baseurl=baseurl)
-
-                if isinstance(this, dict):
-                    this['elementType'] = f'matrixdynamic - {this["elementType"]}'
-                elif isinstance(this, list):
-                    for item in this:
-                        item['elementType'] = f'matrixdynamic - {item["elementType"]}'
-
-                properties = updater(this.copy())
-
-            return properties
-
-        # Dynamic panel
-        if _element.get('type') == 'paneldynamic':
-            warnings.warn('Dynamic panel parsing is currently experimental...')
-            for el in _element.get('templateElements', []):
-
-                el['name'] = f"{_element.get('name')}_r1_{el.get('name')}"
-
-                if el['type'] not in ['matrix', 'matrixdropdown', 'matrixdynamic']:
-                    this = self.__set_properties(_qnr=_qnr,
-                                                 _element=el,
-                                                 _fid=_fid,
-                                                 _choices=self.__extract_choices(_el=el),
-                                                 _frm_name=_frm_name,
-                                                 _frm_desc=_frm_desc,
-                                                 baseurl=baseurl)
-                else:
-                    this = self.__set_properties(_qnr=_qnr,
-                                                 _element=el,
-                                                 _fid=_fid,
-                                                 _choices=None,
-                                                 _frm_name=_frm_name,
-                                                 _frm_desc=_frm_desc,
-                                                 baseurl=baseurl)
-
-                if isinstance(this, dict):
-                    this['elementType'] = f'paneldynamic - {this["elementType"]}'
-                elif isinstance(this, list):
-                    for item in this:
-                        item['elementType'] = f'paneldynamic - {item["elementType"]}'
-
-                properties = updater(this.copy())
-            return properties
-
-        # set common properties, the type property is set here once and if necessary it will be reset in later steps
-        this['frmCode'] = _fid
-        this['frmName'] = _frm_name
-        this['frmDesc'] = _frm_desc
-        this['fldCode'] = _element.get('name')
-        this['fldTitle'] = self.__translation_handler(_element, 'title', _element.get('name'))
-        this['fldParentCode'] = _element.get('fldParentCode', this['fldCode'])
-        this['fldParentTitle'] = _element.get('fldParentTitle', this['fldTitle'])
-        this['elementType'] = _element.get('type')
-        this['visibleCondition'] = _element.get('visibleIf', '')
-        this['expression'] = _element.get('expression', '')
-        this['validators'] = _element.get('validators')
-        this['optVal'] = None
-        this['optText'] = None
-        this['opt'] = None
-
-        # set data type for field
-        if this.get('elementType') == 'text':
-            if _element.get('inputType', '') == 'number':
-                this.update({'dType': 'numeric'})
-            elif _element.get('inputType', '') == 'date':
-                this.update({'dType': 'datetime'})
-            elif _element.get('inputType', '') == 'date-jalali':
-                this.update({'dType': 'jalalidate'})
-            else:
-                this.update({'dType': 'str'})
-
-        if this.get('elementType') == 'expression':
-            this.update({'dType': 'numeric'})
-
-        elif this.get('elementType') in ['comment', 'html', 'file']:
-            this.update({'dType': 'str'})
-
-        elif this.get('elementType') in ['radiogroup', 'dropdown', 'rating', 'boolean']:
-            this.update({'dType': 'category'})
-
-        elif this.get('elementType') in ['checkbox', 'tagbox']:
-            this.update(({'dType': 'bool'}))
+        return metadata
 
-        # deal with input types which have choice element
-        if _choices is not None and this.get('elementType') not in ['matrixdropdown', 'matrixdynamic']:
-            parentFldTitle = this.get('fldTitle')
-            parentFldCode = this.get('fldCode')
-            opt = []
+    def __load_form_cache(self):
 
-            for _choice in _choices:
-                # set value and label of choice
-                if isinstance(_choice, dict):
-                    chValue = str(_choice.get('value')).strip()
-                    chText = self.__translation_handler(_choice, 'text', _choice.get('value'))
-                else:
-                    chValue = str(_choice).strip()
-                    chText = str(_choice).strip()
+        if self._form_cache is not None:
+            return self._form_cache
 
-                # update name and field code of checkbox type quesitons, update and continue
-                if this.get('elementType') == 'checkbox':
-                    this.update({'fldTitle': '{} - {}'.format(parentFldTitle, chText),
-                                 'fldCode': '{}_{}'.format(parentFldCode, chValue)})
+        self._form_cache = {}
 
-                    this.update({'optVal': chValue, 'optText': chText})
-                    updater(this.copy())
-                    continue
+        if self.form_cache_path and os.path.exists(self.form_cache_path):
+            try:
+                with open(self.form_cache_path, 'rb') as f:
+                    form_cache = pickle.load(f)
+                if not isinstance(form_cache, dict):
+                    raise pickle.UnpicklingError('Metadata form cache is not a dict')
+                self._form_cache = form_cache
+            # Caches pickled by other versions of the package may refer to classes which were moved or removed
+            except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+                warnings.warn(f'Could not read metadata form cache {self.form_cache_path}. Forms will be re-parsed.')
 
-                this.update({'optVal': chValue, 'optText': chText})
-                updater(this.copy())
+        return self._form_cache
 
-            if opt:
-                updater(this.copy())
+    def __dump_form_cache(self):
 
-        else:
-            updater(this.copy())
+        if not self.form_cache_path:
+            return None
 
-        # Add 'other' option if it is active
-        if _element.get('hasOther'):
-            this.pop('optVal')
-            this.pop('optText')
-            this.update({'dType': 'str', 'elementType': 'text', 'fldCode': '{}_{}'.format(_element['name'], 'comment')})
-            this.update({'fldTitle': '{} - {}'.format(parentFldTitle, this.get('otherText', 'other'))})
-            updater(this.copy())
+        os.makedirs(os.path.dirname(os.path.abspath(self.form_cache_path)), exist_ok=True)
 
-        return properties
+        # The cache is written to a temporary file first so an interrupted run does not leave a corrupt cache behind
+        tmp = f'{self.form_cache_path}.tmp'
+        with open(tmp, 'wb') as f:
+            pickle.dump(self._form_cache, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.form_cache_path)
 
     def __extract_choices(self, _el, limit=20):
 
@@ -1023,6 +876,11 @@ class RabitMetadata(RabitBaseResource):
                 value_name = _el.get('valueName', 'code')
                 title_name = _el.get('titleName', 'title')
 
+                # requests is only needed for choices served by a base info API
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
                 retry_strategy = Retry(connect=1)
                 adapter = HTTPAdapter(max_retries=retry_strategy)
                 session = requests.Session()
@@ -1066,38 +924,39 @@ class RabitMetadata(RabitBaseResource):
             else:
                 return tmp[['value', 'text']].to_dict(orient='records')
 
-    def __translation_handler(self, s, target, alt):
-        if target in s:
-            if isinstance(s[target], dict):
-                return s[target].get('fa', s[target].get('default'))
-            else:
-                return s[target]
-        else:
-            return alt
+    def nest(self, cache=True):
 
-    def nest(self):
+        '''
+            Returns nested metadata with a single row per field and field options gathered in the "opt" column.
+            cache: Return the previously nested frame if md has not changed since. md is considered changed when it is
+                replaced or its shape or columns change. Use cache=False after editing values of md in place.
+        '''
 
         if self.md is None:
             warnings.warn('Metadata is empty. Has it been parsed?')
             return None
 
+        key = (self.md.shape, tuple(self.md.columns))
+        if cache and self._nested is not None and self._nested_md is self.md and self._nested_key == key:
+            return self._nested
+
         if 'phase_id' in self.md.columns:
             cols = ['phase_id', 'frmCode', 'fldCode']
         else:
             cols = ['frmCode', 'fldCode']
 
         mdn = self.md.drop_duplicates(cols).drop(columns=['opt'])
-        mdn.loc[mdn['optVal'].isna(), 'opt'] = None
 
-        opts = self.md.loc[self.md['optVal'].notna(), cols + ['optVal', 'optText']].copy()
+        # Options are gathered per field in a single pass over the option rows, in metadata order
+        ix = self.md['optVal'].notna()
+        opts = {}
+        for k, val, text in zip(zip(*[self.md.loc[ix, col] for col in cols]),
+                                self.md.loc[ix, 'optVal'], self.md.loc[ix, 'optText']):
+            opts.setdefault(k, []).append({'optVal': val, 'optText': text})
 
-        if len(opts) > 0:
-            opts['opt'] = opts.apply(lambda x: {'optVal': x['optVal'], 'optText': x['optText']}, axis=1)
-            opts = opts.groupby(cols)['opt'].apply(lambda x: x.to_list()).reset_index()
-            mdn = mdn.drop(columns=['opt'])
-            mdn = opts.merge(mdn, on=cols, how='right')
-        else:
-            print('here')
+        missing = np.nan if opts else None
+        mdn['opt'] = [opts.get(k, missing) for k in zip(*[mdn[col] for col in cols])]
+        mdn = mdn[cols + ['opt'] + [col for col in mdn.columns if col not in cols and col != 'opt']]
 
         try:
             mdn = mdn.drop(columns=['optVal', 'optText'])
@@ -1105,11 +964,16 @@ class RabitMetadata(RabitBaseResource):
         except:
             print('exception!')
 
-        return _set_order(mdn, {'frmCode': 'frmOrder', 'fldCode': 'fldOrder', 'fldParentCode': 'fldParentOrder'})
+        mdn = _set_order(mdn.reset_index(drop=True),
+                         {'frmCode': 'frmOrder', 'fldCode': 'fldOrder', 'fldParentCode': 'fldParentOrder'})
+
+        self._nested, self._nested_md, self._nested_key = mdn, self.md, key
+
+        return mdn
 
     def rename_duplicates(self):
         self.md, _ = _rename_duplicates(self.md)
-        self.nest()
+        self.mdn = self.nest()
 
 
 class RabitProject(RabitBaseResource):
@@ -1181,7 +1045,8 @@ class RabitProject(RabitBaseResource):
 
         if d.get('phases'):
 
-            self.phase_records = [x for x in d['phases'] if not x.get('deleted', False)]
+            # Phase records are updated in place by update_phase_record, so they are not shared with the fetched project
+            self.phase_records = [dict(x) for x in d['phases'] if not x.get('deleted', False)]
             if self.phase_records is not []:
                 self.has_phases = True
             else:
@@ -1295,28 +1160,23 @@ class RabitDataset:
 
             self.update_dynamic_fields_in_metadata()
 
+            # Master codes and titles are built with vectorized string concatenation over metadata columns
+            md = self.metadata.md
+
             if self.project and self.project.has_phases:
-                self.metadata.md['master_code'] = self.metadata.md.apply(
-                    lambda x: f"p{x['phase_id']}.f{x['frmCode']}.{x['fldCode']}", axis=1)
-                self.metadata.md['master_title'] = self.metadata.md.apply(
-                    lambda x: f"{x['phase_alias']} {x['frmName']} {x['fldTitle']}", axis=1)
-                # self.metadata.md['frmCode'] = self.metadata.md.apply(lambda x: f"p{x['phase_id']}.f{x['frmCode']}",
-                #                                                      axis=1)
-                # self.metadata.md['frmName'] = self.metadata.md.apply(lambda x: f"{x['phase_alias']} {x['frmName']}",
-                #                                                      axis=1)
-                # self.metadata.md['fldCode'] = self.metadata.md['master_code']
-                # self.metadata.md['fldTitle'] = self.metadata.md['master_title']
+                md['master_code'] = _str_join('p', md['phase_id'], '.f', md['frmCode'], '.', md['fldCode'])
+                md['master_title'] = _str_join(md['phase_alias'], ' ', md['frmName'], ' ', md['fldTitle'])
             else:
-                self.metadata.md['master_code'] = self.md.apply(lambda x: f"p.f{x['frmCode']}.{x['fldCode']}", axis=1)
-                self.metadata.md['master_title'] = self.md.apply(lambda x: f"{x['frmName']} {x['fldTitle']}", axis=1)
+                md['master_code'] = _str_join('p.f', md['frmCode'], '.', md['fldCode'])
+                md['master_title'] = _str_join(md['frmName'], ' ', md['fldTitle'])
 
-                # Any duplicate codes will automatically result in field codes to be of form
+                # Any duplicate codes will automatically result in field codes to be of form f{frmCode}_{fldCode}
                 fields = self.mdn.loc[self.mdn.duplicated(subset=['frmCode', 'fldCode'], keep=False), 'fldCode']
                 if any(fields):
-                    ix = self.metadata.md['fldCode'].isin(fields)
-                    self.metadata.md.loc[ix, 'fldCode'] = self.md.loc[ix].apply(lambda x: f"f{x['frmCode']}_{x['fldCode']}", axis=1)
+                    ix = md['fldCode'].isin(fields)
+                    md.loc[ix, 'fldCode'] = _str_join('f', md.loc[ix, 'frmCode'], '_', md.loc[ix, 'fldCode'])
 
-            self.metadata.md = self.metadata.md.sort_values(
+            self.metadata.md = md.sort_values(
                 by=['phase_order', 'frmOrder', 'fldParentOrder', 'repeated_measure_number', 'fldOrder'])
             self.metadata.mdn = self.metadata.nest()
 
@@ -1340,63 +1200,48 @@ class RabitDataset:
         # get all dynamic fields in the metadata
         ix = (self.md['elementType'].str.startswith('matrixdynamic')) | \
              (self.md['elementType'].str.startswith('paneldynamic'))
-        dynamic_fields = self.md.loc[ix].to_dict(orient='records')
 
-        if not dynamic_fields:
+        if not ix.any():
             return None
 
-        new_metadata_rows = []
-
-        # for each record in dynamic fields add them to metadata
-        for fld in dynamic_fields:
-
-            ix = (target_fields['frmCode'] == fld['frmCode']) & (target_fields['phase_id'] == fld['phase_id'])
-
-            try:
-                fc = target_fields.loc[ix, 'dc'].to_list()[0]
-                k = list(filter(lambda x: fld['fldCode'].startswith(f'{x}_r'), fc))
-            except:
-                continue
-
-            try:
-                n = int(fc[k[0]])
-
-                for i in range(2, n + 1):
-                    this_fld = fld.copy()
-                    this_fld['fldCode'] = re.sub(f'^{k[0]}_r\d+_', f'{k[0]}_r{i}_', fld['fldCode'])
-                    this_fld['fldParentCode'] = re.sub(f'^{k[0]}_r\d+_', f'{k[0]}_r{i}_', fld['fldParentCode'])
-                    this_fld['fldTitle'] = f'{this_fld["fldTitle"]} - {rmtpf[lang]}{i}'
-                    this_fld['fldParentTitle'] = f'{this_fld["fldParentTitle"]} - {rmtpf[lang]}{i}'
-                    this_fld['repeated_measure_number'] = i
-
-                    # TODO: Need to preserve field orders here
-                    new_metadata_rows.append(this_fld)
-                    # self.metadata.md = pd.concat([self.md, pd.Series(this_fld).to_frame().T])
-
-            except IndexError:
-                pass
-            except ValueError:
-                pass
+        # TODO: Need to preserve field orders here
+        new_metadata_rows = _expand_dynamic_fields(self.md, target_fields, on=['frmCode', 'phase_id'],
+                                                   title_postfix=rmtpf[lang], number_col='repeated_measure_number')
 
-        self.metadata.md = pd.concat([self.md, pd.DataFrame(new_metadata_rows)])
+        self.metadata.md = pd.concat([self.md, new_metadata_rows])
         self.metadata.md.reset_index(drop=True, inplace=True)
 
         return None
 
     @timing
     def sync(self):
-        d = self.df.merge(self.dff[['frmCode', 'fldCode']], on='frmCode', how='right')
-        d['json'] = d.apply(lambda x: {k: x['json'].get(k, None) for k in x['fldCode'].keys()}, axis=1)
-        self.data.df = d.drop(columns=['fldCode'])
-        del d
+
+        # Aligns responses of each form with the fields of the form in metadata. Responses of a form are expanded into
+        # a wide frame and aligned with a single reindex. Fields missing from a response are set to None.
+        fields = self.dff.drop_duplicates(subset='frmCode').set_index('frmCode')['fldCode']
+        forms = self.df.groupby(by='frmCode', sort=False).indices
+        out = []
+
+        for frm, flds in fields.items():
+            if frm not in forms:
+                continue
+
+            item = self.df.iloc[forms[frm]]
+            wide = pd.DataFrame(item['json'].to_list(), index=item.index, dtype=object).reindex(columns=list(flds))
+            wide = wide.astype(object).where(wide.notna(), None)
+            out.append(item.assign(json=wide.to_dict(orient='records')))
+
+        self.data.df = pd.concat(out, ignore_index=True) if out else self.df.iloc[:0]
 
     @timing
-    def export_data(self, shape=None, remap_fields=False, remap_values=False, **kwargs):
+    def export_data(self, shape=None, remap_fields=False, remap_values=False, compact=False, **kwargs):
 
         '''
             shape: shape of the output
             remap_fields: if fields should be exported with titles
             remap_values: if values should be exported as titles
+            compact: if category fields should be exported as pandas Categoricals with categories taken from metadata
+                options, and checkbox fields as nullable booleans
         '''
 
         if self.df is None:
@@ -1416,43 +1261,217 @@ class RabitDataset:
             #  The behavior of array concatenation with empty entries is deprecated. In a future version,
             #  this will no longer exclude empty items when determining the result dtype. To retain the old behavior,
             #  exclude the empty entries before the concat operation.
+            fields_translation = self._get_fields_translation(shape=shape, remap_fields=remap_fields, **kwargs)
+
             for name, item in items:
+                frm = name[0] if isinstance(name, tuple) else name
+                d_out.update({name: self.__export_frame(item, frm, remap_values=remap_values, compact=compact,
+                                                        fields_translation=fields_translation)})
+        else:
+            d_out = items
 
-                # Set output columns on the template dataframe
-                out_cols = [*self.md.loc[self.md['frmCode'] == name, 'fldCode'].unique()]
-                index = pd.MultiIndex.from_tuples(item.set_index(['pid', 'phase_id', 'fillDate']).index, names=['pid', 'phase_id', 'fillDate'])
-                df = pd.DataFrame(data=item.json.to_list(), columns=out_cols, index=index).reset_index()
-
-                if shape == 'split-forms':
-                    fields_translation = dict(zip(self.md['fldCode'], self.md['fldTitle']))
-                elif remap_fields and self.project.has_phases and kwargs.get('apply_phase', False):
-                    fields_translation = dict(zip(self.md['master_code'], self.md['master_title']))
-                elif remap_fields and self.project.has_phases and not kwargs.get('apply_phase', False):
-                    fields_translation = dict(zip(self.md['master_code'], self.md['fldTitle']))
-                elif remap_fields and not self.project.has_phases:
-                    fields_translation = dict(zip(self.md['master_code'], self.md['fldTitle']))
-                elif not self.project.has_phases:
-                    fields_translation = dict(zip(self.md['master_code'], self.md['fldCode']))
-                else:
-                    fields_translation = None
+        return d_out
+
+    def iter_export(self, chunk_size=10000, shape='split-forms', remap_fields=False, remap_values=False, compact=False,
+                    **kwargs):
+
+        '''
+            Yields exported data in bounded chunks so that whole output tables are never built in memory.
+
+            chunk_size: maximum number of participants (pid) in each chunk. All responses of a participant are in the
+                same chunk and chunks are ordered by pid. If None, a single chunk is yielded per form and phase
+            shape, remap_fields, remap_values, compact and other keyword arguments are passed as in export_data
 
-                if remap_values:
-                    for form in self.md['frmCode'].unique().tolist():
-                        values_map = self.md.loc[(self.md['frmCode'] == form) & (self.md['optVal'].notna())]\
-                            .groupby(by=['fldCode'])\
-                            .apply(lambda x: dict(zip(x['optVal'], x['optText']))).to_dict()
-                        df = df.replace(to_replace=values_map)
+            Yields (frmCode, phase_id, DataFrame) tuples. Frames are aligned with metadata and renamed as the frames
+            returned by export_data.
+        '''
+
+        if self.df is None:
+            return None
+
+        if not isinstance(self.md, pd.DataFrame) or not isinstance(self.phases, pd.DataFrame):
+            raise ValueError('Chunked exports need parsed metadata and project phases')
+
+        # Responses are selected as reshape selects them and sliced per form and phase directly. Output columns are
+        # only built chunk by chunk, shape only sets how they are named
+        df = self.__select_responses(**kwargs)
+        if df is None:
+            return None
+
+        fields_translation = self._get_fields_translation(shape=shape, remap_fields=remap_fields, **kwargs)
+
+        for (frm, phase_id), phase_item in df.groupby(by=['frmCode', 'phase_id'], sort=False):
+
+            if chunk_size:
+                pids = phase_item['pid'].to_numpy()
+                order = np.argsort(pids, kind='stable')
+                phase_item, pids = phase_item.iloc[order], pids[order]
+
+                # Chunks start at every chunk_size-th distinct pid
+                starts = np.searchsorted(pids, np.unique(pids)[::chunk_size])
+                bounds = [*starts, len(pids)]
+            else:
+                bounds = [0, len(phase_item)]
+
+            for start, stop in zip(bounds[:-1], bounds[1:]):
+                yield frm, phase_id, self.__export_frame(phase_item.iloc[start:stop], frm,
+                                                         remap_values=remap_values, compact=compact,
+                                                         fields_translation=fields_translation)
+
+    def __export_frame(self, item, frm, remap_values=False, compact=False, fields_translation=None):
+
+        # Builds the output frame of form frm from its response rows in item
+        md_index = self.metadata.index
 
-                if fields_translation:
-                    df = df.rename(columns=fields_translation)
+        # Set output columns on the template dataframe
+        out_cols = [*md_index.get_rows(frm=frm)['fldCode'].unique()]
+        index = pd.MultiIndex.from_tuples(item.set_index(['pid', 'phase_id', 'fillDate']).index, names=['pid', 'phase_id', 'fillDate'])
+        df = pd.DataFrame(data=item.json.to_list(), columns=out_cols, index=index).reset_index()
 
-                d_out.update({name: df})
+        # Option labels come from the metadata index and are only mapped on columns of fields with options
+        if remap_values:
+            values_map = md_index.get_options(frm=frm) if frm in md_index.form_rows else md_index.get_options()
+            for col in df.columns.intersection(list(values_map.keys())):
+                df[col] = _map_values(df[col], values_map[col])
+
+        if compact:
+            df = _compact_dtypes(df, md_index.get_rows(frm=frm), labels=remap_values)
+
+        if fields_translation:
+            df = df.rename(columns=fields_translation)
+
+        return df
+
+    def _get_fields_translation(self, shape=None, remap_fields=False, **kwargs):
+
+        # Returns the {field code: output column name} dictionary used when exporting data
+        if shape == 'split-forms':
+            return dict(zip(self.md['fldCode'], self.md['fldTitle']))
+        elif remap_fields and self.project.has_phases and kwargs.get('apply_phase', False):
+            return dict(zip(self.md['master_code'], self.md['master_title']))
+        elif remap_fields and self.project.has_phases and not kwargs.get('apply_phase', False):
+            return dict(zip(self.md['master_code'], self.md['fldTitle']))
+        elif remap_fields and not self.project.has_phases:
+            return dict(zip(self.md['master_code'], self.md['fldTitle']))
+        elif not self.project.has_phases:
+            return dict(zip(self.md['master_code'], self.md['fldCode']))
         else:
-            d_out = items
+            return None
 
-        del df
+    @timing
+    def export_columnar(self, path, file_format='parquet', row_group_size=50000, compression='snappy',
+                        include_metadata=True, shape='split-forms', remap_fields=False, remap_values=False,
+                        chunk_size=None, **kwargs):
 
-        return d_out
+        '''
+            Writes exported data and metadata as typed, partitioned columnar files.
+
+            path: output directory. Each form/phase table is written to
+                path/data/frmCode=<frmCode>/phase_id=<phase_id>/part-<n>.<file_format> and metadata to path/md and
+                path/mdn
+            file_format: 'parquet' or 'arrow' (Arrow IPC file)
+            row_group_size: number of rows per parquet row group or arrow record batch
+            compression: compression codec passed to the writer
+            include_metadata: whether md and mdn should be written along with data
+            chunk_size: if given, data is exported in chunks of at most chunk_size participants (see iter_export) and
+                each chunk is written to its own part file. Otherwise a single part is written per form and phase
+            shape, remap_fields, remap_values and other keyword arguments are passed to iter_export
+        '''
+
+        if self.df is None:
+            return None
+
+        fields_translation = self._get_fields_translation(shape=shape, remap_fields=remap_fields, **kwargs) or {}
+        written = []
+        parts = {}
+        schemas = {}
+
+        for frm, phase_id, df in self.iter_export(chunk_size=chunk_size, shape=shape, remap_fields=remap_fields,
+                                                  remap_values=remap_values, **kwargs):
+
+            # Data types of output columns are set according to metadata dType
+            dtypes = {fields_translation.get(k, k): v for k, v in self.metadata.index.get_dtypes(frm).items()}
+            df = _coerce_dtypes(df, dtypes)
+
+            df = df.drop(columns=['phase_id'])
+            part = parts.get((frm, phase_id), 0)
+            parts[(frm, phase_id)] = part + 1
+
+            # All parts of a form and phase are written with the schema built from metadata for the first one, so a
+            # part where a field has no answers does not get a different type
+            if (frm, phase_id) not in schemas:
+                schemas[(frm, phase_id)] = arrow_schema(df, dtypes)
+
+            fp = os.path.join(path, 'data', f'frmCode={frm}', f'phase_id={phase_id}', f'part-{part}.{file_format}')
+            written.append(write_table(df, fp, file_format=file_format, row_group_size=row_group_size,
+                                       compression=compression, schema=schemas[(frm, phase_id)]))
+
+        if include_metadata:
+            for name, md in [('md', self.md), ('mdn', self.mdn)]:
+                if isinstance(md, pd.DataFrame):
+                    fp = os.path.join(path, f'{name}.{file_format}')
+                    written.append(write_table(_metadata_frame(md), fp, file_format=file_format,
+                                               row_group_size=row_group_size, compression=compression))
+
+        return written
+
+    @timing
+    def export_sql(self, writer, table_prefix='rabit', wide=True, long=True, keys=('pid', 'frmCode', 'fillDate'),
+                   duplicates='raise'):
+
+        '''
+            Bulk loads parsed responses into a SQL database, upserting on keys.
+
+            writer: A RabitDatabaseWriter or a SQLAlchemy database url
+            table_prefix: Prefix of output tables. Wide tables are named <table_prefix>_f<frmCode> and the long
+                format table <table_prefix>_responses
+            wide: Write one wide table per form with a column per field, typed according to metadata dType
+            long: Write all responses in long format with (keys, fldCode, value) rows
+            keys: Columns identifying a response. Long format rows are keyed on keys and fldCode. phase_id is added
+                when data has phases, so responses of a participant in different phases are kept apart
+            duplicates: {default 'raise', 'drop'} If responses share keys, raise ValueError, or warn and write the last
+                of them. See RabitDatabaseWriter.write
+        '''
+
+        if self.df is None:
+            return None
+
+        if isinstance(writer, str):
+            writer = RabitDatabaseWriter(url=writer)
+
+        keys = list(keys)
+        if 'phase_id' in self.df.columns and 'phase_id' not in keys:
+            keys.append('phase_id')
+        idx_cols = [col for col in self.df.columns if col != 'json']
+        written = {}
+
+        if wide:
+            for frm, item in self.df.groupby(by='frmCode', sort=False):
+
+                if isinstance(self.md, pd.DataFrame):
+                    dtypes = self.metadata.index.get_dtypes(frm)
+                else:
+                    dtypes = dict.fromkeys(set(itertools.chain.from_iterable(item['json'])), 'str')
+
+                out_cols = [col for col in dtypes.keys() if col not in idx_cols]
+                df = pd.DataFrame(data=item['json'].to_list(), columns=out_cols, index=item.index)
+                df = pd.concat([item[idx_cols], _coerce_dtypes(df, dtypes)], axis=1)
+
+                table = f'{table_prefix}_f{frm}'
+                written[table] = writer.write(df, table=table, keys=keys, duplicates=duplicates)
+
+        if long:
+            df = self.df[idx_cols].copy()
+            df['json'] = self.df['json'].apply(lambda x: [(k, v) for k, v in x.items() if v is not None])
+            df = df.explode('json').dropna(subset=['json'])
+            df['fldCode'] = df['json'].str[0]
+            df['value'] = df['json'].str[1].map(_sql_value)
+            df = df.drop(columns=['json'])
+
+            table = f'{table_prefix}_responses'
+            written[table] = writer.write(df, table=table, keys=[*keys, 'fldCode'], duplicates=duplicates)
+
+        return written
 
     def reshape(self, **kwargs):
 
@@ -1483,3 +1502,13 @@ class RabitDataset:
                                      reset_index=kwargs.get('reset_index', False))
 
         return self.data.reshape(**kwargs)
+
+    def __select_responses(self, **kwargs):
+
+        # Responses selected with the defaults of reshape
+        apply_phase = kwargs.get('apply_phase', self.project.has_phases if self.project else True)
+        return self.data.select_responses(index=kwargs.get('index', 'pid'),
+                                          apply_phase=apply_phase,
+                                          order=kwargs.get('order', ['pid', 'phase_id', 'frmCode', 'fillDate']),
+                                          keep=kwargs.get('keep', 'last'),
+                                          filter_array=kwargs.get('filter_array', None))
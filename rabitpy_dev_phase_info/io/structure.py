@@ -0,0 +1,88 @@
+import numbers
+
+import pandas as pd
+
+
+def _sort_key(key):
+    # Orders (phase_id, frmCode) keys mixing numbers, strings and None: numbers first, then strings, then None
+    return tuple((0, x, '') if isinstance(x, numbers.Real) else (1, 0, str(x)) if x is not None else (2, 0, '')
+                 for x in key)
+
+
+class RabitStructure:
+
+    def __init__(self, fields=None, counters=None):
+
+        """
+
+        Mergeable summary of the structure of RABIT responses
+        fields: A dictionary of the form {(phase_id, frmCode): {fldCode1, fldCode2, ...}}
+        counters: A dictionary of the form {(phase_id, frmCode): {dynamic_field: maximum number of repeats}}
+
+        Summaries can be updated batch by batch and combined across workers or incremental runs. Combining takes the
+        union of field sets and the element-wise maximum of dynamic counters.
+
+        """
+
+        self.fields = fields if fields is not None else {}
+        self.counters = counters if counters is not None else {}
+
+    def __add__(self, other):
+        return RabitStructure().merge(self).merge(other)
+
+    def __iadd__(self, other):
+        return self.merge(other)
+
+    def __eq__(self, other):
+        return isinstance(other, RabitStructure) and self.fields == other.fields and \
+            {k: v for k, v in self.counters.items() if v} == {k: v for k, v in other.counters.items() if v}
+
+    def update(self, df):
+
+        # df: Response dataframe with phase_id, frmCode, json (flattened responses) and dc (dynamic counters) columns
+        dcs = df['dc'] if 'dc' in df.columns else [None] * len(df)
+
+        for key, rec, dc in zip(zip(df['phase_id'], df['frmCode']), df['json'], dcs):
+            # Rows without a phase or form are left out, as groupby leaves out missing keys
+            if pd.isna(key[0]) or pd.isna(key[1]):
+                continue
+            self.fields.setdefault(key, set()).update(rec.keys())
+            if dc:
+                self.__update_counter(key, dc)
+
+        return self
+
+    def merge(self, other):
+
+        for key, fields in other.fields.items():
+            self.fields.setdefault(key, set()).update(fields)
+
+        for key, dc in other.counters.items():
+            self.__update_counter(key, dc)
+
+        return self
+
+    def __update_counter(self, key, dc):
+        counter = self.counters.setdefault(key, {})
+        for k, v in dc.items():
+            if v > counter.get(k, 0):
+                counter[k] = v
+
+    def to_frame(self):
+
+        # Returns the structure in the [phase_id, frmCode, fldCode, dc] layout used by RabitData.dff
+        keys = sorted(self.fields.keys(), key=_sort_key)
+        return pd.DataFrame({'phase_id': [k[0] for k in keys],
+                             'frmCode': [k[1] for k in keys],
+                             'fldCode': [set(self.fields[k]) for k in keys],
+                             'dc': [dict(self.counters.get(k, {})) for k in keys]})
+
+    @classmethod
+    def from_frame(cls, dff):
+        fields = {}
+        counters = {}
+        for phase_id, frm, fld, dc in zip(dff['phase_id'], dff['frmCode'], dff['fldCode'], dff['dc']):
+            fields.setdefault((phase_id, frm), set()).update(fld)
+            if dc:
+                counters[(phase_id, frm)] = dict(dc)
+        return cls(fields=fields, counters=counters)
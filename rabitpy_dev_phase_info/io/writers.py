@@ -0,0 +1,259 @@
+import json
+import os
+import warnings
+import pandas as pd
+
+
+_FILE_EXTENSIONS = {'parquet': 'parquet', 'arrow': 'arrow'}
+
+
+def _import_pyarrow():
+
+    # pyarrow is an optional dependency only needed for columnar exports
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError('pyarrow is required for parquet and arrow exports. Install it with "pip install pyarrow"')
+
+    return pyarrow
+
+
+def _metadata_frame(md):
+
+    # Metadata holds lists and dictionaries (opt, validators, warning) and mixed types in some object columns.
+    # These are serialized to JSON strings so they can be stored in columnar files.
+    md = md.reset_index(drop=True).copy()
+
+    for col in md.columns[md.dtypes == object]:
+        values = md[col].dropna()
+        if values.empty:
+            continue
+        if values.apply(lambda x: isinstance(x, (list, dict))).any():
+            md[col] = md[col].apply(lambda x: json.dumps(x, ensure_ascii=False, default=str)
+                                    if isinstance(x, (list, dict)) else x)
+        md[col] = md[col].where(md[col].isna(), md[col].astype(str)).astype('string')
+
+    return md
+
+
+def _arrow_type(pa, dtype):
+    # Arrow type of a RABIT metadata dType. Unknown types (e.g. jalalidate) are stored as strings
+    return {'numeric': pa.float64(), 'category': pa.dictionary(pa.int32(), pa.string()), 'bool': pa.bool_(),
+            'datetime': pa.timestamp('ns')}.get(dtype, pa.string())
+
+
+def arrow_schema(df, dtypes):
+
+    '''
+        Returns the Arrow schema of a table from metadata data types, so all parts of a table share one schema
+        whatever values each part holds.
+
+        df: DataFrame with the columns of the table
+        dtypes: {column: dType} of field columns. Types of other columns are inferred from df, and columns with no
+            values are stored as strings
+    '''
+
+    pa = _import_pyarrow()
+
+    fields = []
+    for field in pa.Schema.from_pandas(df, preserve_index=False):
+        if field.name in dtypes:
+            fields.append(pa.field(field.name, _arrow_type(pa, dtypes[field.name])))
+        elif pa.types.is_null(field.type):
+            fields.append(pa.field(field.name, pa.string()))
+        else:
+            fields.append(field)
+
+    return pa.schema(fields)
+
+
+def write_table(df, fp, file_format='parquet', row_group_size=50000, compression='snappy', schema=None):
+
+    '''
+        Writes a DataFrame to a parquet or arrow IPC file, one row group (or record batch) at a time.
+
+        df: DataFrame with columns already cast to their target dtypes
+        fp: output file path
+        file_format: 'parquet' or 'arrow'
+        row_group_size: number of rows in each row group or record batch
+        compression: compression codec used by the writer
+        schema: Arrow schema of the file, see arrow_schema. Files written as parts of one table must share a schema.
+            If None, the schema is inferred from df
+    '''
+
+    pa = _import_pyarrow()
+
+    if file_format not in _FILE_EXTENSIONS:
+        raise ValueError(f'Unknown file format {file_format}. Expected one of {list(_FILE_EXTENSIONS.keys())}')
+
+    if df.columns.duplicated().any():
+        raise ValueError(f'Duplicated column names can not be written to {file_format} files: '
+                         f'{list(df.columns[df.columns.duplicated()].unique())}')
+
+    df = df.reset_index(drop=True)
+
+    # Without a schema, it is inferred once from the whole frame so all row groups share the same types
+    if schema is None:
+        schema = pa.Schema.from_pandas(df, preserve_index=False)
+
+    os.makedirs(os.path.dirname(os.path.abspath(fp)), exist_ok=True)
+
+    if file_format == 'parquet':
+        writer = pa.parquet.ParquetWriter(fp, schema=schema, compression=compression)
+    else:
+        options = pa.ipc.IpcWriteOptions(compression=None if compression in (None, 'snappy') else compression)
+        writer = pa.ipc.new_file(fp, schema=schema, options=options)
+
+    try:
+        for start in range(0, max(len(df), 1), row_group_size):
+            batch = pa.Table.from_pandas(df.iloc[start:start + row_group_size], schema=schema, preserve_index=False)
+            writer.write_table(batch)
+    finally:
+        writer.close()
+
+    return fp
+
+
+class RabitDatabaseWriter:
+
+    def __init__(self, url, chunksize=10000, schema=None, connect_args={}, pool_size=None, max_overflow=None,
+                 pool_recycle=None, pool_timeout=None, pool_pre_ping=False):
+
+        """
+        url: SQLAlchemy database url
+        chunksize: number of rows inserted in each transaction
+        schema: database schema tables are written to
+        pool_size, max_overflow, pool_recycle, pool_timeout, pool_pre_ping: Connection pool configuration passed to
+            sqlalchemy.create_engine. Options left as None use the dialect defaults
+        """
+
+        # sqlalchemy is only needed for database targets
+        from sqlalchemy import create_engine
+
+        pool_options = {'pool_size': pool_size, 'max_overflow': max_overflow, 'pool_recycle': pool_recycle,
+                        'pool_timeout': pool_timeout}
+        pool_options = {k: v for k, v in pool_options.items() if v is not None}
+
+        self.engine = create_engine(url, connect_args=connect_args, pool_pre_ping=pool_pre_ping, **pool_options)
+        self.chunksize = chunksize
+        self.schema = schema
+
+    def write(self, df, table, keys, duplicates='raise'):
+
+        '''
+            Upserts the rows of a DataFrame into table in transactional batches of chunksize rows.
+
+            df: DataFrame to be written. Columns are used as they are, so dtypes should already be set
+            table: target table name. The table is created if it does not exist and missing columns are added
+            keys: list of columns making up the primary key rows are upserted on
+            duplicates: {default 'raise', 'drop'}
+                If rows share a key, raise ValueError, or warn and keep the last of them.
+        '''
+
+        if duplicates not in ('raise', 'drop'):
+            raise ValueError("invalid value for 'duplicates' parameter, valid options are: raise, drop")
+
+        if df.empty:
+            return 0
+
+        # Rows with the same key in one statement can not be upserted, and only one of them could be stored
+        duplicated = df.duplicated(subset=keys, keep='last')
+        if duplicated.any():
+            message = f'{int(duplicated.sum())} rows of {table} share their key {keys} with a later row'
+            if duplicates == 'raise':
+                raise ValueError(f'{message}. Add columns to keys, or set duplicates=\'drop\' to keep the last row')
+            warnings.warn(f'{message} and are dropped')
+            df = df.loc[~duplicated]
+        target = self.__get_table(df, table, keys)
+        stmt = self.__upsert_statement(target, keys)
+
+        records = df.astype(object).where(df.notna(), None)
+
+        for start in range(0, len(records), self.chunksize):
+            batch = records.iloc[start:start + self.chunksize].to_dict(orient='records')
+            with self.engine.begin() as conn:
+                if stmt is None:
+                    self.__delete_keys(conn, target, keys, batch)
+                    conn.execute(target.insert(), batch)
+                else:
+                    conn.execute(stmt, batch)
+
+        return len(records)
+
+    def __get_table(self, df, table, keys):
+
+        from sqlalchemy import MetaData, Table, Column, inspect, text
+
+        inspector = inspect(self.engine)
+        metadata = MetaData(schema=self.schema)
+
+        if not inspector.has_table(table, schema=self.schema):
+            columns = [Column(col, self.__column_type(df[col], key=col in keys), primary_key=col in keys,
+                              nullable=col not in keys) for col in df.columns]
+            target = Table(table, metadata, *columns)
+            metadata.create_all(self.engine)
+            return target
+
+        target = Table(table, metadata, autoload_with=self.engine)
+        missing = [col for col in df.columns if col not in target.columns]
+
+        # New fields in forms are added to existing tables
+        if missing:
+            preparer = self.engine.dialect.identifier_preparer
+            with self.engine.begin() as conn:
+                for col in missing:
+                    col_type = self.__column_type(df[col], key=col in keys).compile(dialect=self.engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {preparer.format_table(target)} '
+                                      f'ADD COLUMN {preparer.quote(col)} {col_type}'))
+            target = Table(table, MetaData(schema=self.schema), autoload_with=self.engine)
+
+        return target
+
+    def __upsert_statement(self, target, keys):
+
+        # Native upserts are used where the dialect supports them. Other dialects delete existing keys and insert
+        dialect = self.engine.dialect.name
+        update_cols = [c.name for c in target.columns if c.name not in keys]
+
+        if dialect in ('postgresql', 'sqlite'):
+            if dialect == 'postgresql':
+                from sqlalchemy.dialects.postgresql import insert
+            else:
+                from sqlalchemy.dialects.sqlite import insert
+            stmt = insert(target)
+            if not update_cols:
+                return stmt.on_conflict_do_nothing(index_elements=keys)
+            return stmt.on_conflict_do_update(index_elements=keys,
+                                              set_={c: stmt.excluded[c] for c in update_cols})
+        elif dialect in ('mysql', 'mariadb'):
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(target)
+            return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in (update_cols or keys)})
+
+        return None
+
+    def __delete_keys(self, conn, target, keys, batch):
+
+        from sqlalchemy import and_, bindparam
+
+        stmt = target.delete().where(and_(*[target.c[k] == bindparam(f'_{k}') for k in keys]))
+        conn.execute(stmt, [{f'_{k}': rec[k] for k in keys} for rec in batch])
+
+    def __column_type(self, s, key=False):
+
+        from sqlalchemy import BigInteger, Boolean, DateTime, Float, String, Text
+
+        if pd.api.types.is_bool_dtype(s):
+            return Boolean()
+        elif pd.api.types.is_integer_dtype(s):
+            return BigInteger()
+        elif pd.api.types.is_float_dtype(s):
+            return Float()
+        elif pd.api.types.is_datetime64_any_dtype(s):
+            return DateTime()
+        elif key:
+            # Databases like MySQL do not index TEXT columns without a length, so string keys are VARCHARs
+            length = s.dropna().astype(str).str.len().max()
+            return String(max(255, int(length) if pd.notna(length) else 0))
+        return Text()
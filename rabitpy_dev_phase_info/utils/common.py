@@ -1,7 +1,8 @@
-import khayyam as kym
+def jalali_to_gregorian(x, format='%Y-%m-%d'):
 
+    # khayyam is only needed when jalali dates are actually converted
+    import khayyam as kym
 
-def jalali_to_gregorian(x, format='%Y-%m-%d'):
     if not isinstance(x, str):
         raise TypeError('Input date should be a string.')
-    return kym.JalaliDate.strptime(x, format).todate()
\ No newline at end of file
+    return kym.JalaliDate.strptime(x, format).todate()
@@ -0,0 +1,68 @@
+import json
+import random
+import warnings
+
+import pytest
+
+from rabitpy_dev_phase_info.io.adapters import RabitReaderJSONObjAdapter
+from rabitpy_dev_phase_info.io.resources import RabitData, RabitMetadata, RabitDataset, RabitProject
+
+
+INDEX_FIELDS = [{'name': 'questioneeId', 'alias': 'pid', 'dtype': 'int'},
+                {'name': 'surveyId', 'alias': 'frmCode', 'default': 0, 'dtype': 'int'},
+                {'name': 'createdDate', 'alias': 'fillDate'},
+                {'name': 'phaseId', 'alias': 'phase_id', 'default': 0, 'dtype': 'int'}]
+
+
+def survey(fid):
+    return {'pages': [{'name': 'p1', 'elements': [
+        {'type': 'text', 'name': 'age', 'title': 'Age', 'inputType': 'number'},
+        {'type': 'text', 'name': 'name', 'title': 'Name'},
+        {'type': 'radiogroup', 'name': 'sex', 'title': 'Sex',
+         'choices': [{'value': '1', 'text': 'Male'}, {'value': '2', 'text': 'Female'}]},
+        {'type': 'checkbox', 'name': 'dx', 'title': 'Diagnosis',
+         'choices': [{'value': 'a', 'text': 'A'}, {'value': 'b', 'text': 'B'}]},
+        {'type': 'text', 'name': f'f{fid}_only', 'title': 'Only'},
+    ]}]}
+
+
+def build_dataset(n=20, forms=(1, 2), phases=(1,), answer=None, seed=0, make_survey=survey):
+
+    # n participants answer every form in every phase. answer(i, phase, form, answers) may override the generated
+    # answers, and make_survey(form) returns the survey JSON of each form
+    rnd = random.Random(seed)
+    phase_records = [{'id': p, 'name': f'phase{p}', 'level': 1, 'order': p, 'createdDate': '', 'modifiedDate': '',
+                      'parentId': None, 'surveyIds': list(forms)} for p in phases]
+    project = RabitProject(source='json', reader=RabitReaderJSONObjAdapter(obj={'projectName': 'P',
+                                                                                 'phases': phase_records}))
+    metadata = RabitMetadata(source='json', obj=[{'id': f, 'surveyName': f'Form{f}', 'surveyDescription': '',
+                                                  'sortOrder': f, 'json': json.dumps(make_survey(f))} for f in forms])
+    content = []
+    for i in range(n):
+        for p in phases:
+            for f in forms:
+                r = {'age': rnd.randint(1, 90), 'name': f'n{i}', 'sex': rnd.choice(['1', '2']),
+                     'dx': rnd.sample(['a', 'b'], rnd.randint(0, 2)), f'f{f}_only': 'z'}
+                if answer is not None:
+                    r = answer(i, p, f, r)
+                content.append({'questioneeId': 100 + i, 'surveyId': f, 'phaseId': p,
+                                'createdDate': f'2024-01-{1 + i % 28:02d} 10:00:00', 'respondJson': json.dumps(r)})
+
+    data = RabitData(source='json', obj={'content': content}, index_fields=INDEX_FIELDS, json_path='respondJson')
+    dataset = RabitDataset(data=data, metadata=metadata, project=project)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        dataset.load()
+
+    return dataset
+
+
+@pytest.fixture
+def dataset():
+    return build_dataset()
+
+
+@pytest.fixture
+def phased_dataset():
+    return build_dataset(n=20, phases=(1, 2))
@@ -0,0 +1,89 @@
+import copy
+import json
+
+import pandas as pd
+import pytest
+from sqlalchemy import create_engine, text
+
+from rabitpy_dev_phase_info.errors import APINotAvailableError
+from rabitpy_dev_phase_info.io.adapters import RabitReaderJSONFileAdapter, RabitDatabaseAdapter
+from rabitpy_dev_phase_info.io.resources import RabitData
+
+from conftest import INDEX_FIELDS
+
+
+def records(n=25):
+    return [{'questioneeId': 100 + i, 'surveyId': 1 + i % 2, 'phaseId': 1 + i % 3,
+             'createdDate': f'2024-01-{1 + i % 28:02d} 10:00:00',
+             'respondJson': json.dumps({'age': i, 'name': 'سلام', 'dx': ['a', 'b'][:i % 3]})} for i in range(n)]
+
+
+def data(source, **kwargs):
+    resource = RabitData(source=source, index_fields=INDEX_FIELDS, json_path='respondJson', content_path=None,
+                         **kwargs)
+    resource.parse()
+    return resource
+
+
+@pytest.mark.parametrize('chunksize', [None, 1, 7])
+def test_ndjson_dump_replays_to_the_same_data(tmp_path, chunksize):
+    source = data('json', obj=records())
+    fp = tmp_path / 'dump.ndjson'
+    source.dump(fp, lines=True)
+
+    assert len(fp.read_text(encoding='utf-8').splitlines()) == 25
+    replay = data('json-file', fp=str(fp), chunksize=chunksize)
+    pd.testing.assert_frame_equal(replay.df, source.df)
+
+
+def test_json_file_and_shared_objects_parse_like_copies(tmp_path):
+    obj = records()
+    before = copy.deepcopy(obj)
+    expected = data('json', obj=obj).df
+
+    fp = tmp_path / 'dump.json'
+    fp.write_text(json.dumps(obj, ensure_ascii=False), encoding='utf-16')
+    pd.testing.assert_frame_equal(data('json-file', fp=str(fp), encoding='utf-16').df, expected)
+
+    pd.testing.assert_frame_equal(data('json', obj=obj, copy=False).df, expected)
+    assert obj == before
+
+
+def test_ndjson_chunks_are_bounded(tmp_path):
+    fp = tmp_path / 'dump.jsonl'
+    fp.write_text('\n'.join(json.dumps(rec) for rec in records(10)) + '\n\n', encoding='utf-8')
+
+    adapter = RabitReaderJSONFileAdapter(fp=str(fp), chunksize=4)
+    assert [len(chunk) for chunk in adapter.fetch_chunks()] == [4, 4, 2]
+    assert adapter.fetch() == records(10)
+
+
+@pytest.fixture
+def database(tmp_path):
+    url = f'sqlite:///{tmp_path / "source.db"}'
+    engine = create_engine(url)
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE responses (id INTEGER, respondJson TEXT)'))
+        conn.execute(text('INSERT INTO responses VALUES (:id, :json)'),
+                     [{'id': i, 'json': json.dumps({'age': i})} for i in range(10)])
+    engine.dispose()
+    return url
+
+
+@pytest.mark.parametrize('chunksize', [None, 3])
+def test_database_reads_raise_connection_and_query_errors(tmp_path, database, chunksize):
+    adapter = RabitDatabaseAdapter(database, 'SELECT * FROM responses WHERE id < :n', parameters={'n': 8},
+                                   chunksize=chunksize)
+    assert [row['id'] for row in adapter.fetch()] == list(range(8))
+
+    with pytest.raises(ValueError, match='Error running query'):
+        RabitDatabaseAdapter(database, 'SELECT * FROM missing', chunksize=chunksize).fetch()
+
+    with pytest.raises(APINotAvailableError, match='Error connecting to database'):
+        RabitDatabaseAdapter(f'sqlite:///{tmp_path / "missing" / "x.db"}', 'SELECT 1', chunksize=chunksize).fetch()
+
+
+def test_database_chunks_are_bounded(database):
+    adapter = RabitDatabaseAdapter(database, 'SELECT * FROM responses', chunksize=4)
+    assert [len(chunk) for chunk in adapter.fetch_chunks()] == [4, 4, 2]
+    assert [len(chunk) for chunk in adapter.fetch_chunks(chunksize=5)] == [5, 5]
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from rabitpy.preprocessing.categorizers import qcut, remap
+
+
+def lab_frame(n=500):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'hb': rng.normal(13, 1.5, n), 'ldl': rng.lognormal(4.7, 0.3, n),
+                       'age': rng.integers(18, 90, n), 'visits': pd.array(rng.integers(0, 30, n), dtype='Int64'),
+                       'site': rng.choice(['a', 'b'], n)})
+    df.loc[::9, 'ldl'] = np.nan
+    df.loc[::13, 'visits'] = pd.NA
+    return df
+
+
+@pytest.mark.parametrize('labels', [None, False, ['low', 'mid', 'high', 'top']])
+def test_qcut_matches_pd_qcut(labels):
+    df = lab_frame()
+    out, bins = qcut(df, 4, labels=labels, retbins=True)
+
+    assert list(out.columns) == [*df.columns, 'hb_cat', 'ldl_cat', 'age_cat', 'visits_cat']
+    for col in ['hb', 'ldl', 'age', 'visits']:
+        expected, edges = pd.qcut(df[col].astype('float64'), 4, labels=labels, retbins=True)
+        pd.testing.assert_series_equal(out[f'{col}_cat'], expected, check_names=False)
+        np.testing.assert_allclose(bins[col], edges, rtol=1e-12)
+
+
+def test_qcut_with_quantiles_per_column_matches_pd_qcut():
+    df = lab_frame()
+    # Most patients have no admissions, so some edges of admissions are equal
+    df['admissions'] = np.where(np.arange(len(df)) % 5, 0, np.arange(len(df)) % 7)
+    q = {'hb': 10, 'ldl': [0, 0.1, 0.5, 0.9, 1], 'age': 10, 'visits': 20, 'admissions': 10}
+    out = qcut(df, q, suffix='_q', duplicates='drop')
+
+    for col, this_q in q.items():
+        expected = pd.qcut(df[col].astype('float64'), this_q, duplicates='drop')
+        pd.testing.assert_series_equal(out[f'{col}_q'], expected, check_names=False)
+
+    with pytest.raises(ValueError, match='Bin edges must be unique'):
+        qcut(df, {'admissions': 10})
+
+
+def test_remap_matches_replace():
+    df = lab_frame()
+    cats = {'site': {'a': 1, 'b': 2}, 'age': {18: 0, 19: 0}}
+    table = pd.DataFrame([(col, value, code) for col, mapping in cats.items() for value, code in mapping.items()],
+                         columns=['column', 'value', 'code'])
+
+    expected = df.replace(cats)
+    pd.testing.assert_frame_equal(remap(df, cats), expected)
+    pd.testing.assert_frame_equal(remap(df, table), expected)
+    out = remap(df, cats, suffix='_code')
+    pd.testing.assert_frame_equal(out[['site_code', 'age_code']], expected[['site', 'age']].add_suffix('_code'))
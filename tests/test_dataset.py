@@ -0,0 +1,30 @@
+import pandas as pd
+
+from conftest import build_dataset
+
+
+def merge_sync(dataset):
+    # sync before responses were aligned per form, on one row of dff per form
+    d = dataset.df.merge(dataset.dff.drop_duplicates(subset='frmCode')[['frmCode', 'fldCode']], on='frmCode',
+                         how='right')
+    d['json'] = d.apply(lambda x: {k: x['json'].get(k, None) for k in x['fldCode'].keys()}, axis=1)
+    return d.drop(columns=['fldCode'])
+
+
+def test_sync_matches_merged_alignment():
+
+    # Some responses leave fields out or answer fields which are not in metadata
+    def answer(i, p, f, r):
+        if i % 3 == 0:
+            r = {k: v for k, v in r.items() if k != 'name'}
+        return {**r, 'extra': i} if i % 4 == 0 else r
+
+    dataset = build_dataset(n=12, phases=(1, 2), answer=answer)
+    expected = merge_sync(dataset)
+
+    dataset.sync()
+
+    # Each response is kept once, although dff holds a row per phase of each form
+    assert len(dataset.df) == 12 * 2 * 2
+    pd.testing.assert_frame_equal(dataset.df, expected)
+    assert all('extra' not in rec and 'name' in rec for rec in dataset.df['json'])
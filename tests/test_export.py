@@ -0,0 +1,120 @@
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import String, create_engine, inspect
+
+from rabitpy_dev_phase_info.io.writers import RabitDatabaseWriter
+
+from conftest import build_dataset
+
+
+INDEX = ['pid', 'phase_id', 'frmCode']
+
+
+def export_forms(dataset):
+    # export_data keys split forms by (frmCode,)
+    out = dataset.export_data(shape='split-forms', index=INDEX)
+    return {(k[0] if isinstance(k, tuple) else k): v for k, v in out.items()}
+
+
+def test_parquet_round_trip_with_empty_first_part(tmp_path):
+
+    # Nobody answers sex in the first chunk of participants
+    dataset = build_dataset(n=10, answer=lambda i, p, f, r: {**r, 'sex': None} if i < 5 else r)
+    dataset.export_columnar(str(tmp_path), chunk_size=5, include_metadata=False, index=INDEX)
+
+    expected = export_forms(dataset)[1].set_index('pid')
+    df = pq.read_table(str(tmp_path / 'data' / 'frmCode=1')).to_pandas().set_index('pid').sort_index()
+
+    assert len(list((tmp_path / 'data' / 'frmCode=1' / 'phase_id=1').iterdir())) == 2
+    assert df['Sex'].isna().sum() == 5
+    assert df['Sex'].astype(object).loc[105:].tolist() == expected['Sex'].loc[105:].tolist()
+    assert df['Age'].tolist() == expected['Age'].astype(float).tolist()
+
+
+def test_export_sql_keeps_responses_of_every_phase(tmp_path, phased_dataset):
+
+    url = f'sqlite:///{tmp_path / "out.db"}'
+    written = phased_dataset.export_sql(url)
+
+    engine = create_engine(url)
+    wide = pd.read_sql_table('rabit_f1', engine)
+    long = pd.read_sql_table('rabit_responses', engine)
+
+    # 20 participants answered form 1 in each of 2 phases
+    assert written['rabit_f1'] == 40
+    assert len(wide) == 40
+    assert sorted(wide['phase_id'].unique()) == [1, 2]
+    assert len(long.drop_duplicates(subset=['pid', 'phase_id', 'frmCode'])) == 80
+
+    columns = {col['name']: col for col in inspect(engine).get_columns('rabit_f1')}
+    assert isinstance(columns['fillDate']['type'], String) and columns['fillDate']['type'].length == 255
+
+
+def test_database_writer_raises_on_key_collisions(tmp_path):
+
+    writer = RabitDatabaseWriter(url=f'sqlite:///{tmp_path / "out.db"}')
+    df = pd.DataFrame({'pid': [1, 1, 2], 'frmCode': [1, 1, 1], 'age': [30.0, 31.0, 40.0]})
+
+    with pytest.raises(ValueError, match='share their key'):
+        writer.write(df, table='t', keys=['pid', 'frmCode'])
+
+    with pytest.warns(UserWarning, match='are dropped'):
+        assert writer.write(df, table='t', keys=['pid', 'frmCode'], duplicates='drop') == 2
+    assert pd.read_sql_table('t', writer.engine)['age'].tolist() == [31.0, 40.0]
+
+
+@pytest.mark.parametrize('chunk_size', [1, 7, None])
+def test_iter_export_chunks_concatenate_to_export_data(phased_dataset, chunk_size, monkeypatch):
+
+    expected = export_forms(phased_dataset)
+
+    # Chunks are sliced from the responses directly, without reshaping every form first
+    monkeypatch.setattr(type(phased_dataset.data), 'reshape', lambda *args, **kwargs: pytest.fail('reshape called'))
+
+    chunks = {}
+    for frm, phase_id, df in phased_dataset.iter_export(chunk_size=chunk_size, shape='split-forms', index=INDEX):
+        assert (df['phase_id'] == phase_id).all()
+        if chunk_size:
+            assert df['pid'].nunique() <= chunk_size
+        chunks.setdefault(frm, []).append(df)
+
+    assert chunks.keys() == expected.keys()
+    for frm, dfs in chunks.items():
+        out = pd.concat(dfs).sort_values(by=['pid', 'phase_id']).reset_index(drop=True)
+        pd.testing.assert_frame_equal(out, expected[frm].sort_values(by=['pid', 'phase_id']).reset_index(drop=True))
+
+
+def test_export_sql_long_values_are_json_or_null(tmp_path):
+
+    dataset = build_dataset(n=2, forms=(1,), answer=lambda i, p, f, r: {**r, 'age': float('nan') if i == 0 else 42})
+    # Parsing flattens answers, but values of fields unknown to the parser may still be lists or objects
+    first = dataset.data.df['json'].iloc[0]
+    first.update({'tags': ['a', 'ب'], 'geo': {'lat': 35.7}})
+
+    url = f'sqlite:///{tmp_path / "out.db"}'
+    dataset.export_sql(url, wide=False)
+
+    values = pd.read_sql_table('rabit_responses', create_engine(url)).set_index(['pid', 'fldCode'])['value']
+    assert values[100, 'tags'] == '["a","ب"]'
+    assert values[100, 'geo'] == '{"lat":35.7}'
+    assert values[100, 'age'] is None
+    assert values[101, 'age'] == '42'
+    assert values[100, 'name'] == 'n0'
+
+
+def test_remap_values_matches_replace_over_every_form(dataset):
+
+    labelled = dataset.export_data(shape='split-forms', index=INDEX, remap_values=True)
+    plain = dataset.export_data(shape='split-forms', index=INDEX)
+
+    # Labels used to be set by replacing options of every form over each whole output frame, before columns were
+    # renamed to field titles
+    md_index = dataset.metadata.index
+    titles = dataset._get_fields_translation(shape='split-forms')
+    assert labelled.keys() == plain.keys()
+    for name, df in plain.items():
+        for form in md_index.form_rows.keys():
+            df = df.replace(to_replace={titles[fld]: opts for fld, opts in md_index.get_options(frm=form).items()})
+        pd.testing.assert_frame_equal(labelled[name], df)
+    assert set(pd.concat(labelled.values())['Sex'].dropna()) == {'Male', 'Female'}
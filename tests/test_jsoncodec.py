@@ -0,0 +1,46 @@
+import math
+from pathlib import Path
+
+import pytest
+
+import rabitpy.io.jsoncodec
+from rabitpy_dev_phase_info.utils import jsoncodec
+
+
+ROOT = Path(__file__).resolve().parents[1]
+
+DOCUMENT = {'age': math.nan, 'weight': [1.5, math.inf], 'name': 'سلام', 'empty': None, 'nested': {'x': -math.inf}}
+
+
+@pytest.fixture(params=['json', 'orjson'])
+def backend(request):
+    pytest.importorskip(request.param)
+    previous = jsoncodec.get_backend()
+    jsoncodec.set_backend(request.param)
+    yield request.param
+    jsoncodec.set_backend(previous)
+
+
+def test_codec_copies_are_identical():
+    # The dev package module is the source of truth of the copy shipped with the legacy package
+    source = ROOT / 'rabitpy_dev_phase_info' / 'utils' / 'jsoncodec.py'
+    assert (ROOT / 'rabitpy' / 'io' / 'jsoncodec.py').read_text() == source.read_text()
+
+
+def test_non_finite_floats_do_not_depend_on_backend(backend):
+
+    text = jsoncodec.dumps(DOCUMENT)
+    assert text == '{"age":NaN,"weight":[1.5,Infinity],"name":"سلام","empty":null,"nested":{"x":-Infinity}}'
+
+    copy = jsoncodec.deepcopy(DOCUMENT)
+    assert math.isnan(copy['age']) and copy['weight'] == [1.5, math.inf] and copy['nested']['x'] == -math.inf
+    assert copy['empty'] is None and copy is not DOCUMENT
+
+
+def test_loads_falls_back_to_stdlib(backend):
+
+    assert jsoncodec.loads('{"a": "x\ny"}', strict=False) == {'a': 'x\ny'}
+    big = [-9223372036854775809, 18446744073709551615, 123456789012345678901234567890]
+    assert jsoncodec.loads(jsoncodec.dumps(big).encode()) == big
+    with pytest.raises(jsoncodec.JSONDecodeError):
+        jsoncodec.loads('{bad')
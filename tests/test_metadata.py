@@ -0,0 +1,99 @@
+import copy
+import json
+import pickle
+import warnings
+
+import pytest
+
+from rabitpy_dev_phase_info.io import resources
+from rabitpy_dev_phase_info.io.resources import RabitMetadata
+
+from conftest import survey
+
+
+NESTED_SURVEY = {'pages': [{'name': 'p1', 'elements': [
+    {'type': 'text', 'name': 'age', 'title': {'fa': 'سن', 'default': 'Age'}, 'inputType': 'number',
+     'visibleIf': '{sex} = 1'},
+    {'type': 'radiogroup', 'name': 'sex', 'title': 'Sex', 'hasOther': True,
+     'choices': [{'value': 1, 'text': 'Male'}, {'value': 2, 'text': {'fa': 'زن'}}]},
+    {'type': 'checkbox', 'name': 'dx', 'title': 'Diagnosis', 'choices': ['a', 'b']},
+    {'type': 'multipletext', 'name': 'bp', 'title': 'BP', 'items': [{'name': 'sys', 'title': 'Systolic'},
+                                                                     {'name': 'dia', 'title': 'Diastolic'}]},
+    {'type': 'panel', 'name': 'pnl', 'title': 'Panel', 'elements': [
+        {'type': 'text', 'name': 'w', 'title': 'Weight', 'inputType': 'number'},
+        {'type': 'dropdown', 'name': 'edu', 'title': 'Education', 'choices': [{'value': '1', 'text': 'Low'}]}]},
+    {'type': 'paneldynamic', 'name': 'kids', 'title': 'Kids', 'templateElements': [
+        {'type': 'text', 'name': 'kage', 'title': 'Kid age', 'inputType': 'number'},
+        {'type': 'boolean', 'name': 'school', 'title': 'School'}]},
+    {'type': 'matrix', 'name': 'mx', 'title': 'Matrix', 'columns': [{'value': 1, 'text': 'Yes'}],
+     'rows': [{'value': 'r1', 'text': 'Row 1'}, {'value': 'r2', 'text': 'Row 2'}]},
+    {'type': 'matrixdropdown', 'name': 'md', 'title': 'MD', 'columns': [{'name': 'c1', 'title': 'C1'}],
+     'rows': ['x'], 'choices': [1, 2]},
+    {'type': 'html', 'name': 'note', 'html': '<b>x</b>'},
+    {'type': 'expression', 'name': 'bmi', 'title': 'BMI', 'expression': '{w} / 2'},
+    {'type': 'comment', 'name': 'cmt', 'title': 'Comment'},
+]}]}
+
+# md rows of NESTED_SURVEY as parsed before the element walker, except options of 'other' rows which are None
+NESTED_ROWS = [
+    ('age', 'سن', 'age', 'text', None, 'numeric'),
+    ('sex', 'Sex', 'sex', 'radiogroup', '1', 'category'),
+    ('sex', 'Sex', 'sex', 'radiogroup', '2', 'category'),
+    ('sex_comment', 'Sex - other', 'sex', 'text', None, 'str'),
+    ('dx_a', 'Diagnosis - a', 'dx', 'checkbox', 'a', 'bool'),
+    ('dx_b', 'Diagnosis - b', 'dx', 'checkbox', 'b', 'bool'),
+    ('bp_sys', 'Systolic', 'bp', 'multipletext - text', None, 'str'),
+    ('bp_dia', 'Diastolic', 'bp', 'multipletext - text', None, 'str'),
+    ('w', 'Weight', 'w', 'panel - text', None, 'numeric'),
+    ('edu', 'Education', 'edu', 'panel - dropdown', '1', 'category'),
+    ('kids_r1_kage', 'Kid age', 'kids_r1_kage', 'paneldynamic - text', None, 'numeric'),
+    ('kids_r1_school', 'School', 'kids_r1_school', 'paneldynamic - boolean', 'True', 'category'),
+    ('kids_r1_school', 'School', 'kids_r1_school', 'paneldynamic - boolean', 'False', 'category'),
+    ('mx_r1', 'Matrix - Row 1', 'mx', 'matrix - radiogroup', None, 'category'),
+    ('mx_r2', 'Matrix - Row 2', 'mx', 'matrix - radiogroup', None, 'category'),
+    ('md_x_c1', 'MD - x - C1', 'md_x', 'matrixdropdown - dropdown', None, 'category'),
+    ('bmi', 'BMI', 'bmi', 'expression', None, 'numeric'),
+    ('cmt', 'Comment', 'cmt', 'comment', None, 'str'),
+]
+
+
+def load_metadata(path):
+    metadata = RabitMetadata(source='json', form_cache_path=str(path),
+                             obj=[{'id': 1, 'surveyName': 'Form1', 'surveyDescription': '', 'sortOrder': 1,
+                                   'json': json.dumps(survey(1))}])
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        metadata.parse(rename_duplicates=False)
+    return metadata
+
+
+@pytest.mark.parametrize('content', [b'cno_such_module\nThing\n.', b'cjson\nno_such_attribute\n.',
+                                     pickle.dumps([1, 2]), b'garbage'])
+def test_unreadable_form_cache_is_parsed_again(tmp_path, content):
+    expected = load_metadata(tmp_path / 'fresh.pkl').md
+    path = tmp_path / 'forms.pkl'
+    path.write_bytes(content)
+    assert load_metadata(path).md.equals(expected)
+    # The cache is written again and used by the next run
+    assert list(pickle.loads(path.read_bytes())) == [1]
+
+
+def test_cache_version_changes_form_digest(monkeypatch):
+    digest = resources._form_digest({'id': 1}, 'json')
+    monkeypatch.setattr(resources, '_FORM_CACHE_VERSION', resources._FORM_CACHE_VERSION + 1)
+    assert resources._form_digest({'id': 1}, 'json') != digest
+
+
+def test_nested_elements_are_walked_without_modifying_the_survey():
+    qnr = [{'id': 7, 'surveyName': 'F', 'surveyDescription': '', 'json': copy.deepcopy(NESTED_SURVEY)}]
+    columns = ['fldCode', 'fldTitle', 'fldParentCode', 'elementType', 'optVal', 'dType']
+
+    frames = []
+    for _ in range(2):
+        metadata = RabitMetadata(source='json', obj=qnr)
+        metadata.parse(rename_duplicates=False, sort_values=False, check_coding_validity=False, nest=False)
+        frames.append(metadata.md)
+
+    assert list(frames[0][columns].itertuples(index=False, name=None)) == NESTED_ROWS
+    assert frames[1].equals(frames[0])
+    assert qnr[0]['json'] == NESTED_SURVEY
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+
+from rabitpy_dev_phase_info.io.parsers import _sync_data_metadata
+
+from conftest import build_dataset
+
+
+def test_sync_data_metadata_keeps_empty_responses():
+
+    md = [{'frmCode': 1, 'fldCode': 'age', 'fldOrder': 1}, {'frmCode': 1, 'fldCode': 'sex', 'fldOrder': 2}]
+    obvs = pd.DataFrame({'pid': [1, 2, 3, 4], 'frmCode': 1,
+                         'json': [{'age': '30', 'sex': '1'}, None, np.nan, {'sex': '2', 'extra': 'x'}]})
+
+    out = _sync_data_metadata(obvs, md=md)[1]
+
+    assert out['pid'].tolist() == [1, 2, 3, 4]
+    assert out.columns.tolist() == ['pid', 'frmCode', 'age', 'sex', 'extra']
+    assert out['sex'].tolist()[::3] == ['1', '2']
+    assert out.loc[1:2, ['age', 'sex', 'extra']].isna().all().all()
+
+
+def dynamic_survey(fid):
+    return {'pages': [{'name': 'p1', 'elements': [
+        {'type': 'text', 'name': 'age', 'title': 'Age', 'inputType': 'number'},
+        {'type': 'paneldynamic', 'name': 'kids', 'title': 'Kids', 'templateElements': [
+            {'type': 'text', 'name': 'kage', 'title': 'Kid age', 'inputType': 'number'},
+            {'type': 'radiogroup', 'name': 'sex', 'title': 'Sex',
+             'choices': [{'value': '1', 'text': 'M'}, {'value': '2', 'text': 'F'}]}]},
+        {'type': 'matrixdynamic', 'name': 'meds', 'title': 'Meds',
+         'columns': [{'name': 'drug', 'title': 'Drug', 'cellType': 'text'},
+                     {'name': 'dose', 'title': 'Dose', 'cellType': 'text'}]},
+    ]}]}
+
+
+def test_dynamic_fields_expand_to_every_repeat():
+
+    # Up to 3 kids and 4 medications are answered
+    def answer(i, p, f, r):
+        return {'age': 30 + i, 'kids': [{'kage': k, 'sex': '1'} for k in range(i % 4)],
+                'meds': [{'drug': f'd{k}', 'dose': k} for k in range(i * 2 % 5)]}
+
+    metadata = build_dataset(n=6, forms=(1,), answer=answer, make_survey=dynamic_survey).metadata
+    md = metadata.md
+
+    # Rows of repeats are appended to md and sorted with the rows of their first repeat, as before vectorizing
+    assert list(md.index) == [0, 1, 6, 7, 2, 3, 8, 10, 9, 11, 4, 12, 13, 14, 5, 15, 16, 17]
+    assert list(md[['fldCode', 'fldTitle', 'optVal', 'fldOrder']].itertuples(index=False, name=None)) == [
+        ('age', 'Age', None, 1),
+        ('kids_r1_kage', 'Kid age', None, 2), ('kids_r2_kage', 'Kid age - r2', None, 2),
+        ('kids_r3_kage', 'Kid age - r3', None, 2),
+        ('kids_r1_sex', 'Sex', '1', 3), ('kids_r1_sex', 'Sex', '2', 3), ('kids_r2_sex', 'Sex - r2', '1', 3),
+        ('kids_r2_sex', 'Sex - r2', '2', 3), ('kids_r3_sex', 'Sex - r3', '1', 3), ('kids_r3_sex', 'Sex - r3', '2', 3),
+        ('meds_r1_drug', 'Meds - Drug', None, 4), ('meds_r2_drug', 'Meds - Drug - r2', None, 4),
+        ('meds_r3_drug', 'Meds - Drug - r3', None, 4), ('meds_r4_drug', 'Meds - Drug - r4', None, 4),
+        ('meds_r1_dose', 'Meds - Dose', None, 5), ('meds_r2_dose', 'Meds - Dose - r2', None, 5),
+        ('meds_r3_dose', 'Meds - Dose - r3', None, 5), ('meds_r4_dose', 'Meds - Dose - r4', None, 5)]
+    assert (md['fldParentCode'] == md['fldCode']).all()
+
+    mdn = metadata.mdn
+    assert mdn['fldCode'].tolist() == md['fldCode'].drop_duplicates().tolist()
+    assert mdn['repeated_measure_number'].tolist() == [1, 1, 2, 3, 1, 2, 3, 1, 2, 3, 4, 1, 2, 3, 4]
+    assert mdn['fldOrder'].tolist() == list(range(1, 16))
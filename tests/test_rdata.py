@@ -0,0 +1,100 @@
+import json
+import warnings
+
+from rabitpy.io.parsers import _parse_metadata
+from rabitpy.io.rdata import RabitDataSet
+
+from conftest import survey
+
+
+def center(fid, n=3):
+    # A dataset of one form, as loaded from a single center
+    qnr = [{'id': fid, 'surveyName': f'Form{fid}', 'surveyDescription': '', 'json': json.dumps(survey(fid))}]
+    ds = RabitDataSet()
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        ds.metadata = _parse_metadata(qnr, 'id', 'json')
+        ds.metadata_nested = _parse_metadata(qnr, 'id', 'json', nest_options=True)
+    ds.data = [{'pid': str(fid * 100 + i), 'frmCode': fid, 'fillDate': '2024-01-01', 'age': 30 + i, 'name': f'n{i}',
+                f'f{fid}_only': 'z'} for i in range(n)]
+    return ds
+
+
+def test_added_datasets_rename_shared_codes_and_continue_orders():
+    first = center(1)
+    ds = RabitDataSet() + first
+    metadata, data = ds.metadata, ds.data
+
+    ds = ds + center(2) + center(3)
+
+    # Lists are extended in place, and the adopted lists of the first dataset are copies
+    assert ds.metadata is metadata and ds.data is data
+    assert len(first.metadata) == 7 and len(first.data) == 3
+
+    # Codes of later forms which are used by the first one are renamed and flagged as duplicates
+    shared = ['age', 'name', 'sex', 'dx_a', 'dx_b']
+    expected = [(1, fld) for fld in shared + ['f1_only']]
+    for frm in (2, 3):
+        expected += [(frm, f'frm{frm}_{fld}') for fld in shared] + [(frm, f'f{frm}_only')]
+    assert [(rec['frmCode'], rec['fldCode']) for rec in ds.metadata_nested] == expected
+    assert [bool(rec['warning']) for rec in ds.metadata_nested] == [False] * 6 + ([True] * 5 + [False]) * 2
+
+    # Orders of incoming parts continue from the last record of the dataset they are added to
+    assert [rec['frmOrder'] for rec in ds.metadata_nested] == [1] * 6 + [2] * 6 + [3] * 6
+    assert [rec['fldOrder'] for rec in ds.metadata_nested] == list(range(1, 19))
+    assert [rec['fldParentOrder'] for rec in ds.metadata_nested] == [1, 2, 3, 4, 4, 5, 6, 7, 8, 9, 9, 10,
+                                                                     11, 12, 13, 14, 14, 15]
+
+    # Observations of incoming parts use the renamed codes
+    assert [r['frmCode'] for r in ds.data] == [1] * 3 + [2] * 3 + [3] * 3
+    assert ds.data[3] == {'pid': '200', 'frmCode': 2, 'fillDate': '2024-01-01', 'frm2_age': '30', 'frm2_name': 'n0',
+                          'frm2_sex': None, 'frm2_dx_a': None, 'frm2_dx_b': None, 'f2_only': 'z'}
+
+
+def responses():
+    return [
+        {'pid': 1, 'frmCode': 1, 'fillDate': '2024-01-02', 'age': '30', 'sex': '1'},
+        {'pid': 1, 'frmCode': 1, 'fillDate': '2024-01-05', 'age': '31', 'sex': '1'},
+        {'pid': 1, 'frmCode': 2, 'fillDate': '2024-01-03', 'data': {'bp': '120', 'hr': '70'}},
+        {'pid': 1, 'frmCode': 0, 'fillDate': '2024-01-01', 'site': 'A'},
+        {'pid': 2, 'frmCode': 2, 'fillDate': '2024-02-01', 'bp': '130'},
+        {'pid': 2, 'frmCode': 1, 'fillDate': '2024-02-03', 'age': '50', 'sex': '2'},
+        {'pid': 3, 'frmCode': '1', 'fillDate': '2024-03-01', 'age': '44'},
+    ]
+
+
+def reshaped(shape):
+    ds = RabitDataSet()
+    ds.data = responses()
+    return ds.reshape(shape)
+
+
+def test_merged_and_split_shapes_are_unchanged():
+
+    # Outputs of the reshape which looked keys up through keys[-1] and counter.keys()
+    assert reshaped('merged') == [
+        {'pid': '1', 'frmCode': 1, 'fillDate': '2024-01-05', 'site': 'A', 'age': '31', 'sex': '1', 'bp': '120',
+         'hr': '70'},
+        {'pid': '2', 'frmCode': 2, 'fillDate': '2024-02-01', 'age': '50', 'sex': '2', 'bp': '130'},
+        {'pid': '3', 'frmCode': '1', 'fillDate': '2024-03-01', 'age': '44'}]
+
+    assert reshaped('split') == {
+        1: [{'pid': '1', 'frmCode': 1, 'fillDate': '2024-01-02', 'age': '30', 'sex': '1'},
+            {'pid': '1', 'frmCode': 1, 'fillDate': '2024-01-05', 'age': '31', 'sex': '1'},
+            {'pid': '2', 'frmCode': 1, 'fillDate': '2024-02-03', 'age': '50', 'sex': '2'},
+            {'pid': '3', 'frmCode': '1', 'fillDate': '2024-03-01', 'age': '44'}],
+        2: [{'bp': '120', 'hr': '70', 'pid': '1', 'fillDate': '2024-01-03'},
+            {'pid': '2', 'frmCode': 2, 'fillDate': '2024-02-01', 'bp': '130'}],
+        0: [{'pid': '1', 'frmCode': 0, 'fillDate': '2024-01-01', 'site': 'A'}]}
+
+
+def test_duplicate_merged_prefixes_repeats_without_changing_responses():
+    ds = RabitDataSet()
+    ds.data = responses()
+    out = ds.reshape('duplicate merged')
+
+    assert ds.data == responses()
+    assert out[0]['f1_1_age'] == '30' and out[0]['f1_2_age'] == '31' and out[0]['f1_2_fillDate'] == '2024-01-05'
+    assert out[0]['f2_1_bp'] == '120' and out[0]['site'] == 'A' and out[0]['fillDate'] == '2024-01-01'
+    assert out[2] == {'f1_1_pid': 3, 'f1_1_frmCode': '1', 'f1_1_fillDate': '2024-03-01', 'f1_1_age': '44',
+                      'pid': '3'}
@@ -0,0 +1,145 @@
+import pickle
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rabitpy.preprocessing.Metadata import metadata, infer_column_types
+from rabitpy.preprocessing.report import DescriptiveReporter
+from rabitpy.preprocessing.stats import QuantileSketch, ColumnStatistics, NUMERIC_COLUMNS
+
+
+def frame(n=3000, seed=0):
+    rng = np.random.default_rng(seed)
+    age = rng.normal(40, 12, n).round(1)
+    age[rng.random(n) < 0.05] = np.nan
+    age[rng.random(n) < 0.02] = -9999
+    sex = rng.choice(['1', '2', None], n, p=[0.5, 0.45, 0.05])
+    return pd.DataFrame({'age': age, 'weight': rng.lognormal(4, 0.3, n), 'sex': sex})
+
+
+def dfmeta():
+    return pd.DataFrame({'fldCode': ['age', 'weight', 'sex', 'sex'],
+                         'dType': ['numeric', 'numeric', 'category', 'category'],
+                         'elementType': ['text', 'text', 'radiogroup', 'radiogroup'],
+                         'optVal': [None, None, '1', '2']})
+
+
+def by_option(rep):
+    # Options with equal counts may be listed in any order
+    return rep.rename_axis('fldCode').reset_index().sort_values(['fldCode', 'optVal'], ignore_index=True)
+
+
+@pytest.mark.parametrize('n', [1, 2, 5, 100, 1000])
+def test_sketch_quartiles_are_exact_below_sketch_size(n):
+    values = pd.Series(np.random.default_rng(n).normal(size=n))
+    sketch = QuantileSketch(k=1000)
+    for chunk in np.array_split(values.to_numpy(), 7):
+        sketch.merge(QuantileSketch(k=1000).update(chunk))
+    q = [0, 0.25, 0.5, 0.75, 1]
+    np.testing.assert_allclose(sketch.quantile(q), values.quantile(q).to_numpy(), rtol=0, atol=1e-12)
+
+
+def test_sketch_rank_error_is_bounded_above_sketch_size():
+    values = np.random.default_rng(0).random(200000)
+    sketch = QuantileSketch(k=500)
+    for chunk in np.array_split(values, 40):
+        sketch.update(chunk)
+    assert len(sketch) == len(values)
+    assert sum(map(len, sketch.levels)) < 10 * 500
+    ranks = np.searchsorted(np.sort(values), sketch.quantile([0.1, 0.25, 0.5, 0.75, 0.9])) / len(values)
+    np.testing.assert_allclose(ranks, [0.1, 0.25, 0.5, 0.75, 0.9], atol=0.01)
+
+
+def test_merged_chunk_reporters_match_full_frame_report():
+    df = frame()
+    full = DescriptiveReporter(df, dfmeta())
+
+    # Reporters of each chunk compute their statistics before they are pickled, as in separate workers
+    parts = []
+    for i in range(0, len(df), 700):
+        reporter = DescriptiveReporter(df.iloc[i:i + 700], dfmeta())
+        reporter.report_numeric_columns()
+        reporter.report_categorical_columns()
+        parts.append(pickle.loads(pickle.dumps(reporter)))
+    merged = parts[0]
+    for part in parts[1:]:
+        merged.merge(part)
+
+    pd.testing.assert_frame_equal(merged.report_numeric_columns(), full.report_numeric_columns(), rtol=1e-12)
+    pd.testing.assert_frame_equal(by_option(merged.report_categorical_columns()),
+                                  by_option(full.report_categorical_columns()), rtol=1e-12)
+
+
+def test_max_categories_keeps_frequent_values():
+    rng = np.random.default_rng(0)
+    k = 5
+    values = pd.Series(np.concatenate([np.repeat(['a', 'b', 'c'], [3000, 1500, 900]),
+                                       rng.integers(0, 500, 4000).astype(str)]))
+    values = values.sample(frac=1, random_state=0, ignore_index=True)
+    counts = values.value_counts()
+
+    stats = ColumnStatistics('category', max_categories=k)
+    for chunk in np.array_split(values, 9):
+        stats.merge(ColumnStatistics('category', max_categories=k).update(chunk))
+
+    assert len(stats.counts) <= k
+    frequent = counts[counts > len(values) / (k + 1)]
+    assert set(frequent.index) <= set(stats.counts)
+    for value, count in stats.counts.items():
+        assert count <= counts[value]
+
+
+@pytest.mark.parametrize('chunksize', [None, 64])
+def test_numeric_report_matches_describe(chunksize):
+    df = frame()
+    rep = DescriptiveReporter(df, dfmeta(), chunksize=chunksize).report_numeric_columns()
+    expected = df[['age', 'weight']].describe().T
+    pd.testing.assert_frame_equal(rep[NUMERIC_COLUMNS], expected, rtol=1e-12)
+    assert rep.loc['age', 'missings_count'] == df['age'].isna().sum()
+    assert rep.loc['age', 'skipped_count'] == (df['age'] == -9999).sum()
+
+
+def test_produce_metadata_orders_frequent_values():
+    df = frame(200)
+    meta = metadata(df).produce_metadata()
+    assert meta.loc['age', 'frequent_items_order'] is None
+    orders = meta.loc['sex', 'frequent_items_order']
+    assert all(order == dict(zip(df['sex'].value_counts().index, [1, 2])) for order in orders)
+
+
+def typed_frame(n=300):
+    rng = np.random.default_rng(0)
+    whole = rng.integers(0, 100, n).astype('float64')
+    whole[::7] = np.nan
+    dates = pd.Series(pd.date_range('2023-01-01', periods=n, freq='D').strftime('%Y-%m-%d'), dtype=object)
+    dates[::11] = None
+    return pd.DataFrame({
+        'count': rng.integers(0, 10, n),
+        'whole': whole,
+        'weight': rng.normal(70, 5, n),
+        'smoker': pd.Series(rng.choice(['yes', 'no', None], n), dtype=object),
+        'visit': dates,
+        'city': pd.Series(rng.choice(['Tehran', 'Shiraz', 'Tabriz'], n), dtype=object),
+        'code': pd.Series(rng.choice(['a1', 'b2', 'c3', 'd4'], n), dtype=object),
+    })
+
+
+def test_inferred_column_types_match_per_column_checks():
+    df = typed_frame()
+    before = df.copy()
+    meta = metadata(df, sample_size=50)
+
+    # Types found by the previous per column find_* checks, which each scanned the whole frame
+    assert sorted(meta.find_int_columns()) == ['count', 'whole']
+    assert meta.find_float_columns() == ['weight']
+    assert meta.find_datetime_columns() == ['visit']
+    assert meta.find_boolean_columns() == ['smoker']
+    assert sorted(meta.find_categorical_columns()) == ['city', 'code']
+    assert meta.find_object_columns() == []
+    pd.testing.assert_frame_equal(df, before)
+
+
+def test_bool_and_unhashable_columns_get_a_single_type():
+    df = pd.DataFrame({'flag': [True, False, True], 'tags': [['a'], ['b', 'c'], []], 'n': [1, 2, 3]})
+    assert infer_column_types(df) == {'flag': 'bool', 'tags': 'Object', 'n': 'int64'}
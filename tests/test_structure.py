@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+
+from rabitpy_dev_phase_info.io.structure import RabitStructure
+
+
+def test_to_frame_sorts_mixed_keys():
+
+    structure = RabitStructure(fields={(None, 2): {'a'}, (1, 10): {'b'}, ('2', 1): {'c'}, (1, 2): {'d'}})
+    dff = structure.to_frame()
+
+    assert list(zip(dff['phase_id'], dff['frmCode'])) == [(1, 2), (1, 10), ('2', 1), (None, 2)]
+    assert RabitStructure.from_frame(dff) == structure
+
+
+def test_update_leaves_out_rows_without_phase():
+
+    df = pd.DataFrame({'phase_id': [np.nan, np.nan, 1.0], 'frmCode': [1, 1, 1],
+                       'json': [{'a': 1}, {'b': 2}, {'c': 3}], 'dc': [{}, {}, {}]})
+    dff = RabitStructure().update(df).to_frame()
+
+    assert list(zip(dff['phase_id'], dff['frmCode'])) == [(1.0, 1)]
+    assert dff['fldCode'].tolist() == [{'c'}]
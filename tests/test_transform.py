@@ -0,0 +1,50 @@
+import copy
+import json
+import os
+
+from ETL.transform.mapping import read_coding, codes_mapping, title_to_new_codes_mapping
+from ETL.transform.transporm import list_record_mapper, map_records
+
+CODING = os.path.join(os.path.dirname(__file__), os.pardir, 'docs', 'old_coding.txt')
+
+
+def loop_mapper(records):
+    # list_record_mapper before answers were mapped in batches
+    out = []
+    for rec in [rec for rec in records if 'FinalDiagnosis' in json.loads(rec['respondJson'])]:
+        rec = rec.copy()
+        answers = json.loads(rec['respondJson'])
+        answers['FinalDiagnosis'] = [codes_mapping.get(x, x) for x in answers['FinalDiagnosis']]
+        rec['respondJson'] = answers
+        out.append(rec)
+    return out
+
+
+def test_read_coding_reproduces_the_mappings():
+    assert read_coding(CODING, prefix='Diagnosis_') == codes_mapping
+    assert read_coding(CODING, by='title') == title_to_new_codes_mapping
+
+
+def test_list_record_mapper_matches_record_loop():
+    codes = list(codes_mapping)
+    records = [{'id': i, 'respondJson': json.dumps({'FinalDiagnosis': codes[i % 7:i % 7 + i % 3] + ['Other'],
+                                                    'age': i})} for i in range(50)]
+    records += [{'id': 50, 'respondJson': json.dumps({'age': 1})}]
+    before = copy.deepcopy(records)
+
+    assert list_record_mapper(records) == loop_mapper(records)
+    assert records == before
+
+
+def test_map_records_maps_whole_answers_and_keeps_decoded_input():
+    rules = {'FinalDiagnosis': codes_mapping, 'Title': read_coding(CODING, by='title')}
+    records = [{'respondJson': {'FinalDiagnosis': 'Diagnosis_I05', 'Title': 'Rheumatic mitral valve diseases'}},
+               {'respondJson': '{"Title": ["Unknown", "Multiple valve diseases"]}'},
+               {'respondJson': 'not json'}]
+    before = copy.deepcopy(records)
+
+    out = map_records(records, rules)
+
+    assert [rec['respondJson'] for rec in out] == [{'FinalDiagnosis': '02', 'Title': '02'},
+                                                   {'Title': ['Unknown', '05']}]
+    assert records == before